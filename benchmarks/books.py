@@ -0,0 +1,191 @@
+"""Compares CPU time and memory per book of services.books.Book with the
+previous Book dataclass, which stored dates as display strings and parsed
+them again on every status check, on the catalog of a synthetic database.
+
+Build is creation of books from database rows, statuses are the checks and
+display dates used by category_with_books.j2 for every book.
+
+Usage: python -m benchmarks.books [--books N] [--repeats N] [--output FILE]
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from pathlib import Path
+
+from benchmarks.synthetic_db import Scale, create_synthetic_db
+from botanim_bot import config
+from botanim_bot.services import books
+
+
+@dataclass
+class _ReferenceBook:
+    """Book as it was before parse-once dates, kept for comparison"""
+
+    id: int
+    name: str
+    category_id: int
+    category_name: str
+    read_start: str | None
+    read_finish: str | None
+    read_comments: str | None
+    positional_number: int
+    group_post_link: str | None
+
+    def is_started(self) -> bool:
+        if self.read_start is not None:
+            now_date = datetime.now().date()
+            start_read_date = datetime.strptime(
+                self.read_start, config.DATE_FORMAT
+            ).date()
+            return start_read_date >= now_date
+        return False
+
+    def is_finished(self) -> bool:
+        if self.read_finish is not None:
+            now_date = datetime.now().date()
+            finish_read_date = datetime.strptime(
+                self.read_finish, config.DATE_FORMAT
+            ).date()
+            return finish_read_date <= now_date
+        return False
+
+    def is_planned(self) -> bool:
+        return self.is_started()
+
+    def __post_init__(self):
+        for field in ("read_start", "read_finish"):
+            value = getattr(self, field)
+            if value is None:
+                continue
+            value = datetime.strptime(value, "%Y-%m-%d").strftime(config.DATE_FORMAT)
+            setattr(self, field, value)
+
+        self.name = books.format_book_name(self.name)
+
+
+@dataclass
+class BookReport:
+    build_us_per_book: float
+    statuses_us_per_book: float
+    bytes_per_book: float
+
+
+def _build_reference_book(row: dict) -> _ReferenceBook:
+    return _ReferenceBook(
+        id=row["book_id"],
+        name=row["book_name"],
+        category_id=row["category_id"],
+        category_name=row["category_name"],
+        read_start=row["read_start"],
+        read_finish=row["read_finish"],
+        read_comments=row["read_comments"],
+        positional_number=row["positional_number"],
+        group_post_link=row["group_post_link"],
+    )
+
+
+def _render_reference_statuses(catalog: list[_ReferenceBook]) -> None:
+    for book in catalog:
+        if book.is_started():
+            book.is_finished()
+        elif book.is_planned():
+            (book.read_start, book.read_finish)
+
+
+def _render_statuses(catalog: list[books.Book]) -> None:
+    today = date.today()
+    for book in catalog:
+        if book.get_status(today) == books.BookStatus.PLANNED:
+            (book.read_start, book.read_finish)
+
+
+def measure(
+    rows: list[dict],
+    build: Callable[[dict], object],
+    render_statuses: Callable[[list], None],
+    repeats: int,
+) -> BookReport:
+    build_seconds = statuses_seconds = float("inf")
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        catalog = [build(row) for row in rows]
+        build_seconds = min(build_seconds, time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        render_statuses(catalog)
+        statuses_seconds = min(statuses_seconds, time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    catalog = [build(row) for row in rows]
+    catalog_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalog
+
+    return BookReport(
+        build_us_per_book=round(build_seconds / len(rows) * 1_000_000, 3),
+        statuses_us_per_book=round(statuses_seconds / len(rows) * 1_000_000, 3),
+        bytes_per_book=round(catalog_bytes / len(rows), 1),
+    )
+
+
+def read_catalog_rows(db_file: Path) -> list[dict]:
+    connection = sqlite3.connect(db_file)
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(books._get_books_base_sql()).fetchall()
+    finally:
+        connection.close()
+    return [dict(row) for row in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "books.sqlite3"
+        create_synthetic_db(
+            db_file,
+            Scale(categories=200, books=args.books, users=1, votings=1, votes=1),
+        )
+        rows = read_catalog_rows(db_file)
+
+    reference = measure(
+        rows, _build_reference_book, _render_reference_statuses, args.repeats
+    )
+    compact = measure(
+        rows,
+        lambda row: books._build_book(*row.values()),
+        _render_statuses,
+        args.repeats,
+    )
+    report = json.dumps(
+        {
+            "books": len(rows),
+            "reference": asdict(reference),
+            "compact": asdict(compact),
+            "savings": {
+                field: f"{1 - getattr(compact, field) / getattr(reference, field):.0%}"
+                for field in asdict(compact)
+            },
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Runs a broadcast to all users of a synthetic database against offline Bot API
+which answers some sendMessage calls with 429 and 403, stops the broadcast in
+the middle and resumes it like after a restart of the bot.
+
+Checks that every user who didn't block the bot got the message, that
+duplicates are limited to the recipients sent after the last saved progress,
+that the global rate and per-chat intervals were respected, and reports
+delivery stats as JSON.
+Exits with status 1 if a check failed.
+
+Usage: python -m benchmarks.broadcast [--users N] [--rate N] [--retry-after-every N]
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import sys
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+
+from benchmarks.fake_bot_api import FakeBotApi, create_bot
+from benchmarks.synthetic_db import Scale, create_synthetic_db
+from botanim_bot import config, db
+from botanim_bot.services import broadcast
+
+ADMIN_ID = 1
+
+
+async def run_broadcast(db_file: Path, users: int, retry_after_every: int) -> dict:
+    db.get_db.db = db.Database(db_file, config.SQLITE_READ_POOL_SIZE)
+    blocked_chat_ids = set(range(7, users + 1, 50))
+    bot_api = FakeBotApi(
+        retry_after_every=retry_after_every, blocked_chat_ids=blocked_chat_ids
+    )
+    bot = create_bot(bot_api)
+    await bot.initialize()
+    try:
+        await db.apply_migrations()
+        broadcast_id = await broadcast.start_broadcast(bot, ADMIN_ID, "Голосование!")
+        while sum(map(len, bot_api.sent_at.values())) < users // 2:
+            await asyncio.sleep(0.05)
+        await broadcast.stop_broadcasts()  # the bot is restarted
+        await broadcast.resume_broadcasts(bot)
+        await broadcast.wait_broadcast(broadcast_id)
+        stats = await broadcast.get_broadcast_stats(broadcast_id)
+    finally:
+        await bot.shutdown()
+        await db.async_close_db()
+
+    problems = _check_deliveries(bot_api, users, blocked_chat_ids)
+    return {
+        "stats": asdict(stats) if stats else None,
+        "send_message_calls": bot_api.calls["sendMessage"],
+        "duplicates": sum(len(t) - 1 for t in bot_api.sent_at.values() if len(t) > 1),
+        "max_messages_per_second": _get_max_messages_per_second(bot_api),
+        "problems": problems,
+    }
+
+
+def _check_deliveries(
+    bot_api: FakeBotApi, users: int, blocked_chat_ids: set[int]
+) -> list[str]:
+    problems = []
+    missed = [
+        user_id
+        for user_id in range(1, users + 1)
+        if user_id not in blocked_chat_ids and not bot_api.sent_at.get(user_id)
+    ]
+    if missed:
+        problems.append(f"{len(missed)} users didn't get the message: {missed[:10]}")
+
+    duplicated = [user_id for user_id, t in bot_api.sent_at.items() if len(t) > 1]
+    # a batch not saved yet and messages sent by other workers meanwhile
+    if len(duplicated) > config.BROADCAST_PROGRESS_BATCH + config.BROADCAST_WORKERS:
+        problems.append(f"{len(duplicated)} users got the message more than once")
+
+    for user_id, sent_at in bot_api.sent_at.items():
+        intervals = [
+            later - earlier
+            for earlier, later in zip(sent_at, sent_at[1:], strict=False)
+        ]
+        if intervals and min(intervals) < config.BROADCAST_PER_CHAT_INTERVAL * 0.95:
+            problems.append(f"messages to {user_id} were sent too often")
+
+    # one extra message per second for the timer precision
+    if _get_max_messages_per_second(bot_api) > config.BROADCAST_RATE + 1:
+        problems.append("global rate limit was exceeded")
+    return problems
+
+
+def _get_max_messages_per_second(bot_api: FakeBotApi) -> int:
+    sent_at = sorted(t for times in bot_api.sent_at.values() for t in times)
+    return max(
+        (bisect.bisect_left(sent_at, t + 1) - i for i, t in enumerate(sent_at)),
+        default=0,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=config.BROADCAST_RATE)
+    parser.add_argument("--retry-after-every", type=int, default=97)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    config.BROADCAST_RATE = args.rate
+    config.BROADCAST_PAGE_SIZE = min(config.BROADCAST_PAGE_SIZE, args.users // 5 or 1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "broadcast.sqlite3"
+        create_synthetic_db(
+            db_file,
+            Scale(categories=5, books=50, users=args.users, votings=1, votes=10),
+        )
+        result = asyncio.run(run_broadcast(db_file, args.users, args.retry_after_every))
+
+    report = json.dumps(
+        {"users": args.users, "rate": args.rate, **result},
+        indent=2,
+        ensure_ascii=False,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+    if result["problems"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
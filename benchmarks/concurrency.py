@@ -0,0 +1,163 @@
+"""Compares sequential and concurrent processing of updates with slow
+getChatMember requests.
+
+Every user sends /vote and his ballot right after it, both messages check
+channel membership over the offline Telegram API with the given latency.
+Reports throughput, latency of updates, backpressure stats of the application
+and the number of saved ballots, which equals the number of users only if
+updates of every user were processed in order.
+
+Usage: python -m benchmarks.concurrency [--users N] [--member-check-latency MS]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import httpx
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ContextTypes, TypeHandler
+
+from benchmarks.fake_bot_api import BOT_TOKEN, FakeBotApi, make_message_update
+from benchmarks.synthetic_db import Scale, create_synthetic_db
+from botanim_bot import config, db
+from botanim_bot.application import ConcurrentApplication
+from botanim_bot.services import validation, vote_mode, vote_results
+
+SCALE = Scale(categories=20, books=500, users=1000, votings=3, votes=1000)
+
+
+def _create_chat_member_transport(latency: float) -> httpx.MockTransport:
+    async def handle(_: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"ok": True, "result": {"status": "member"}})
+
+    return httpx.MockTransport(handle)
+
+
+async def _run(concurrency: int, first_user_id: int, users: int) -> dict:
+    from botanim_bot.__main__ import add_handlers
+
+    handled_at: dict[int, float] = {}
+    all_handled = asyncio.Event()
+
+    async def record_handled(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        handled_at[update.update_id] = time.perf_counter()
+        if len(handled_at) == users * 2:
+            all_handled.set()
+
+    bot_api = FakeBotApi()
+    application = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(bot_api)
+        .get_updates_request(bot_api)
+        .application_class(ConcurrentApplication, kwargs={"concurrency": concurrency})
+        .build()
+    )
+    add_handlers(application)
+    application.add_handler(TypeHandler(Update, record_handled), group=1)
+
+    books_count = (await db.fetch_one("SELECT max(positional_number) AS c FROM book"))[
+        "c"
+    ]
+    rnd = random.Random(concurrency)
+    user_ids = range(first_user_id, first_user_id + users)
+    max_queue_size = 0
+    async with application:
+        await application.start()
+        started_at = time.perf_counter()
+        for user_id in user_ids:
+            ballot = ", ".join(map(str, rnd.sample(range(1, books_count + 1), 3)))
+            for text in ("/vote", ballot):
+                update_id = user_id * 2 + (text != "/vote")
+                await application.update_queue.put(
+                    Update.de_json(
+                        make_message_update(update_id, user_id, text), application.bot
+                    )
+                )
+        while not all_handled.is_set():
+            max_queue_size = max(max_queue_size, application.update_queue.qsize())
+            await asyncio.sleep(0.005)
+        duration = time.perf_counter() - started_at
+        stats = application.get_updates_stats()
+        await application.stop()
+
+    saved_ballots = await db.fetch_one(
+        "SELECT count(*) AS c FROM vote WHERE user_id BETWEEN :first AND :last",
+        {"first": first_user_id, "last": first_user_id + users - 1},
+    )
+    latencies = [(t - started_at) * 1000 for t in handled_at.values()]
+    return {
+        "updates_per_second": round(len(handled_at) / duration, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "max_update_queue_size": max_queue_size,
+        "saved_ballots": saved_ballots["c"],
+        "stats": asdict(stats),
+    }
+
+
+async def run_benchmarks(db_file: Path, users: int, latency: float) -> dict:
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or BOT_TOKEN
+    config.TELEGRAM_BOTANIM_CHANNEL_ID = config.TELEGRAM_BOTANIM_CHANNEL_ID or -1
+    db.get_db.db = db.Database(db_file, config.SQLITE_READ_POOL_SIZE)
+    validation._get_http_client.client = httpx.AsyncClient(
+        transport=_create_chat_member_transport(latency)
+    )
+    reports = {}
+    try:
+        for run_number, concurrency in enumerate((1, config.UPDATES_CONCURRENCY)):
+            validation._membership_cache.clear()
+            reports[f"concurrency {concurrency}"] = await _run(
+                concurrency, first_user_id=10_000_000 * (run_number + 1), users=users
+            )
+    finally:
+        await validation.close_http_client()
+        await vote_results.stop_leaders_refresh()
+        await vote_mode.flush_vote_mode()
+        await db.async_close_db()
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument(
+        "--member-check-latency", type=float, default=100, help="getChatMember, ms"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "concurrency.sqlite3"
+        create_synthetic_db(db_file, SCALE)
+        modes = asyncio.run(
+            run_benchmarks(db_file, args.users, args.member_check_latency / 1000)
+        )
+
+    report = json.dumps(
+        {
+            "users": args.users,
+            "member_check_latency_ms": args.member_check_latency,
+            "modes": modes,
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compares reads through db.fetch_all(), which loads all rows as dicts,
+with the streaming reads building typed records from chunks of rows:
+time and peak memory of the full catalog and of the export of all ballots.
+
+Usage: python -m benchmarks.db_rows [--books N --votes N ...] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+from benchmarks.synthetic_db import (
+    Scale,
+    add_scale_arguments,
+    create_synthetic_db,
+    get_scale,
+)
+from botanim_bot import config, db
+from botanim_bot.services import books
+
+VOTES_SQL = """
+    SELECT vote_id, user_id, first_book_id, second_book_id, third_book_id
+    FROM vote
+"""
+
+
+class _Ballot(NamedTuple):
+    vote_id: int
+    user_id: int
+    first_book_id: int
+    second_book_id: int
+    third_book_id: int
+
+
+@dataclass
+class ReadReport:
+    rows: int
+    ms: float
+    peak_mb: float
+
+
+async def _read_catalog_dicts() -> int:
+    rows = await db.fetch_all(books._get_books_base_sql())
+    return len([books._build_book(**row) for row in rows])
+
+
+async def _read_catalog_records() -> int:
+    return len(await books._get_books_from_db(books._get_books_base_sql()))
+
+
+async def _export_votes_dicts() -> int:
+    exported = 0
+    for row in await db.fetch_all(VOTES_SQL):
+        exported += row["first_book_id"] > 0
+    return exported
+
+
+async def _export_votes_records() -> int:
+    exported = 0
+    async for ballot in db.iterate_records(VOTES_SQL, _Ballot):
+        exported += ballot.first_book_id > 0
+    return exported
+
+
+async def measure(read: Callable[[], Awaitable[int]]) -> ReadReport:
+    started_at = time.perf_counter()
+    rows = await read()
+    elapsed = time.perf_counter() - started_at
+
+    tracemalloc.start()
+    await read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ReadReport(
+        rows=rows, ms=round(elapsed * 1000, 1), peak_mb=round(peak / 2**20, 2)
+    )
+
+
+async def run(db_file: Path) -> dict:
+    db.get_db.db = db.Database(db_file, config.SQLITE_READ_POOL_SIZE)
+    config.SQL_SLOW_STATEMENT_THRESHOLD = float("inf")  # full reads are slow here
+    report = {}
+    try:
+        for name, dicts, records in (
+            ("catalog", _read_catalog_dicts, _read_catalog_records),
+            ("votes export", _export_votes_dicts, _export_votes_records),
+        ):
+            await records()  # warms up the page cache and the statements cache
+            report[name] = {
+                "fetch_all": asdict(await measure(dicts)),
+                "streaming": asdict(await measure(records)),
+            }
+    finally:
+        await db.async_close_db()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    add_scale_arguments(parser, Scale(users=20_000, votes=200_000))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "db_rows.sqlite3"
+        create_synthetic_db(db_file, get_scale(args))
+        report = json.dumps(asyncio.run(run(db_file)), indent=2)
+
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Offline stand-in for Telegram Bot API."""
+import json
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+
+import httpx
+from telegram import Bot
+from telegram.request import BaseRequest, RequestData
+
+BOT_ID = 1_000_000
+BOT_TOKEN = f"{BOT_ID}:offline"
+
+
+class FakeBotApi(BaseRequest):
+    """Answers Bot API methods with plausible results without network,
+    counts calls of every method.
+
+    Every `retry_after_every`-th sendMessage fails with 429 and retry_after
+    `retry_after` seconds, like Telegram does on flood, sendMessage to
+    `blocked_chat_ids` fails with 403. Times of delivered messages are kept
+    in `sent_at` by chat id"""
+
+    def __init__(
+        self,
+        retry_after_every: int = 0,
+        retry_after: int = 1,
+        blocked_chat_ids: Iterable[int] = (),
+    ):
+        self.calls: Counter[str] = Counter()
+        self.sent_at: defaultdict[int, list[float]] = defaultdict(list)
+        self._message_id = 0
+        self._retry_after_every = retry_after_every
+        self._retry_after = retry_after
+        self._blocked_chat_ids = set(blocked_chat_ids)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] += 1
+        params = request_data.parameters if request_data else {}
+        if api_method == "sendMessage":
+            error = self._get_send_message_error(params)
+            if error is not None:
+                return error
+            self.sent_at[params.get("chat_id", 0)].append(time.monotonic())
+        return self._make_response(api_method, params)
+
+    def _get_send_message_error(self, params: dict) -> tuple[int, bytes] | None:
+        if (
+            self._retry_after_every
+            and self.calls["sendMessage"] % self._retry_after_every == 0
+        ):
+            return _make_error(
+                429,
+                f"Too Many Requests: retry after {self._retry_after}",
+                {"retry_after": self._retry_after},
+            )
+        if params.get("chat_id") in self._blocked_chat_ids:
+            return _make_error(403, "Forbidden: bot was blocked by the user")
+        return None
+
+    def _make_response(self, api_method: str, params: dict) -> tuple[int, bytes]:
+        return (
+            200,
+            json.dumps(
+                {"ok": True, "result": self._get_result(api_method, params)}
+            ).encode(),
+        )
+
+    def _get_result(self, api_method: str, params: dict) -> object:
+        if api_method == "getMe":
+            return {
+                "id": BOT_ID,
+                "is_bot": True,
+                "first_name": "Botanim",
+                "username": "botanim_bot",
+            }
+        if api_method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            return {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+def _make_error(
+    code: int, description: str, parameters: dict | None = None
+) -> tuple[int, bytes]:
+    response = {"ok": False, "error_code": code, "description": description}
+    if parameters:
+        response["parameters"] = parameters
+    return code, json.dumps(response).encode()
+
+
+def create_bot(bot_api: FakeBotApi) -> Bot:
+    return Bot(BOT_TOKEN, request=bot_api, get_updates_request=bot_api)
+
+
+def create_chat_member_transport(is_member: bool = True) -> httpx.MockTransport:
+    """Transport for the httpx client of services.validation"""
+    status = "member" if is_member else "left"
+
+    def handle(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"ok": True, "result": {"status": status}})
+
+    return httpx.MockTransport(handle)
+
+
+def make_message_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": _make_message(update_id, user_id, text),
+    }
+
+
+def make_callback_query_update(update_id: int, user_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _make_user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": _make_message(update_id, BOT_ID, "", chat_id=user_id),
+        },
+    }
+
+
+def make_inline_query_update(update_id: int, user_id: int, query: str) -> dict:
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": _make_user(user_id),
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+def _make_message(
+    message_id: int, user_id: int, text: str, chat_id: int | None = None
+) -> dict:
+    message = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id or user_id, "type": "private"},
+        "from": _make_user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command_length = len(text.split()[0])
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": command_length}
+        ]
+    return message
+
+
+def _make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": user_id == BOT_ID, "first_name": f"User {user_id}"}
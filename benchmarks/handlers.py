@@ -0,0 +1,367 @@
+"""Runs every handler of the bot on a synthetic database with fake updates and
+offline Bot API, reports latency percentiles, SQL queries, Bot API calls and
+memory allocations per update as JSON.
+
+Usage: python -m benchmarks.handlers [--db PATH] [--iterations N] [--output FILE]
+"""
+import argparse
+import asyncio
+import functools
+import gc
+import importlib
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+from telegram import Update
+
+from benchmarks.fake_bot_api import (
+    BOT_TOKEN,
+    FakeBotApi,
+    create_bot,
+    create_chat_member_transport,
+    make_callback_query_update,
+    make_inline_query_update,
+    make_message_update,
+)
+from benchmarks.synthetic_db import (
+    Scale,
+    add_scale_arguments,
+    create_synthetic_db,
+    get_scale,
+)
+
+DML_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+CALLBACK_PATTERN_RE = re.compile(r"^\^(.*?)\(\\d\+\)")
+
+
+@dataclass
+class Scenario:
+    name: str
+    handler: Callable[[Update, object], Awaitable[None]]
+    make_update: Callable[[int, int], dict]
+    prepare: Callable[[int], Awaitable[None]] | None = None
+    user_id: int | None = None  # random user if not set
+
+
+@dataclass
+class HandlerReport:
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries_per_update: float
+    bot_api_calls_per_update: float
+    allocated_peak_kib_per_update: float
+    retained_blocks_per_update: float
+
+
+class _StatementsCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sql: str) -> None:
+        if DML_RE.match(sql):
+            self.count += 1
+
+    async def install(self, connection) -> None:
+        await connection.set_trace_callback(self)
+
+
+async def run_benchmarks(db_file: Path, iterations: int, seed: int) -> dict:
+    from botanim_bot import config, db
+    from botanim_bot.services import (
+        books,
+        broadcast,
+        validation,
+        vote_mode,
+        vote_results,
+    )
+
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or BOT_TOKEN
+    config.TELEGRAM_BOTANIM_CHANNEL_ID = config.TELEGRAM_BOTANIM_CHANNEL_ID or -1
+    bot_module = importlib.import_module("botanim_bot.__main__")
+    statements = _StatementsCounter()
+    db.get_db.db = db.Database(
+        db_file, config.SQLITE_READ_POOL_SIZE, on_connect=statements.install
+    )
+    validation._get_http_client.client = httpx.AsyncClient(
+        transport=create_chat_member_transport(is_member=True)
+    )
+    bot_api = FakeBotApi()
+    bot = create_bot(bot_api)
+    await bot.initialize()
+    context = SimpleNamespace(bot=bot)
+    await db.apply_migrations()
+
+    users_count = (await db.fetch_one("SELECT count(*) AS c FROM bot_user"))["c"]
+    categories_count = len(await books._get_categories(not_started_only=False))
+    not_started_categories_count = len(
+        await books._get_categories(not_started_only=True)
+    )
+    books_count = (await db.fetch_one("SELECT max(positional_number) AS c FROM book"))[
+        "c"
+    ]
+    admin_id = users_count + 1  # never one of the random users
+    config.ADMIN_IDS = {*config.ADMIN_IDS, admin_id}
+    rnd = random.Random(seed)
+
+    def random_user() -> int:
+        return rnd.randint(1, users_count)
+
+    def command(name: str) -> Callable[[int, int], dict]:
+        return lambda update_id, user_id: make_message_update(
+            update_id, user_id, f"/{name}"
+        )
+
+    def callback(prefix: str, pages_count: int) -> Callable[[int, int], dict]:
+        return lambda update_id, user_id: make_callback_query_update(
+            update_id, user_id, f"{prefix}{rnd.randrange(pages_count)}"
+        )
+
+    def ballot(update_id: int, user_id: int) -> dict:
+        numbers = rnd.sample(range(1, books_count + 1), config.VOTE_ELEMENTS_COUNT)
+        return make_message_update(update_id, user_id, ", ".join(map(str, numbers)))
+
+    scenarios = [
+        Scenario(f"/{name}", handler, command(name))
+        for name, handler in bot_module.COMMAND_HANDLERS.items()
+    ]
+    for pattern, handler in bot_module.CALLBACK_QUERY_HANDLERS.items():
+        prefix = CALLBACK_PATTERN_RE.match(pattern).group(1)
+        pages_count = (
+            not_started_categories_count
+            if prefix == config.VOTE_BOOKS_CALLBACK_PATTERN
+            else categories_count
+        )
+        scenarios.append(
+            Scenario(f"callback {prefix}", handler, callback(prefix, pages_count))
+        )
+    scenarios.append(
+        Scenario(
+            "vote_process",
+            bot_module.handlers.vote_process,
+            ballot,
+            prepare=vote_mode.set_user_in_vote_mode,
+        )
+    )
+
+    scenarios.append(
+        Scenario(
+            "inline_search",
+            bot_module.handlers.inline_search,
+            lambda update_id, user_id: make_inline_query_update(
+                update_id, user_id, _get_typed_book_name(rnd, books_count)
+            ),
+        )
+    )
+    scenarios.append(
+        Scenario(
+            "/search <words>",
+            bot_module.handlers.search,
+            lambda update_id, user_id: make_message_update(
+                update_id, user_id, f"/search {_get_search_words(rnd, books_count)}"
+            ),
+        )
+    )
+    scenarios.extend(_get_admin_scenarios(bot_module.handlers, admin_id))
+
+    update_ids = iter(range(1, sys.maxsize))
+
+    async def prepare_update(scenario: Scenario) -> Callable[[], Awaitable[None]]:
+        """Returns handler call for a new update, ready to be measured"""
+        user_id = scenario.user_id or random_user()
+        if scenario.prepare is not None:
+            await scenario.prepare(user_id)
+        update = Update.de_json(scenario.make_update(next(update_ids), user_id), bot)
+        return functools.partial(_run_handler, scenario.handler, update, context)
+
+    reports = {}
+    try:
+        for scenario in scenarios:
+            # warm up caches and prepared statements
+            await (await prepare_update(scenario))()
+            reports[scenario.name] = await _measure_scenario(
+                scenario, prepare_update, iterations, statements, bot_api
+            )
+            # background work started by the scenario isn't measured in others
+            await vote_results.stop_leaders_refresh()
+            await broadcast.stop_broadcasts()
+    finally:
+        await broadcast.stop_broadcasts()
+        await bot.shutdown()
+        await validation.close_http_client()
+        await vote_results.stop_leaders_refresh()
+        await vote_mode.flush_vote_mode()
+        await db.async_close_db()
+    return {name: asdict(report) for name, report in reports.items()}
+
+
+def _get_typed_book_name(rnd: random.Random, books_count: int) -> str:
+    """Returns inline query being typed: a prefix of a book name"""
+    name = f"book {rnd.randint(1, books_count)} about python"
+    return name[: rnd.randint(1, len(name))]
+
+
+def _get_search_words(rnd: random.Random, books_count: int) -> str:
+    """Returns /search query: a topic shared by many books, a title
+    or an author"""
+    book_number = rnd.randint(1, books_count)
+    return rnd.choice(("python", f"book {book_number}", f"author {book_number % 997}"))
+
+
+def _get_admin_scenarios(handlers, admin_id: int) -> list[Scenario]:
+    """Returns scenarios of the admin commands, other users get no answer.
+    Every /broadcast <text> starts a broadcast, its first sends may be
+    counted in the update"""
+    from botanim_bot.services.broadcast import stop_broadcasts
+
+    def command(text: str) -> Callable[[int, int], dict]:
+        return lambda update_id, user_id: make_message_update(update_id, user_id, text)
+
+    async def stop_previous_broadcast(_: int) -> None:
+        await stop_broadcasts()
+
+    return [
+        Scenario(
+            "/sqlstats (admin)",
+            handlers.sql_stats,
+            command("/sqlstats"),
+            user_id=admin_id,
+        ),
+        Scenario(
+            "/broadcast <text> (admin)",
+            handlers.broadcast,
+            command("/broadcast <b>Голосование</b> началось!"),
+            prepare=stop_previous_broadcast,
+            user_id=admin_id,
+        ),
+        Scenario(
+            "/broadcast (admin)",
+            handlers.broadcast,
+            command("/broadcast"),
+            user_id=admin_id,
+        ),
+    ]
+
+
+async def _run_handler(
+    handler: Callable[[Update, object], Awaitable[None]],
+    update: Update,
+    context: object,
+) -> None:
+    from botanim_bot.services.loader import request_scope
+
+    with request_scope():  # like ConcurrentApplication does
+        await handler(update, context)
+
+
+async def _measure_scenario(
+    scenario: Scenario,
+    prepare_update: Callable[[Scenario], Awaitable[Callable[[], Awaitable[None]]]],
+    iterations: int,
+    statements: _StatementsCounter,
+    bot_api: FakeBotApi,
+) -> HandlerReport:
+    latencies = []
+    queries = api_calls = 0
+    for _ in range(iterations):
+        run_update = await prepare_update(scenario)
+        queries_before, api_calls_before = statements.count, bot_api.calls.total()
+        started_at = time.perf_counter()
+        await run_update()
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        queries += statements.count - queries_before
+        api_calls += bot_api.calls.total() - api_calls_before
+
+    allocations_iterations = max(1, iterations // 10)
+    peak_bytes = blocks = 0
+    gc.collect()
+    gc.freeze()  # collections before snapshots don't walk the warm caches
+    tracemalloc.start()
+    for _ in range(allocations_iterations):
+        run_update = await prepare_update(scenario)
+        snapshot_before = _take_snapshot()
+        tracemalloc.reset_peak()
+        current_before, _ = tracemalloc.get_traced_memory()
+        await run_update()
+        peak_bytes += tracemalloc.get_traced_memory()[1] - current_before
+        blocks += sum(
+            stat.count_diff
+            for stat in _take_snapshot().compare_to(snapshot_before, "lineno")
+            if stat.count_diff > 0
+        )
+    tracemalloc.stop()
+    gc.unfreeze()
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return HandlerReport(
+        iterations=iterations,
+        p50_ms=round(percentiles[49], 3),
+        p95_ms=round(percentiles[94], 3),
+        p99_ms=round(percentiles[98], 3),
+        queries_per_update=round(queries / iterations, 2),
+        bot_api_calls_per_update=round(api_calls / iterations, 2),
+        allocated_peak_kib_per_update=round(
+            peak_bytes / allocations_iterations / 1024, 1
+        ),
+        retained_blocks_per_update=round(blocks / allocations_iterations, 1),
+    )
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    """Returns traces of live objects, garbage of earlier updates is
+    collected first, memory of the previous snapshot is not counted"""
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", type=Path, help="existing synthetic database")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    add_scale_arguments(parser, Scale())
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = args.db
+        scale = get_scale(args)
+        if db_file is None:
+            db_file = Path(tmp_dir) / "handlers.sqlite3"
+            create_synthetic_db(db_file, scale, args.seed)
+        handlers = asyncio.run(run_benchmarks(db_file, args.iterations, args.seed))
+
+    report = json.dumps(
+        {
+            "scale": None if args.db else asdict(scale),
+            "iterations": args.iterations,
+            "handlers": handlers,
+        },
+        indent=2,
+        ensure_ascii=False,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Measures inline lookups of books on the in-memory prefix index of a
+synthetic catalog: latency of every keypress while queries are typed,
+SQL statements run by keypresses, time and memory of the index build and
+time of the incremental update after one book changed.
+
+Usage: python -m benchmarks.inline_search [--books N] [--queries N] [--output FILE]
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic_db import _TOPICS, Scale, create_synthetic_db
+from botanim_bot import config, db
+from botanim_bot.services import book_index, books
+
+
+class _StatementsCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, _: str) -> None:
+        self.count += 1
+
+    async def install(self, connection) -> None:
+        await connection.set_trace_callback(self)
+
+
+def _get_queries(books_count: int, count: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    topics = [topic.split()[0].lower() for topic in _TOPICS]
+    queries = []
+    for _ in range(count):
+        queries.append(
+            rnd.choice(
+                (
+                    rnd.choice(topics),
+                    f"author {rnd.randrange(997)}",
+                    f"book {rnd.randrange(1, books_count)}",
+                    f"{rnd.choice(topics)} author",
+                    f"{rnd.choice(topics)}x",  # nothing found
+                )
+            )
+        )
+    return queries
+
+
+async def _measure_keypresses(queries: list[str]) -> dict:
+    times = []
+    for query in queries:
+        for length in range(1, len(query) + 1):
+            started_at = time.perf_counter()
+            await book_index.search_book_index(
+                query[:length], config.INLINE_RESULTS_LIMIT
+            )
+            times.append(time.perf_counter() - started_at)
+    percentiles = statistics.quantiles(times, n=100)
+    return {
+        "keypresses": len(times),
+        "p50_ms": round(statistics.median(times) * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "max_ms": round(max(times) * 1000, 3),
+    }
+
+
+async def _measure_build() -> dict:
+    _, categories = await books.get_catalog()
+    catalog = [book for category in categories for book in category.books]
+    started_at = time.perf_counter()
+    book_index._build_book_index(book_index._BookIndex(), catalog)
+    elapsed = time.perf_counter() - started_at
+
+    index = book_index._BookIndex()
+    tracemalloc.start()
+    book_index._build_book_index(index, catalog)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    changed = list(catalog)
+    changed[len(changed) // 2] = dataclasses.replace(
+        changed[len(changed) // 2], name="Renamed book. <i>New author</i>"
+    )
+    changed.pop()
+    started_at = time.perf_counter()
+    book_index._update_book_index(index, changed)
+    update_elapsed = time.perf_counter() - started_at
+    return {
+        "build_ms": round(elapsed * 1000, 1),
+        "index_mb": round(size / 2**20, 2),
+        "update_two_books_ms": round(update_elapsed * 1000, 2),
+    }
+
+
+async def run(db_file: Path, books_count: int, queries_count: int) -> dict:
+    statements = _StatementsCounter()
+    db.get_db.db = db.Database(
+        db_file, config.SQLITE_READ_POOL_SIZE, on_connect=statements.install
+    )
+    config.CATALOG_VERSION_CHECK_INTERVAL = 3600  # keypresses must not need it
+    config.SQL_SLOW_STATEMENT_THRESHOLD = float("inf")  # the catalog is read whole
+    try:
+        report = {"index": await _measure_build()}
+        await book_index.search_book_index("warm up", 1)
+        statements.count = 0
+        report["keypresses"] = await _measure_keypresses(
+            _get_queries(books_count, queries_count)
+        )
+        report["keypresses"]["sql_statements"] = statements.count
+        return report
+    finally:
+        await db.async_close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "inline_search.sqlite3"
+        create_synthetic_db(
+            db_file,
+            Scale(categories=200, books=args.books, users=1, votings=1, votes=1),
+        )
+        report = json.dumps(
+            asyncio.run(run(db_file, args.books, args.queries)), indent=2
+        )
+
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Checks EXPLAIN QUERY PLAN of every SQL statement run by services on a large
+synthetic database, fails if a statement falls back to a full scan.
+
+Usage: python -m benchmarks.query_plans [--books N --votes N ...]
+"""
+import argparse
+import asyncio
+import logging
+import re
+import sqlite3
+import sys
+import tempfile
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from benchmarks.synthetic_db import (
+    Scale,
+    add_scale_arguments,
+    create_synthetic_db,
+    get_scale,
+)
+from botanim_bot import config, db
+from botanim_bot.services import (
+    books,
+    broadcast,
+    users,
+    vote_mode,
+    vote_results,
+    vote_tally,
+    votings,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tables which are small by nature, scans of them are fine
+SMALL_TABLES = {"book_category", "broadcast", "catalog_version", "voting"}
+
+USER_ID = 1
+VOTING_ID = 50
+
+
+@dataclass
+class QueryPlanCase:
+    name: str
+    run: Callable[[], Awaitable[object]]
+    allowed_scans: set[str] = field(default_factory=set)
+
+
+async def _save_vote() -> None:
+    await vote_mode.set_user_in_vote_mode(USER_ID)
+    await votings.save_vote(
+        USER_ID, await books.get_books_by_positional_numbers([1, 2, 3])
+    )
+
+
+async def _load_vote_mode() -> None:
+    vote_mode._get_vote_mode().loaded = False
+    await vote_mode.load_vote_mode()
+
+
+async def _flush_vote_mode() -> None:
+    await vote_mode.set_user_in_vote_mode(USER_ID)
+    await vote_mode.set_user_in_vote_mode(USER_ID + 1)
+    await vote_mode.remove_user_from_vote_mode(USER_ID + 1)
+    await vote_mode.flush_vote_mode()
+
+
+async def _compute_leaders() -> None:
+    voting = await votings.get_actual_or_last_voting()
+    if voting is not None:
+        await vote_results._compute_leaders(voting)
+
+
+CASES = (
+    QueryPlanCase(
+        "catalog snapshot",
+        books.get_catalog,
+        allowed_scans={"book"},  # the whole catalog is loaded
+    ),
+    QueryPlanCase("category first page", lambda: books.get_category_page(3)),
+    QueryPlanCase(
+        "category next page", lambda: books.get_category_page(3, after_book_id=404)
+    ),
+    QueryPlanCase(
+        "category previous page",
+        lambda: books.get_category_page(3, before_book_id=404),
+    ),
+    QueryPlanCase(
+        "vote category page",
+        lambda: books.get_category_page(3, not_started_only=True, after_book_id=404),
+    ),
+    QueryPlanCase("search books", lambda: books.search_books("book about pyth")),
+    QueryPlanCase("already read books", books.get_already_read_books),
+    QueryPlanCase("now reading books", books.get_now_reading_books),
+    QueryPlanCase("next book", books.get_next_book),
+    QueryPlanCase(
+        "books by positional numbers",
+        lambda: books.get_books_by_positional_numbers([5, 1, 7]),
+    ),
+    QueryPlanCase("books by ids", lambda: books.get_books_info_by_ids([1, 2, 3])),
+    QueryPlanCase("actual or last voting", votings.get_actual_or_last_voting),
+    QueryPlanCase("user vote", lambda: votings.get_user_vote(USER_ID, VOTING_ID)),
+    QueryPlanCase("insert user", lambda: users.insert_user(USER_ID)),
+    QueryPlanCase(
+        "vote mode load",
+        _load_vote_mode,
+        allowed_scans={"bot_user_in_vote_mode"},  # loaded once on start
+    ),
+    QueryPlanCase("vote mode flush", _flush_vote_mode),
+    QueryPlanCase("save vote", _save_vote),
+    QueryPlanCase("vote leaders", _compute_leaders),
+    QueryPlanCase("vote tally check", lambda: vote_tally.check_vote_tally(VOTING_ID)),
+    QueryPlanCase("vote tally rebuild", lambda: vote_tally.rebuild_vote_tally(1)),
+    QueryPlanCase(
+        "broadcast recipients", lambda: broadcast._get_recipients_page(USER_ID)
+    ),
+    QueryPlanCase("broadcast stats", broadcast.get_last_broadcast_stats),
+    QueryPlanCase(
+        "broadcast progress",
+        lambda: broadcast._save_progress(1, USER_ID, broadcast._PageResult()),
+    ),
+)
+
+_DML_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+_AUTOMATIC_INDEX_RE = re.compile(r"^(?:SEARCH|SCAN) (\w+) USING AUTOMATIC")
+_TABLE_ALIAS_RE = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE
+)
+
+
+async def check_query_plans(db_file: Path) -> list[str]:
+    """Returns list of found problems, empty if all statements use indexes"""
+    statements: list[str] = []
+
+    async def trace_statements(connection) -> None:
+        await connection.set_trace_callback(statements.append)
+
+    db.get_db.db = db.Database(
+        db_file, config.SQLITE_READ_POOL_SIZE, on_connect=trace_statements
+    )
+    plan_connection = sqlite3.connect(db_file)
+    tables = {
+        row[0]
+        for row in plan_connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )
+    }
+    problems = []
+    try:
+        for case in CASES:
+            statements.clear()
+            await case.run()
+            for sql in dict.fromkeys(statements):
+                if not _DML_RE.match(sql):
+                    continue
+                problems.extend(
+                    f"{case.name}: {problem}\n{sql}"
+                    for problem in _get_plan_problems(
+                        plan_connection, sql, tables, case.allowed_scans
+                    )
+                )
+    finally:
+        await vote_results.stop_leaders_refresh()
+        await vote_mode.flush_vote_mode()
+        await db.async_close_db()
+        plan_connection.close()
+    return problems
+
+
+def _get_plan_problems(
+    connection: sqlite3.Connection, sql: str, tables: set[str], allowed: set[str]
+) -> list[str]:
+    aliases = _get_table_aliases(sql, tables)
+    problems = []
+    for *_, detail in connection.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        for regexp in (_SCAN_RE, _AUTOMATIC_INDEX_RE):
+            match = regexp.match(detail)
+            if not match:
+                continue
+            table = aliases.get(match.group(1), match.group(1))
+            if table in tables and table not in SMALL_TABLES | allowed:
+                problems.append(f"{detail} ({table})")
+    return problems
+
+
+def _get_table_aliases(sql: str, tables: set[str]) -> dict[str, str]:
+    aliases = {}
+    for table, alias in _TABLE_ALIAS_RE.findall(sql):
+        if table in tables:
+            aliases[alias or table] = table
+    return aliases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", type=Path, help="existing synthetic database")
+    add_scale_arguments(parser, Scale(users=20_000, votes=200_000))
+    args = parser.parse_args()
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = args.db
+        if db_file is None:
+            db_file = Path(tmp_dir) / "query_plans.sqlite3"
+            create_synthetic_db(db_file, get_scale(args))
+        problems = asyncio.run(check_query_plans(db_file))
+
+    for problem in problems:
+        logger.error(problem)
+    logger.info("%s cases checked, %s problems found", len(CASES), len(problems))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
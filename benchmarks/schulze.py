@@ -0,0 +1,153 @@
+"""Checks that services.schulze_matrix ranks candidates exactly as the reference
+schulze.compute_ranks on random elections, then measures time and peak memory
+of ranking by the vote tally of a club with thousands of candidates.
+
+Elections of the check have up to 12 candidates and both ballots of up to
+three books, as the bot gets them, and full rankings with ties. The tally of
+the timing has 3 ballots per candidate, popular books are picked more often.
+Exits with status 1 if rankings of any election differ.
+
+Usage: python -m benchmarks.schulze [--elections N] [--candidates N ...]
+                                    [--output FILE]
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from botanim_bot.services import schulze, schulze_matrix
+from botanim_bot.services.vote_tally import VoteTally
+
+logger = logging.getLogger(__name__)
+
+MAX_CHECK_CANDIDATES = 12
+BALLOTS_PER_CANDIDATE = 3
+
+
+def check_rankings(elections: int, seed: int = 0) -> list[str]:
+    """Returns descriptions of elections ranked differently by the engines"""
+    rnd = random.Random(seed)
+    mismatches = []
+    for election in range(elections):
+        candidates = list(range(rnd.randint(1, MAX_CHECK_CANDIDATES)))
+        weighted_ranks = [
+            (_random_ranks(rnd, candidates), rnd.randint(1, 5))
+            for _ in range(rnd.randint(1, 20))
+        ]
+        expected = schulze.compute_ranks(candidates, weighted_ranks)
+        actual = schulze_matrix.compute_ranks(candidates, weighted_ranks)
+        if actual != expected:
+            mismatches.append(f"election {election}: {actual} != {expected}")
+
+        ballots = [_random_ballot(rnd, candidates) for _ in range(rnd.randint(1, 30))]
+        tally = _build_tally(ballots)
+        expected = schulze.compute_ranks(
+            tally.candidates, [([[book] for book in ballot], 1) for ballot in ballots]
+        )
+        actual = schulze_matrix.compute_ranks_from_matrix(
+            tally.candidates, tally.get_d_matrix()
+        )
+        if actual != expected:
+            mismatches.append(f"tally of election {election}: {actual} != {expected}")
+    return mismatches
+
+
+def measure_ranking(candidates: int, seed: int = 0) -> dict:
+    rnd = random.Random(seed)
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(candidates)]
+    tally = _build_tally(
+        _pick_books(rnd, weights) for _ in range(candidates * BALLOTS_PER_CANDIDATE)
+    )
+
+    started_at = time.perf_counter()
+    _rank_tally(tally)
+    elapsed = time.perf_counter() - started_at
+
+    tracemalloc.start()
+    _rank_tally(tally)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "candidates": len(tally.candidates),
+        "ms": round(elapsed * 1000, 1),
+        "peak_mib": round(peak / 2**20, 1),
+    }
+
+
+def _rank_tally(tally: VoteTally) -> None:
+    schulze_matrix.compute_ranks_from_matrix(tally.candidates, tally.get_d_matrix())
+
+
+def _random_ranks(rnd: random.Random, candidates: list[int]) -> list[list[int]]:
+    """Returns ranking of some of the candidates with ties"""
+    ranked = rnd.sample(candidates, rnd.randint(1, len(candidates)))
+    ranks: list[list[int]] = []
+    for candidate in ranked:
+        if ranks and rnd.random() < 0.3:
+            ranks[-1].append(candidate)
+        else:
+            ranks.append([candidate])
+    return ranks
+
+
+def _random_ballot(rnd: random.Random, candidates: list[int]) -> list[int]:
+    return rnd.sample(candidates, min(len(candidates), rnd.randint(1, 3)))
+
+
+def _pick_books(rnd: random.Random, weights: list[float]) -> list[int]:
+    books: list[int] = []
+    while len(books) < 3:
+        book = rnd.choices(range(len(weights)), weights)[0]
+        if book not in books:
+            books.append(book)
+    return books
+
+
+def _build_tally(ballots) -> VoteTally:
+    """Returns the tally the bot keeps for the ballots"""
+    ballots_count = 0
+    candidate_ballots: Counter[int] = Counter()
+    preferences: Counter[tuple[int, int]] = Counter()
+    for ballot in ballots:
+        ballots_count += 1
+        candidate_ballots.update(ballot)
+        preferences.update(
+            (preferred, other)
+            for i, preferred in enumerate(ballot)
+            for other in ballot[i + 1 :]
+        )
+    return VoteTally(ballots_count, dict(candidate_ballots), dict(preferences))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--elections", type=int, default=2000)
+    parser.add_argument("--candidates", type=int, nargs="*", default=[300, 1000, 3000])
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+    mismatches = check_rankings(args.elections)
+    for mismatch in mismatches:
+        logger.error(mismatch)
+    logger.info(
+        "%s elections checked, %s rankings differ", args.elections, len(mismatches)
+    )
+
+    report = json.dumps(
+        [measure_ranking(candidates) for candidates in args.candidates], indent=2
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Measures latency of /search queries on the FTS5 index of a synthetic
+catalog: typical queries (a word prefix, an author, a title)
+and the worst case, a word which is in every title of the catalog.
+
+Usage: python -m benchmarks.search [--books N] [--queries N] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_db import _TOPICS, Scale, create_synthetic_db
+from botanim_bot import config, db
+from botanim_bot.services import books
+
+
+def _get_queries(books_count: int, count: int, seed: int = 0) -> dict[str, list[str]]:
+    rnd = random.Random(seed)
+    topics = [topic.split()[0].lower() for topic in _TOPICS]
+    return {
+        "word prefix": [rnd.choice(topics)[:4] for _ in range(count)],
+        "author": [f"author {rnd.randrange(997)}" for _ in range(count)],
+        "title": [f"book {rnd.randrange(1, books_count)}" for _ in range(count)],
+        "word in every title": ["book"] * count,
+    }
+
+
+async def _measure(queries: list[str]) -> dict:
+    times = []
+    found = 0
+    for query in queries:
+        started_at = time.perf_counter()
+        found += len(await books.search_books(query))
+        times.append(time.perf_counter() - started_at)
+    return {
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(statistics.quantiles(times, n=20)[-1] * 1000, 2),
+        "found_per_query": round(found / len(queries), 1),
+    }
+
+
+async def run(db_file: Path, books_count: int, queries_count: int) -> dict:
+    db.get_db.db = db.Database(db_file, config.SQLITE_READ_POOL_SIZE)
+    config.SQL_SLOW_STATEMENT_THRESHOLD = float("inf")  # the worst case is slow
+    try:
+        await books.search_books("warm up")
+        return {
+            name: await _measure(queries)
+            for name, queries in _get_queries(books_count, queries_count).items()
+        }
+    finally:
+        await db.async_close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "search.sqlite3"
+        create_synthetic_db(
+            db_file,
+            Scale(categories=200, books=args.books, users=1, votings=1, votes=1),
+        )
+        report = json.dumps(
+            asyncio.run(run(db_file, args.books, args.queries)), indent=2
+        )
+
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Measures the cold start of the bot: imports of botanim_bot.__main__ in a new
+interpreter, post_init on a synthetic database and the first responses to
+commands, with templates compiled in advance and compiled on the start.
+
+Reports the slowest imports by `python -X importtime` and exits with status 1
+if the start until the first response takes longer than the budget.
+
+Usage: python -m benchmarks.startup [--budget-ms N] [--output FILE]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+FIRST_COMMANDS = ("start", "allbooks", "voteresults")
+TOP_IMPORTS = 15
+
+_IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure_start(db_file: Path, templates_cache_dir: Path) -> dict:
+    """Runs in the measured interpreter, returns timings in milliseconds"""
+    started_at = time.perf_counter()
+    import botanim_bot.__main__ as bot_main
+
+    imported_at = time.perf_counter()
+
+    import asyncio
+
+    timings = asyncio.run(_run_first_commands(bot_main, db_file, templates_cache_dir))
+    return {
+        "import_ms": _ms(imported_at - started_at),
+        **timings,
+        "ready_ms": _ms(time.perf_counter() - started_at),
+    }
+
+
+async def _run_first_commands(
+    bot_main, db_file: Path, templates_cache_dir: Path
+) -> dict:
+    from types import SimpleNamespace
+
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder
+
+    from benchmarks.fake_bot_api import FakeBotApi, create_bot, make_message_update
+    from botanim_bot import config, db
+    from botanim_bot.application import ConcurrentApplication
+    from botanim_bot.services.loader import request_scope
+    from botanim_bot.services.vote_results import stop_leaders_refresh
+
+    config.TEMPLATES_CACHE_DIR = templates_cache_dir
+    db.get_db.db = db.Database(db_file, config.SQLITE_READ_POOL_SIZE)
+    bot = create_bot(FakeBotApi())
+    application = (
+        ApplicationBuilder()
+        .bot(bot)
+        .application_class(ConcurrentApplication, kwargs={"concurrency": 1})
+        .build()
+    )
+    bot_main.add_handlers(application)
+    timings = {}
+    started_at = time.perf_counter()
+    try:
+        await application.initialize()
+        await bot_main.post_init(application)
+        timings["post_init_ms"] = _ms(time.perf_counter() - started_at)
+
+        context = SimpleNamespace(bot=bot)
+        for update_id, name in enumerate(FIRST_COMMANDS, start=1):
+            update = Update.de_json(make_message_update(update_id, 1, f"/{name}"), bot)
+            started_at = time.perf_counter()
+            with request_scope():
+                await bot_main.COMMAND_HANDLERS[name](update, context)
+            timings[f"first_{name}_ms"] = _ms(time.perf_counter() - started_at)
+    finally:
+        await application.shutdown()
+        await stop_leaders_refresh()
+        await db.async_close_db()
+    return timings
+
+
+def run_measured_start(
+    db_file: Path, templates_cache_dir: Path
+) -> tuple[dict, list[dict]]:
+    """Starts the bot in a new interpreter, returns its timings and the slowest
+    imports"""
+    env = {
+        **os.environ,
+        "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN") or "1:offline",
+        "TELEGRAM_BOTANIM_CHANNEL_ID": os.getenv("TELEGRAM_BOTANIM_CHANNEL_ID") or "-1",
+    }
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-m",
+            "benchmarks.startup",
+            "--measure-start",
+            str(db_file),
+            str(templates_cache_dir),
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(process.stdout), _get_slowest_imports(process.stderr)
+
+
+def _get_slowest_imports(importtime_output: str) -> list[dict]:
+    """Returns top level imports of the bot and of its dependencies
+    ordered by cumulative time"""
+    imports = []
+    for line in importtime_output.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match is None or len(match.group(3)) > 3:
+            continue
+        imports.append(
+            {
+                "module": match.group(4),
+                "self_ms": round(int(match.group(1)) / 1000, 1),
+                "cumulative_ms": round(int(match.group(2)) / 1000, 1),
+            }
+        )
+    imports.sort(key=lambda i: i["cumulative_ms"], reverse=True)
+    return imports[:TOP_IMPORTS]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure-start":
+        json.dump(measure_start(Path(sys.argv[2]), Path(sys.argv[3])), sys.stdout)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic_db import Scale, create_synthetic_db
+    from botanim_bot import config
+    from botanim_bot.templates import compile_templates
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = Path(tmp_dir) / "startup.sqlite3"
+        create_synthetic_db(
+            db_file,
+            Scale(categories=50, books=1000, users=1000, votings=5, votes=5000),
+        )
+        config.TEMPLATES_CACHE_DIR = Path(tmp_dir) / "templates_compiled"
+        compile_templates()
+        compiled, imports = run_measured_start(db_file, config.TEMPLATES_CACHE_DIR)
+        compiled_on_start, _ = run_measured_start(
+            db_file, Path(tmp_dir) / "templates_compiled_on_start"
+        )
+
+    problems = []
+    if compiled["ready_ms"] > args.budget_ms:
+        problems.append(
+            f"start took {compiled['ready_ms']}ms, budget is {args.budget_ms}ms"
+        )
+    report = json.dumps(
+        {
+            "budget_ms": args.budget_ms,
+            "compiled_templates": compiled,
+            "templates_compiled_on_start": compiled_on_start,
+            "slowest_imports": imports,
+            "problems": problems,
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
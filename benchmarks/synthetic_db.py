@@ -0,0 +1,220 @@
+"""Creates SQLite database of the bot filled with synthetic data."""
+import argparse
+import random
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from botanim_bot import config
+from botanim_bot.db import get_migrations
+
+
+@dataclass
+class Scale:
+    categories: int = 200
+    books: int = 10_000
+    users: int = 100_000
+    votings: int = 50
+    votes: int = 1_000_000
+
+
+def create_synthetic_db(path: Path, scale: Scale, seed: int = 0) -> None:
+    """Creates database with the schema of db.sql and all migrations applied.
+
+    The last voting is the actual one, other votings and some books
+    are in the past"""
+    path.unlink(missing_ok=True)
+    rnd = random.Random(seed)
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.executescript((config.BASE_DIR / "db.sql").read_text())
+    for version, sql in get_migrations():
+        connection.executescript(f"{sql}\nPRAGMA user_version={version};")
+
+    connection.execute("BEGIN")
+    triggers = _drop_triggers(connection)
+    _fill_catalog(connection, scale, rnd)
+    _fill_users(connection, scale)
+    _fill_votes(connection, scale, rnd)
+    for trigger_sql in triggers:
+        connection.execute(trigger_sql)
+    connection.execute("COMMIT")
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+def _drop_triggers(connection: sqlite3.Connection) -> list[str]:
+    """Drops triggers for the bulk load, returns SQL to create them back"""
+    triggers = connection.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger'"
+    ).fetchall()
+    for name, _ in triggers:
+        connection.execute(f"DROP TRIGGER {name}")
+    return [sql for _, sql in triggers]
+
+
+def _fill_catalog(connection: sqlite3.Connection, scale: Scale, rnd: random.Random):
+    connection.executemany(
+        "INSERT INTO book_category (id, name, ordering) VALUES (?, ?, ?)",
+        (
+            (category_id, f"Category {category_id}", category_id * 10)
+            for category_id in range(1, scale.categories + 1)
+        ),
+    )
+
+    today = date.today()
+    books = []
+    for book_id in range(1, scale.books + 1):
+        read_start = read_finish = None
+        if book_id % 50 == 0:
+            read_start = today + timedelta(days=rnd.randint(-2000, 60))
+            read_finish = read_start + timedelta(days=rnd.randint(7, 40))
+        books.append(
+            (
+                book_id,
+                f"Book {book_id} about {rnd.choice(_TOPICS)} :: Author {book_id % 997}",
+                book_id % scale.categories + 1,
+                book_id,
+                read_start and read_start.isoformat(),
+                read_finish and read_finish.isoformat(),
+                read_start and f"Comment {book_id}",
+            )
+        )
+    connection.executemany(
+        """
+        INSERT INTO book
+            (id, name, category_id, ordering, read_start, read_finish, read_comments)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        books,
+    )
+    connection.execute(
+        """
+        UPDATE book SET positional_number = numbers.positional_number
+        FROM (
+            SELECT
+                b.id,
+                ROW_NUMBER() OVER (ORDER BY c.ordering, b.ordering)
+                    AS positional_number
+            FROM book b LEFT JOIN book_category c ON c.id=b.category_id
+            WHERE b.read_start IS NULL
+        ) numbers
+        WHERE numbers.id = book.id
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO book_search (rowid, title, author)
+        SELECT id, title, author FROM book_search_source
+        """
+    )
+    connection.execute("UPDATE catalog_version SET version = version + 1")
+
+
+def _fill_users(connection: sqlite3.Connection, scale: Scale) -> None:
+    connection.executemany(
+        "INSERT INTO bot_user (telegram_id) VALUES (?)",
+        ((user_id,) for user_id in range(1, scale.users + 1)),
+    )
+
+
+def _fill_votes(connection: sqlite3.Connection, scale: Scale, rnd: random.Random):
+    today = date.today()
+    for voting_id in range(1, scale.votings + 1):
+        voting_start = today - timedelta(days=30 * (scale.votings - voting_id) + 1)
+        connection.execute(
+            "INSERT INTO voting (id, voting_start, voting_finish) VALUES (?, ?, ?)",
+            (
+                voting_id,
+                voting_start.isoformat(),
+                (voting_start + timedelta(days=5)).isoformat(),
+            ),
+        )
+
+    not_started_books = [
+        row[0]
+        for row in connection.execute(
+            "SELECT id FROM book WHERE read_start IS NULL ORDER BY id"
+        )
+    ]
+    votes_per_voting = min(scale.votes // scale.votings, scale.users)
+    for voting_id in range(1, scale.votings + 1):
+        popular_books = rnd.sample(not_started_books, min(300, len(not_started_books)))
+        ballots = [
+            (
+                voting_id,
+                user_id,
+                *rnd.sample(popular_books, config.VOTE_ELEMENTS_COUNT),
+            )
+            for user_id in rnd.sample(range(1, scale.users + 1), votes_per_voting)
+        ]
+        connection.executemany(
+            """
+            INSERT INTO vote
+                (vote_id, user_id, first_book_id, second_book_id, third_book_id)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            ballots,
+        )
+        _fill_vote_tally(connection, voting_id, ballots)
+
+
+def _fill_vote_tally(
+    connection: sqlite3.Connection, voting_id: int, ballots: list[tuple]
+) -> None:
+    candidate_ballots = Counter()
+    preferences = Counter()
+    for _, _, *book_ids in ballots:
+        for index, preferred_book_id in enumerate(book_ids):
+            candidate_ballots[preferred_book_id] += 1
+            for other_book_id in book_ids[index + 1 :]:
+                preferences[preferred_book_id, other_book_id] += 1
+
+    connection.executemany(
+        "INSERT INTO vote_candidate_tally (vote_id, book_id, ballots) VALUES (?, ?, ?)",
+        ((voting_id, *item) for item in candidate_ballots.items()),
+    )
+    connection.executemany(
+        """
+        INSERT INTO vote_preference_tally
+            (vote_id, preferred_book_id, other_book_id, ballots)
+        VALUES (?, ?, ?, ?)
+        """,
+        ((voting_id, *pair, count) for pair, count in preferences.items()),
+    )
+    connection.execute(
+        "UPDATE voting SET ballots_count=? WHERE id=?", (len(ballots), voting_id)
+    )
+
+
+_TOPICS = (
+    "Python",
+    "Go",
+    "Rust",
+    "SQL",
+    "algorithms",
+    "architecture",
+    "testing",
+    "Linux",
+    "security",
+    "machine learning",
+)
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser, scale: Scale) -> None:
+    for field, value in vars(scale).items():
+        parser.add_argument(f"--{field}", type=int, default=value)
+
+
+def get_scale(args: argparse.Namespace) -> Scale:
+    return Scale(**{field: getattr(args, field) for field in vars(Scale())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    add_scale_arguments(parser, Scale())
+    args = parser.parse_args()
+    create_synthetic_db(args.path, get_scale(args), args.seed)
@@ -0,0 +1,133 @@
+"""Measures the cost of book clubs served by one process: memory per open idle
+club after its first update, memory left after clubs were closed by the LRU,
+and the time of the first update of a club, which opens its database.
+
+Every club gets a copy of one small synthetic database, the first update of
+a club reads the first page of its catalog, vote mode and vote leaders,
+as the bot does.
+
+Usage: python -m benchmarks.tenants [--tenants N] [--output FILE]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic_db import Scale, create_synthetic_db
+from botanim_bot import config, tenants
+from botanim_bot.services import books, vote_mode, vote_results
+
+
+async def _handle_first_update() -> None:
+    await books.get_category_page(0)
+    await vote_mode.load_vote_mode()
+    await vote_results.get_leaders()
+
+
+async def _open_tenants(tenant_ids: list[str]) -> list[float]:
+    """Handles the first update of every club, returns their times"""
+    times = []
+    for tenant_id in tenant_ids:
+        started_at = time.perf_counter()
+        async with tenants.tenant_scope(tenants.get_tenants()[tenant_id]):
+            await _handle_first_update()
+        times.append(time.perf_counter() - started_at)
+    return times
+
+
+def _get_memory() -> tuple[int, int]:
+    """Returns Python heap and resident set size of the process in bytes"""
+    gc.collect()
+    heap, _ = tracemalloc.get_traced_memory()
+    try:
+        status = Path("/proc/self/status").read_text()
+        rss_kib = next(
+            int(line.split()[1]) for line in status.splitlines() if line[:6] == "VmRSS:"
+        )
+    except (OSError, StopIteration):  # not Linux, the peak is the best guess
+        rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return heap, rss_kib * 1024
+
+
+async def run(tenants_count: int) -> dict:
+    tenant_ids = [f"club{i}" for i in range(tenants_count + 2)]
+    config.TENANTS_MAX_OPEN = tenants_count
+    tracemalloc.start()
+    try:
+        await _open_tenants(tenant_ids[:1])  # imports and process-wide caches
+        heap_before, rss_before = _get_memory()
+        open_times = await _open_tenants(tenant_ids[1:-1])
+        heap_open, rss_open = _get_memory()
+
+        config.TENANTS_MAX_OPEN = 1
+        await _open_tenants(tenant_ids[-1:])  # closes all other clubs
+        heap_closed, rss_closed = _get_memory()
+    finally:
+        tracemalloc.stop()
+        await tenants.close_tenants()
+
+    opened = len(open_times)
+    return {
+        "tenants": tenants_count,
+        "open_idle_tenant": {
+            "heap_kib": round((heap_open - heap_before) / opened / 1024, 1),
+            "rss_kib": round((rss_open - rss_before) / opened / 1024, 1),
+        },
+        "closed_tenant": {
+            "heap_kib": round((heap_closed - heap_before) / opened / 1024, 1),
+            "rss_kib": round((rss_closed - rss_before) / opened / 1024, 1),
+        },
+        "first_update_ms": {
+            "p50": round(statistics.median(open_times) * 1000, 2),
+            "max": round(max(open_times) * 1000, 2),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tenants_dir = Path(tmp_dir) / "tenants"
+        tenants_dir.mkdir()
+        template_db = Path(tmp_dir) / "template.sqlite3"
+        create_synthetic_db(
+            template_db,
+            Scale(categories=10, books=150, users=50, votings=3, votes=100),
+        )
+        tenants_file = Path(tmp_dir) / "tenants.json"
+        tenants_file.write_text(
+            json.dumps(
+                [
+                    {"id": f"club{i}", "channel_id": -1000 - i}
+                    for i in range(args.tenants + 2)
+                ]
+            )
+        )
+        for i in range(args.tenants + 2):
+            shutil.copyfile(template_db, tenants_dir / f"club{i}.sqlite3")
+
+        config.TENANTS_FILE = tenants_file
+        config.TENANTS_DB_DIR = tenants_dir
+        config.TENANTS_REGISTRY_DB_FILE = tenants_dir / "tenants.registry.sqlite3"
+        report = json.dumps(asyncio.run(run(args.tenants)), indent=2)
+
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Compares update throughput and delivery latency of polling and webhook modes.
+
+Both modes run the real Application with the bot handlers against offline Bot
+API. Telegram side is simulated with a fixed one-way network latency: in polling
+mode getUpdates answers with the pending updates (long polling), in webhook mode
+updates are POSTed to the local webhook server over at most
+WEBHOOK_MAX_CONNECTIONS connections, one update per request, like Telegram does.
+
+Two workloads are measured: a backlog of updates available at once and updates
+arriving at a steady rate. Latency is the time from the arrival of an update
+to Telegram to the end of its handling by the bot.
+
+Usage: python -m benchmarks.webhook [--updates N] [--latency MS] [--rate N]
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, ContextTypes, TypeHandler
+
+from benchmarks.fake_bot_api import BOT_TOKEN, FakeBotApi, make_message_update
+from botanim_bot import config
+from botanim_bot.webhook import SECRET_TOKEN_HEADER, WebhookServer
+
+SECRET_TOKEN = "benchmark-secret"  # noqa: S105
+COMMANDS = ("/start", "/help")
+
+
+@dataclass
+class TransportReport:
+    updates: int
+    updates_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+class _TelegramForPolling(FakeBotApi):
+    """Answers getUpdates with the arrived updates, waiting for them
+    up to the long polling timeout"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self._latency = latency
+        self._updates: collections.deque[dict] = collections.deque()
+        self._updates_arrived = asyncio.Event()
+
+    def publish(self, update: dict) -> None:
+        self._updates.append(update)
+        self._updates_arrived.set()
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        if not url.endswith("/getUpdates"):
+            return await super().do_request(url, method, request_data, **kwargs)
+
+        params = request_data.parameters if request_data else {}
+        await asyncio.sleep(self._latency)
+        while self._updates and self._updates[0]["update_id"] < params.get("offset", 0):
+            self._updates.popleft()
+        if not self._updates:
+            self._updates_arrived.clear()
+            try:
+                await asyncio.wait_for(
+                    self._updates_arrived.wait(), params.get("timeout", 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        updates = list(self._updates)[: params.get("limit", 100)]
+        await asyncio.sleep(self._latency)
+        return 200, json.dumps({"ok": True, "result": updates}).encode()
+
+
+class _HandledUpdates:
+    def __init__(self, expected: int):
+        self.handled_at: dict[int, float] = {}
+        self._expected = expected
+        self._all_handled = asyncio.Event()
+
+    async def __call__(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        self.handled_at[update.update_id] = time.perf_counter()
+        if len(self.handled_at) >= self._expected:
+            self._all_handled.set()
+
+    async def wait(self) -> None:
+        await self._all_handled.wait()
+
+
+def _build_application(bot_api: FakeBotApi, handled: _HandledUpdates) -> Application:
+    from botanim_bot.__main__ import add_handlers
+
+    application = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(bot_api)
+        .get_updates_request(bot_api)
+        .build()
+    )
+    add_handlers(application)
+    application.add_handler(TypeHandler(Update, handled), group=1)
+    return application
+
+
+async def _publish(
+    count: int, rate: float | None, publish: Callable[[dict], Awaitable[None]]
+) -> dict[int, float]:
+    """Publishes `count` updates, all at once if `rate` is None,
+    returns arrival time of every update"""
+    arrived_at = {}
+    started_at = time.perf_counter()
+    for update_id in range(1, count + 1):
+        if rate is not None:
+            await asyncio.sleep(
+                max(0, started_at + (update_id - 1) / rate - time.perf_counter())
+            )
+        text = COMMANDS[update_id % len(COMMANDS)]
+        arrived_at[update_id] = time.perf_counter()
+        await publish(make_message_update(update_id, 1000 + update_id % 100, text))
+    return arrived_at
+
+
+async def _run_polling(count: int, rate: float | None, latency: float) -> dict:
+    telegram = _TelegramForPolling(latency)
+    handled = _HandledUpdates(count)
+    application = _build_application(telegram, handled)
+
+    async def publish(update: dict) -> None:
+        telegram.publish(update)
+
+    async with application:
+        await application.start()
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+        arrived_at = await _publish(count, rate, publish)
+        await handled.wait()
+        await application.updater.stop()
+        await application.stop()
+    return _make_report(arrived_at, handled.handled_at)
+
+
+async def _run_webhook(count: int, rate: float | None, latency: float) -> dict:
+    handled = _HandledUpdates(count)
+    application = _build_application(FakeBotApi(), handled)
+    server = WebhookServer(
+        application, "127.0.0.1", 0, config.WEBHOOK_PATH, SECRET_TOKEN
+    )
+    outgoing: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def deliver() -> None:
+        """Delivers updates over one keep-alive connection, like Telegram does"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        try:
+            while True:
+                update = await outgoing.get()
+                await asyncio.sleep(latency)
+                await _post_update(reader, writer, config.WEBHOOK_PATH, update)
+                await asyncio.sleep(latency)
+        finally:
+            writer.close()
+
+    async with application:
+        await application.start()
+        await server.start()
+        deliveries = [
+            asyncio.create_task(deliver())
+            for _ in range(config.WEBHOOK_MAX_CONNECTIONS)
+        ]
+        arrived_at = await _publish(count, rate, outgoing.put)
+        await handled.wait()
+        for delivery in deliveries:
+            delivery.cancel()
+        await asyncio.gather(*deliveries, return_exceptions=True)
+        await server.stop()
+        await application.stop()
+    return _make_report(arrived_at, handled.handled_at)
+
+
+async def _post_update(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, update: dict
+) -> None:
+    # raw HTTP/1.1 instead of an HTTP client library,
+    # so that the client side is not the bottleneck
+    body = json.dumps(update).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        f"{SECRET_TOKEN_HEADER}: {SECRET_TOKEN}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response_head = await reader.readuntil(b"\r\n\r\n")
+    if not response_head.startswith(b"HTTP/1.1 200 "):
+        raise RuntimeError(f"Webhook answered {response_head!r}")
+
+
+def _make_report(arrived_at: dict[int, float], handled_at: dict[int, float]) -> dict:
+    latencies = [
+        (handled_at[update_id] - arrived) * 1000
+        for update_id, arrived in arrived_at.items()
+    ]
+    duration = max(handled_at.values()) - min(arrived_at.values())
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return asdict(
+        TransportReport(
+            updates=len(latencies),
+            updates_per_second=round(len(latencies) / duration, 1),
+            p50_ms=round(percentiles[49], 3),
+            p95_ms=round(percentiles[94], 3),
+            p99_ms=round(percentiles[98], 3),
+        )
+    )
+
+
+async def run_benchmarks(count: int, rate: float, latency: float) -> dict:
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or BOT_TOKEN
+    config.TELEGRAM_BOTANIM_CHANNEL_ID = config.TELEGRAM_BOTANIM_CHANNEL_ID or -1
+
+    reports = {}
+    for mode, run in (("polling", _run_polling), ("webhook", _run_webhook)):
+        reports[mode] = {
+            "backlog": await run(count, None, latency),
+            "steady": await run(count, rate, latency),
+        }
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument(
+        "--latency", type=float, default=20, help="one-way network latency, ms"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=200, help="updates per second, steady workload"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file, stdout by default")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    modes = asyncio.run(run_benchmarks(args.updates, args.rate, args.latency / 1000))
+    report = json.dumps(
+        {
+            "updates": args.updates,
+            "latency_ms": args.latency,
+            "rate": args.rate,
+            "modes": modes,
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
+import functools
 import logging
 
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CallbackQueryHandler,
     CommandHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
 )
 
-from botanim_bot import config, handlers
-from botanim_bot.db import close_db
+from botanim_bot import config, handlers, metrics, tenants
+from botanim_bot.application import ConcurrentApplication
+from botanim_bot.db import apply_migrations, async_close_db, close_db
+from botanim_bot.handlers.keyboards import CATEGORY_PAGE_CALLBACK_SUFFIX
+from botanim_bot.handlers.tenant import in_tenant_scope
+from botanim_bot.services.validation import close_http_client
+from botanim_bot.services.vote_mode import flush_vote_mode, load_vote_mode
+from botanim_bot.services.vote_results import get_leaders, stop_leaders_refresh
+from botanim_bot.services.vote_tally import rebuild_vote_tally_if_inconsistent
+from botanim_bot.services.votings import get_actual_or_last_voting
+from botanim_bot.templates import get_render_cache_entries, preload_templates
 
 COMMAND_HANDLERS = {
     "start": handlers.start,
@@ -18,13 +30,20 @@ COMMAND_HANDLERS = {
     "already": handlers.already,
     "now": handlers.now,
     "vote": handlers.vote,
+    "search": handlers.search,
     "cancel": handlers.cancel,
     "voteresults": handlers.vote_results,
+    "broadcast": handlers.broadcast,
+    "sqlstats": handlers.sql_stats,
 }
 
 CALLBACK_QUERY_HANDLERS = {
-    rf"^{config.ALL_BOOKS_CALLBACK_PATTERN}(\d+)$": handlers.all_books_button,
-    rf"^{config.VOTE_BOOKS_CALLBACK_PATTERN}(\d+)$": handlers.vote_button,
+    rf"^{config.ALL_BOOKS_CALLBACK_PATTERN}(\d+){CATEGORY_PAGE_CALLBACK_SUFFIX}$": (
+        handlers.all_books_button
+    ),
+    rf"^{config.VOTE_BOOKS_CALLBACK_PATTERN}(\d+){CATEGORY_PAGE_CALLBACK_SUFFIX}$": (
+        handlers.vote_button
+    ),
 }
 
 
@@ -34,27 +53,153 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-if not config.TELEGRAM_BOT_TOKEN or not config.TELEGRAM_BOTANIM_CHANNEL_ID:
+if not config.TELEGRAM_BOT_TOKEN or not (
+    config.TELEGRAM_BOTANIM_CHANNEL_ID or config.TENANTS_FILE
+):
     raise ValueError(
-        "TELEGRAM_BOT_TOKEN and TELEGRAM_BOTANIM_CHANNEL_ID env variables "
-        "wasn't implemented in .env (both should be initialized)."
+        "TELEGRAM_BOT_TOKEN and TELEGRAM_BOTANIM_CHANNEL_ID (or TENANTS_FILE) env "
+        "variables wasn't implemented in .env (both should be initialized)."
     )
 
+if config.BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE env variable should be polling or webhook.")
+
+if config.BOT_MODE == "webhook" and not config.WEBHOOK_SECRET_TOKEN:
+    raise ValueError("WEBHOOK_SECRET_TOKEN env variable is required in webhook mode.")
+
+
+async def post_init(application: Application) -> None:
+    if metrics.is_enabled():
+        _add_metrics_gauges(application)
+        await metrics.start_metrics_server()
+    preload_templates()
+    if tenants.is_multi_tenant():
+        tenants.get_tenants()  # fails on start if TENANTS_FILE is invalid
+        tenants.add_open_hook(functools.partial(_prepare_tenant, application))
+        return
+    await apply_migrations()
+    await _prepare_tenant(application)
+
+
+async def _prepare_tenant(application: Application) -> None:
+    """Warms up the state of the current tenant and resumes its broadcasts"""
+    await load_vote_mode()
+    voting = await get_actual_or_last_voting()
+    if voting is not None:
+        await rebuild_vote_tally_if_inconsistent(voting.id)
+        # the first /voteresults gets ready leaders, the bot doesn't wait for them
+        application.create_task(_precompute_leaders())
+    application.create_task(_resume_broadcasts(application))
+
+
+async def _precompute_leaders() -> None:
+    async with tenants.keep_open():
+        await get_leaders()
+
+
+async def _resume_broadcasts(application: Application) -> None:
+    # broadcasts are rare, their module is imported after the bot started
+    from botanim_bot.services.broadcast import resume_broadcasts
+
+    async with tenants.keep_open():
+        await resume_broadcasts(application.bot)
+
+
+async def post_shutdown(_: Application) -> None:
+    from botanim_bot.services.broadcast import stop_broadcasts
+
+    await metrics.stop_metrics_server()
+    await tenants.close_tenants()
+    await stop_broadcasts()
+    await stop_leaders_refresh()
+    await close_http_client()
+    await flush_vote_mode()
+    await async_close_db()
+
 
 def main():
-    application = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).build()
+    builder = (
+        ApplicationBuilder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .application_class(
+            ConcurrentApplication, kwargs={"concurrency": config.UPDATES_CONCURRENCY}
+        )
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if config.METRICS_PORT:
+        metrics.enable()
+        builder = builder.request(
+            metrics.InstrumentedRequest(connection_pool_size=256)
+        ).get_updates_request(metrics.InstrumentedRequest())
+    application = builder.build()
+    add_handlers(application)
+
+    if config.BOT_MODE == "webhook":
+        from botanim_bot.webhook import run_webhook
+
+        run_webhook(application)
+    else:
+        application.run_polling()
 
+
+def add_handlers(application: Application) -> None:
     for command_name, command_handler in COMMAND_HANDLERS.items():
-        application.add_handler(CommandHandler(command_name, command_handler))
+        application.add_handler(
+            CommandHandler(
+                command_name, _wrap_handler(f"/{command_name}", command_handler)
+            )
+        )
 
     for pattern, handler in CALLBACK_QUERY_HANDLERS.items():
-        application.add_handler(CallbackQueryHandler(handler, pattern=pattern))
+        application.add_handler(
+            CallbackQueryHandler(
+                _wrap_handler(handler.__name__, handler), pattern=pattern
+            )
+        )
 
     application.add_handler(
-        MessageHandler(filters.TEXT & (~filters.COMMAND), handlers.vote_process)
+        MessageHandler(
+            filters.TEXT & (~filters.COMMAND),
+            _wrap_handler("vote_process", handlers.vote_process),
+        )
+    )
+    application.add_handler(
+        InlineQueryHandler(_wrap_handler("inline_search", handlers.inline_search))
     )
 
-    application.run_polling()
+
+def _wrap_handler(name: str, handler):
+    handler = metrics.instrument_handler(name, handler)
+    if tenants.is_multi_tenant():
+        handler = in_tenant_scope(handler)
+    return handler
+
+
+def _add_metrics_gauges(application: Application) -> None:
+    if isinstance(application, ConcurrentApplication):
+        for field in (
+            "update_queue_size",
+            "users_in_progress",
+            "queued_updates",
+            "processed_updates",
+        ):
+            metrics.add_gauge(
+                f"botanim_{field}",
+                field.replace("_", " ").capitalize(),
+                lambda field=field: getattr(application.get_updates_stats(), field),
+            )
+    metrics.add_gauge(
+        "botanim_render_cache_entries",
+        "Rendered messages in the caches of open book clubs",
+        get_render_cache_entries,
+    )
+    if tenants.is_multi_tenant():
+        metrics.add_gauge(
+            "botanim_open_tenants",
+            "Book clubs with open databases",
+            tenants.get_open_tenants_count,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""Application processing updates of different users concurrently.
+
+Every user with pending updates gets one task which processes his updates one by
+one in order of arrival, so a ballot message never overtakes the preceding
+/vote. At most UPDATES_CONCURRENCY users are processed at once, when all slots
+are busy the updates wait in the update queue.
+"""
+import asyncio
+import collections
+import logging
+import statistics
+import time
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+from telegram import Update
+from telegram.ext import Application
+
+from botanim_bot.services.loader import request_scope
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 1000
+
+
+@dataclass
+class UpdatesStats:
+    update_queue_size: int
+    users_in_progress: int
+    queued_updates: int  # waiting for earlier updates of the same user
+    processed_updates: int
+    user_wait_p50_ms: float  # over the last WAIT_SAMPLES updates
+    user_wait_p95_ms: float
+    user_wait_max_ms: float
+    slot_wait_max_ms: float  # longest wait of the update queue for a free slot
+
+
+class ConcurrentApplication(Application):
+    def __init__(self, *, concurrency: int, **kwargs):
+        super().__init__(**kwargs)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._user_updates: dict[Hashable, collections.deque[tuple[object, float]]] = {}
+        self._user_waits: collections.deque[float] = collections.deque(
+            maxlen=WAIT_SAMPLES
+        )
+        self._slot_wait_max = 0.0
+        self._processed_updates = 0
+
+    async def process_update(self, update: object) -> None:
+        """Schedules the update after the pending updates of its user,
+        waits for a free slot if the user has no pending updates"""
+        if not self.running:
+            with request_scope():
+                await super().process_update(update)
+            return
+
+        key = _get_order_key(update)
+        user_updates = self._user_updates.get(key)
+        if user_updates is not None:
+            user_updates.append((update, time.monotonic()))
+            return
+
+        self._user_updates[key] = collections.deque([(update, time.monotonic())])
+        waiting_since = time.monotonic()
+        await self._slots.acquire()
+        self._slot_wait_max = max(self._slot_wait_max, time.monotonic() - waiting_since)
+        self.create_task(self._process_user_updates(key))
+
+    def get_updates_stats(self) -> UpdatesStats:
+        waits = sorted(self._user_waits) or [0.0]
+        return UpdatesStats(
+            update_queue_size=self.update_queue.qsize(),
+            users_in_progress=len(self._user_updates),
+            queued_updates=sum(len(u) for u in self._user_updates.values())
+            - len(self._user_updates),
+            processed_updates=self._processed_updates,
+            user_wait_p50_ms=round(statistics.median(waits) * 1000, 3),
+            user_wait_p95_ms=round(waits[int(len(waits) * 0.95)] * 1000, 3),
+            user_wait_max_ms=round(waits[-1] * 1000, 3),
+            slot_wait_max_ms=round(self._slot_wait_max * 1000, 3),
+        )
+
+    async def _process_user_updates(self, key: Hashable) -> None:
+        user_updates = self._user_updates[key]
+        try:
+            while user_updates:
+                update, queued_at = user_updates[0]
+                self._user_waits.append(time.monotonic() - queued_at)
+                try:
+                    with request_scope():
+                        await super().process_update(update)
+                except Exception:
+                    logger.exception("Failed to process update %s", update)
+                self._processed_updates += 1
+                user_updates.popleft()
+        finally:
+            del self._user_updates[key]
+            self._slots.release()
+
+
+def _get_order_key(update: object) -> Hashable:
+    """Updates with the same key are processed in order"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return ("user", update.effective_user.id)
+        if update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+    return object()  # no order required
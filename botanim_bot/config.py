@@ -8,16 +8,91 @@ load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_BOTANIM_CHANNEL_ID = int(os.getenv("TELEGRAM_BOTANIM_CHANNEL_ID", "0"))
+# telegram ids of users allowed to run admin commands, comma separated
+ADMIN_IDS = {int(id_) for id_ in os.getenv("ADMIN_IDS", "").split(",") if id_.strip()}
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling or webhook
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public URL, set on start if not empty
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_MAX_CONNECTIONS = 40
+WEBHOOK_MAX_BODY_SIZE = 1024 * 1024  # bytes
+
+# Prometheus metrics are served on the port if it is set
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# JSON list of book clubs served by the bot, see tenants.py,
+# the only club is TELEGRAM_BOTANIM_CHANNEL_ID if not set
+TENANTS_FILE = Path(os.environ["TENANTS_FILE"]) if os.getenv("TENANTS_FILE") else None
+TENANTS_MAX_OPEN = int(os.getenv("TENANTS_MAX_OPEN", "32"))  # databases open at once
+
+# updates of different users processed at once
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "32"))
 
 
 BASE_DIR = Path(__file__).resolve().parent
 SQLITE_DB_FILE = BASE_DIR / "db.sqlite3"
+SQLITE_READ_POOL_SIZE = 4
+DB_SCHEMA_FILE = BASE_DIR / "db.sql"
+TENANTS_DB_DIR = Path(os.getenv("TENANTS_DB_DIR", BASE_DIR / "tenants"))
+# a dot can't be in tenant ids, so the name doesn't clash with their databases
+TENANTS_REGISTRY_DB_FILE = TENANTS_DB_DIR / "tenants.registry.sqlite3"
+TENANT_READ_POOL_SIZE = 1
+TENANTS_USER_CACHE_MAX_SIZE = 100_000  # users whose chosen clubs are in memory
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_BUSY_TIMEOUT = 5000  # milliseconds
+GROUP_COMMIT_WINDOW = 0.005  # seconds
+GROUP_COMMIT_MAX_BATCH = 200
+# statements running longer are logged with their query plan
+SQL_SLOW_STATEMENT_THRESHOLD = float(os.getenv("SQL_SLOW_STATEMENT_THRESHOLD", "0.1"))
+SQL_STATS_TOP = 10
+SQL_FETCH_CHUNK_SIZE = 500  # rows read at once by streaming reads
 TEMPLATES_DIR = BASE_DIR / "templates"
+TEMPLATES_CACHE_DIR = Path(
+    os.getenv("TEMPLATES_CACHE_DIR", BASE_DIR / "templates_compiled")
+)
+MIGRATIONS_DIR = BASE_DIR / "migrations"
 
 DATE_FORMAT = "%d.%m.%Y"
 VOTE_ELEMENTS_COUNT = 3
 
 VOTE_RESULTS_TOP = 10
+VOTE_LEADERS_REFRESH_DELAY = 1  # seconds
+
+CATALOG_VERSION_CHECK_INTERVAL = 5  # seconds
+
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", "600"))  # seconds
+MEMBERSHIP_NEGATIVE_CACHE_TTL = int(
+    os.getenv("MEMBERSHIP_NEGATIVE_CACHE_TTL", "60")
+)  # seconds
+MEMBERSHIP_CACHE_MAX_SIZE = 100_000
+
+VOTE_MODE_TTL = int(os.getenv("VOTE_MODE_TTL", "86400"))  # seconds
+VOTE_MODE_FLUSH_INTERVAL = 1  # seconds
+
+BROADCAST_RATE = 25  # messages per second, Telegram allows about 30
+BROADCAST_PER_CHAT_INTERVAL = 1  # seconds between messages to one chat
+BROADCAST_WORKERS = 8
+BROADCAST_PAGE_SIZE = 200  # recipients read at once
+BROADCAST_PROGRESS_BATCH = 10  # recipients sent between saves of the progress
+BROADCAST_MAX_ATTEMPTS = 5
+
+RENDER_CACHE_MAX_SIZE = 8 * 1024 * 1024  # bytes
+TENANT_RENDER_CACHE_MAX_SIZE = 1024 * 1024  # bytes for every open club
+
+TELEGRAM_API_TIMEOUT = 5  # seconds
+TELEGRAM_API_MAX_CONNECTIONS = 20
+
+SEARCH_RESULTS_LIMIT = 10
+SEARCH_MAX_WORDS = 8  # words of /search query, the rest are ignored
+INLINE_RESULTS_LIMIT = 20  # Telegram shows up to 50 inline results
+INLINE_QUERY_CACHE_TIME = 60  # seconds Telegram caches answers to inline queries
+
+# books on a page of a category, the message must fit 4096 characters
+CATEGORY_PAGE_SIZE = 25
 
 ALL_BOOKS_CALLBACK_PATTERN = "all_books_"
 VOTE_BOOKS_CALLBACK_PATTERN = "vote_"
@@ -1,76 +1,540 @@
 import asyncio
-from collections.abc import Iterable
-from typing import Any, LiteralString
+import functools
+import inspect
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, LiteralString, TypeVar
 
 import aiosqlite
 
-from botanim_bot import config
+from botanim_bot import config, metrics
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# tenant of SQLITE_DB_FILE, the only one without TENANTS_FILE
+DEFAULT_TENANT_ID = "default"
+
+_transaction_connection: ContextVar[aiosqlite.Connection | None] = ContextVar(
+    "transaction_connection", default=None
+)
+_snapshot_connection: ContextVar[aiosqlite.Connection | None] = ContextVar(
+    "snapshot_connection", default=None
+)
+# database of the current tenant, SQLITE_DB_FILE one if not set
+_current_database: ContextVar["Database | None"] = ContextVar(
+    "current_database", default=None
+)
+
+
+@dataclass
+class StatementStats:
+    fingerprint: str
+    calls: int = 0
+    total_time: float = 0.0  # seconds
+    max_time: float = 0.0
+    rows: int = 0  # returned by reads, changed by writes
+
+
+# tenant id -> SQL fingerprint -> stats of its executions
+_statement_stats: dict[str, dict[str, StatementStats]] = {}
+
+
+class Database:
+    """SQLite database in WAL mode with one writer connection
+    and a pool of read-only connections, so reads never wait for writes.
+
+    Statements are profiled and measured under `tenant_id`."""
+
+    def __init__(
+        self,
+        db_file: Path,
+        read_pool_size: int,
+        on_connect: Callable[[aiosqlite.Connection], Awaitable[None]] | None = None,
+        tenant_id: str = DEFAULT_TENANT_ID,
+    ):
+        self.tenant_id = tenant_id
+        self._db_file = db_file
+        self._read_pool_size = read_pool_size
+        self._on_connect = on_connect
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._readers_count = 0
+        self._connections: list[aiosqlite.Connection] = []
+        self._writer: aiosqlite.Connection | None = None
+        self._writer_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+        self._group_commit_batch: list[
+            tuple[Callable[[], Awaitable[Any]], asyncio.Future]
+        ] = []
+        self._group_commit_task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        connection = await self._acquire_reader()
+        try:
+            yield connection
+        finally:
+            self._readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Runs the block in a transaction of the writer connection,
+        nested blocks join the outer transaction"""
+        connection = _transaction_connection.get()
+        if connection is not None:
+            yield connection
+            return
+
+        async with self._writer_lock:
+            connection = await self._get_writer()
+            token = _transaction_connection.set(connection)
+            try:
+                # cancelled BEGIN still runs in the connection thread,
+                # the rollback queued after it ends the transaction
+                try:
+                    await connection.execute("BEGIN IMMEDIATE")
+                    yield connection
+                except BaseException:
+                    await connection.rollback()
+                    raise
+                await connection.commit()
+            finally:
+                _transaction_connection.reset(token)
+
+    @asynccontextmanager
+    async def read_snapshot(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Runs reads of the block in one read transaction of a pool connection,
+        so they see the same state of the database. Reads in a transaction
+        or an outer snapshot keep using its connection"""
+        connection = _transaction_connection.get() or _snapshot_connection.get()
+        if connection is not None:
+            yield connection
+            return
+
+        async with self.reader() as connection:
+            token = _snapshot_connection.set(connection)
+            try:
+                await connection.execute("BEGIN")
+                try:
+                    yield connection
+                finally:
+                    await connection.rollback()
+            finally:
+                _snapshot_connection.reset(token)
+
+    async def group_commit(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Runs `operation` in a transaction shared with other operations
+        submitted within GROUP_COMMIT_WINDOW seconds. Each operation runs in its
+        own savepoint, so its failure is reported only to its caller.
+
+        Can't be called in a transaction: the group waits for the writer
+        connection the transaction holds until the call returns"""
+        if _transaction_connection.get() is not None:
+            raise RuntimeError("group_commit() is called in a transaction")
+        future = asyncio.get_running_loop().create_future()
+        self._group_commit_batch.append((operation, future))
+        if self._group_commit_task is None:
+            self._group_commit_task = asyncio.create_task(self._flush_group_commit())
+            self._group_commit_task.add_done_callback(self._on_group_commit_flushed)
+        return await future
+
+    async def apply_migrations(self, migrations: Iterable[tuple[int, str]]) -> None:
+        """Applies migrations newer than the database version,
+        version is stored in PRAGMA user_version"""
+        async with self._writer_lock:
+            connection = await self._get_writer()
+            async with connection.execute("PRAGMA user_version") as cursor:
+                (database_version,) = await cursor.fetchone() or (0,)
+            for version, sql in migrations:
+                if version <= database_version:
+                    continue
+                try:
+                    await connection.executescript(
+                        f"BEGIN IMMEDIATE;\n{sql}\nPRAGMA user_version={version};\n"
+                        "COMMIT;"
+                    )
+                except Exception:
+                    if connection.in_transaction:
+                        await connection.rollback()
+                    raise
+
+    async def close(self) -> None:
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+        self._readers = asyncio.Queue()
+        self._readers_count = 0
+        self._writer = None
+
+    async def _flush_group_commit(self) -> None:
+        _transaction_connection.set(None)  # don't join transaction of the submitter
+        batch: list[tuple[Callable[[], Awaitable[Any]], asyncio.Future]] = []
+        try:
+            await asyncio.sleep(config.GROUP_COMMIT_WINDOW)
+            self._group_commit_task = None
+            batch, self._group_commit_batch = self._group_commit_batch, []
+            for start in range(0, len(batch), config.GROUP_COMMIT_MAX_BATCH):
+                await self._commit_group(
+                    batch[start : start + config.GROUP_COMMIT_MAX_BATCH]
+                )
+        finally:
+            # callers of the groups not committed because of cancellation
+            # or BaseException must not wait forever, their changes are rolled back
+            _cancel_futures(batch)
+
+    def _on_group_commit_flushed(self, task: asyncio.Task) -> None:
+        """Cancels the batch of the flush cancelled before it took the batch,
+        the next submitter starts a new flush"""
+        if self._group_commit_task is not task:
+            return
+        self._group_commit_task = None
+        batch, self._group_commit_batch = self._group_commit_batch, []
+        _cancel_futures(batch)
+
+    async def _commit_group(
+        self, batch: list[tuple[Callable[[], Awaitable[Any]], asyncio.Future]]
+    ) -> None:
+        results: list[tuple[Any, Exception | None]] = []
+        try:
+            async with self.transaction() as connection:
+                for operation, _ in batch:
+                    await connection.execute("SAVEPOINT group_commit_operation")
+                    try:
+                        results.append((await operation(), None))
+                    except Exception as e:
+                        await connection.execute("ROLLBACK TO group_commit_operation")
+                        results.append((None, e))
+                    await connection.execute("RELEASE group_commit_operation")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (result, error), (_, future) in zip(results, batch, strict=True):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        try:
+            return self._readers.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+
+        if self._readers_count < self._read_pool_size:
+            self._readers_count += 1
+            try:
+                await self._get_writer()  # writer switches database to WAL mode
+                return await self._connect(query_only=True)
+            except BaseException:
+                self._readers_count -= 1
+                raise
+        return await self._readers.get()
+
+    async def _get_writer(self) -> aiosqlite.Connection:
+        async with self._connect_lock:
+            if self._writer is None:
+                self._writer = await self._connect(query_only=False)
+        return self._writer
+
+    async def _connect(self, query_only: bool) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(
+            self._db_file,
+            isolation_level=None,
+            cached_statements=config.SQLITE_CACHED_STATEMENTS,
+        )
+        self._connections.append(connection)
+        await connection.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT}")
+        if query_only:
+            await connection.execute("PRAGMA query_only=1")
+        else:
+            await connection.execute("PRAGMA journal_mode=WAL")
+            await connection.execute("PRAGMA synchronous=NORMAL")
+        if self._on_connect is not None:
+            await self._on_connect(connection)
+        return connection
+
+
+def get_db() -> Database:
+    database = _current_database.get()
+    if database is not None:
+        return database
 
-async def get_db() -> aiosqlite.Connection:
     if not getattr(get_db, "db", None):
-        db = await aiosqlite.connect(config.SQLITE_DB_FILE)
-        get_db.db = db
+        get_db.db = Database(config.SQLITE_DB_FILE, config.SQLITE_READ_POOL_SIZE)
 
     return get_db.db
 
 
+@contextmanager
+def use_database(database: Database) -> Iterator[None]:
+    """Runs the block with `database` instead of the default one,
+    the block doesn't join the transaction of other database"""
+    database_token = _current_database.set(database)
+    transaction_token = _transaction_connection.set(None)
+    snapshot_token = _snapshot_connection.set(None)
+    try:
+        yield
+    finally:
+        _snapshot_connection.reset(snapshot_token)
+        _transaction_connection.reset(transaction_token)
+        _current_database.reset(database_token)
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[aiosqlite.Connection]:
+    async with get_db().transaction() as connection:
+        yield connection
+
+
+@asynccontextmanager
+async def read_snapshot() -> AsyncIterator[aiosqlite.Connection]:
+    async with get_db().read_snapshot() as connection:
+        yield connection
+
+
+def get_migrations() -> list[tuple[int, str]]:
+    """Returns (version, sql) of migrations from MIGRATIONS_DIR,
+    version is the number prefix of the migration file name"""
+    return sorted(
+        (int(path.name.split("_", 1)[0]), path.read_text())
+        for path in config.MIGRATIONS_DIR.glob("*.sql")
+    )
+
+
+async def apply_migrations() -> None:
+    await get_db().apply_migrations(get_migrations())
+
+
+async def group_commit(operation: Callable[[], Awaitable[T]]) -> T:
+    return await get_db().group_commit(operation)
+
+
+async def fetch_records(
+    sql: LiteralString,
+    record_factory: Callable[..., T],
+    params: Iterable[Any] | None = None,
+) -> list[T]:
+    """Returns records built by `record_factory` from rows,
+    see iterate_records() for the factory requirements"""
+    return [
+        record
+        async for chunk in fetch_chunks(sql, record_factory, params)
+        for record in chunk
+    ]
+
+
+async def iterate_records(
+    sql: LiteralString,
+    record_factory: Callable[..., T],
+    params: Iterable[Any] | None = None,
+    chunk_size: int | None = None,
+) -> AsyncIterator[T]:
+    """Yields records built by `record_factory` from rows without loading
+    all of them, the factory is called with row values as positional arguments
+    and must have parameters named as the selected columns in their order.
+
+    The connection is busy until the iteration ends, use contextlib.aclosing()
+    if the iteration can be stopped earlier"""
+    async with aclosing(
+        fetch_chunks(sql, record_factory, params, chunk_size)
+    ) as chunks:
+        async for chunk in chunks:
+            for record in chunk:
+                yield record
+
+
+async def fetch_chunks(
+    sql: LiteralString,
+    record_factory: Callable[..., T],
+    params: Iterable[Any] | None = None,
+    chunk_size: int | None = None,
+) -> AsyncIterator[list[T]]:
+    """Yields lists of at most `chunk_size` records, see iterate_records()"""
+    chunk_size = chunk_size or config.SQL_FETCH_CHUNK_SIZE
+    async with _connection_for_read() as connection:
+        started_at = time.perf_counter()
+        cursor = await _get_cursor(connection, sql, params)
+        elapsed = time.perf_counter() - started_at
+        rows_count = 0
+        try:
+            _check_record_factory(record_factory, _get_column_names(cursor))
+            while True:
+                started_at = time.perf_counter()
+                rows = await cursor.fetchmany(chunk_size)
+                elapsed += time.perf_counter() - started_at
+                if not rows:
+                    break
+                rows_count += len(rows)
+                yield [record_factory(*row_) for row_ in rows]
+        finally:
+            await cursor.close()
+        await _record_statement(connection, sql, params, elapsed, rows_count)
+
+
 async def fetch_all(
     sql: LiteralString, params: Iterable[Any] | None = None
 ) -> list[dict]:
-    cursor = await _get_cursor(sql, params)
-    rows = await cursor.fetchall()
-    results = []
-    for row_ in rows:
-        results.append(_get_result_with_column_names(cursor, row_))
-    await cursor.close()
-    return results
+    async with _connection_for_read() as connection:
+        started_at = time.perf_counter()
+        cursor = await _get_cursor(connection, sql, params)
+        rows = await cursor.fetchall()
+        column_names = _get_column_names(cursor)
+        await cursor.close()
+        elapsed = time.perf_counter() - started_at
+        await _record_statement(connection, sql, params, elapsed, len(rows))
+    return [dict(zip(column_names, row_, strict=True)) for row_ in rows]
 
 
 async def fetch_one(
     sql: LiteralString, params: Iterable[Any] | None = None
 ) -> dict | None:
-    cursor = await _get_cursor(sql, params)
-    row_ = await cursor.fetchone()
-    if not row_:
+    async with _connection_for_read() as connection:
+        started_at = time.perf_counter()
+        cursor = await _get_cursor(connection, sql, params)
+        row_ = await cursor.fetchone()
+        column_names = _get_column_names(cursor)
         await cursor.close()
+        elapsed = time.perf_counter() - started_at
+        await _record_statement(connection, sql, params, elapsed, int(bool(row_)))
+    if not row_:
         return None
-    row = _get_result_with_column_names(cursor, row_)
-    await cursor.close()
-    return row
+    return dict(zip(column_names, row_, strict=True))
 
 
-async def execute(
-    sql: LiteralString, params: Iterable[Any] | None = None, *, autocommit: bool = True
-) -> None:
-    db = await get_db()
-    args: tuple[LiteralString, Iterable[Any] | None] = (sql, params)
-    await db.execute(*args)
-    if autocommit:
-        await db.commit()
+async def execute(sql: LiteralString, params: Iterable[Any] | None = None) -> None:
+    """Executes statement in the current transaction or in its own one"""
+    async with transaction() as connection:
+        started_at = time.perf_counter()
+        cursor = await _get_cursor(connection, sql, params)
+        await cursor.close()
+        elapsed = time.perf_counter() - started_at
+        await _record_statement(connection, sql, params, elapsed, cursor.rowcount)
+
+
+def get_statement_stats(top: int) -> list[StatementStats]:
+    """Returns `top` statements of the current tenant by total time
+    since the start"""
+    statements = sorted(
+        _statement_stats.get(get_db().tenant_id, {}).values(),
+        key=lambda s: s.total_time,
+        reverse=True,
+    )
+    return statements[:top]
 
 
 def close_db() -> None:
-    asyncio.run(_async_close_db())
+    asyncio.run(async_close_db())
 
 
-async def _async_close_db() -> None:
-    await (await get_db()).close()
+async def async_close_db() -> None:
+    db = getattr(get_db, "db", None)
+    if db is None:
+        return
+    get_db.db = None
+    await db.close()
+
+
+@asynccontextmanager
+async def _connection_for_read() -> AsyncIterator[aiosqlite.Connection]:
+    """Reads in a transaction see its own changes, reads in a snapshot use its
+    connection, other reads go to the pool"""
+    connection = _transaction_connection.get() or _snapshot_connection.get()
+    if connection is not None:
+        yield connection
+        return
+
+    async with get_db().reader() as connection:
+        yield connection
 
 
 async def _get_cursor(
-    sql: LiteralString, params: Iterable[Any] | None
+    connection: aiosqlite.Connection, sql: LiteralString, params: Iterable[Any] | None
 ) -> aiosqlite.Cursor:
-    db = await get_db()
     args: tuple[LiteralString, Iterable[Any] | None] = (sql, params)
-    cursor = await db.execute(*args)
-    db.row_factory = aiosqlite.Row
-    return cursor
+    return await connection.execute(*args)
+
+
+def _get_column_names(cursor: aiosqlite.Cursor) -> list[str]:
+    return [d[0] for d in cursor.description]
+
+
+def _check_record_factory(
+    record_factory: Callable[..., Any], column_names: list[str]
+) -> None:
+    """Raises ValueError if factory parameters don't match selected columns,
+    so a changed SELECT can't silently shift values between record fields"""
+    parameter_names = _get_parameter_names(record_factory)
+    if parameter_names != tuple(column_names):
+        raise ValueError(
+            f"Columns {column_names} don't match parameters {parameter_names} "
+            f"of {record_factory.__qualname__}"
+        )
+
+
+@functools.lru_cache(maxsize=256)
+def _get_parameter_names(record_factory: Callable[..., Any]) -> tuple[str, ...]:
+    return tuple(inspect.signature(record_factory).parameters)
 
 
-def _get_result_with_column_names(cursor: aiosqlite.Cursor, row: aiosqlite.Row) -> dict:
-    column_names = [d[0] for d in cursor.description]
-    resulting_row = {}
-    for index, column_name in enumerate(column_names):
-        resulting_row[column_name] = row[index]
-    return resulting_row
+async def _record_statement(
+    connection: aiosqlite.Connection,
+    sql: LiteralString,
+    params: Iterable[Any] | None,
+    elapsed: float,
+    rows: int,
+) -> None:
+    """Adds the statement to the profile, logs it if it is slow"""
+    fingerprint = metrics.get_sql_fingerprint(sql)
+    tenant_id = get_db().tenant_id
+    tenant_stats = _statement_stats.setdefault(tenant_id, {})
+    stats = tenant_stats.get(fingerprint)
+    if stats is None:
+        stats = tenant_stats[fingerprint] = StatementStats(fingerprint)
+    stats.calls += 1
+    stats.total_time += elapsed
+    stats.max_time = max(stats.max_time, elapsed)
+    stats.rows += max(rows, 0)
+    metrics.SQL_DURATION.observe(elapsed, tenant_id, fingerprint)
+
+    if elapsed >= config.SQL_SLOW_STATEMENT_THRESHOLD:
+        await _log_slow_statement(connection, sql, params, elapsed)
+
+
+async def _log_slow_statement(
+    connection: aiosqlite.Connection,
+    sql: LiteralString,
+    params: Iterable[Any] | None,
+    elapsed: float,
+) -> None:
+    try:
+        cursor = await _get_cursor(connection, f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = "\n".join(row_[-1] for row_ in await cursor.fetchall())
+        await cursor.close()
+    except aiosqlite.Error as e:
+        plan = f"not available: {e}"
+    logger.warning(
+        "Slow SQL statement, %.1f ms:\n%s\nparams: %.500r\nplan:\n%s",
+        elapsed * 1000,
+        " ".join(sql.split()),
+        params,
+        plan,
+    )
+
+
+def _cancel_futures(
+    batch: list[tuple[Callable[[], Awaitable[Any]], asyncio.Future]]
+) -> None:
+    for _, future in batch:
+        if not future.done():
+            future.cancel()
@@ -1,13 +1,39 @@
+import importlib
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
 from .all_books import all_books, all_books_button
 from .already import already
 from .cancel import cancel
 from .help import help_
+from .inline import inline_search
 from .now import now
+from .search import search
+from .sql_stats import sql_stats
 from .start import start
 from .vote import vote, vote_button
 from .vote_process import vote_process
 from .vote_results import vote_results
 
+
+def _lazy_handler(module_name: str, handler_name: str):
+    """Returns handler which imports its module on the first call,
+    rarely used handlers don't slow down the bot start"""
+
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        module = importlib.import_module(module_name, __name__)
+        # the import binds the module to the package attribute of the same name
+        globals()[handler_name] = getattr(module, handler_name)
+        return await getattr(module, handler_name)(update, context)
+
+    handler.__name__ = handler_name
+    return handler
+
+
+# the broadcast service is imported only by its handler
+broadcast = _lazy_handler(".broadcast", "broadcast")
+
 __all__ = [
     "start",
     "help_",
@@ -20,4 +46,8 @@ __all__ = [
     "vote_button",
     "vote",
     "cancel",
+    "search",
+    "inline_search",
+    "broadcast",
+    "sql_stats",
 ]
@@ -3,15 +3,18 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from botanim_bot import config
-from botanim_bot.handlers.keyboards import get_categories_keyboard
+from botanim_bot.handlers.keyboards import (
+    get_categories_keyboard,
+    parse_category_page_callback_data,
+)
 from botanim_bot.handlers.response import send_response
-from botanim_bot.services.books import get_all_books
+from botanim_bot.services.books import get_category_page
 from botanim_bot.templates import render_template
 
 
 async def all_books(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    categories_with_books = list(await get_all_books())
-    if not update.message:
+    page = await get_category_page(0)
+    if not update.message or page is None:
         return
 
     await send_response(
@@ -19,12 +22,14 @@ async def all_books(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context,
         render_template(
             "category_with_books.j2",
-            {"category": categories_with_books[0], "start_index": None},
+            {"category": page.category, "numbered": False},
+            cache_key=page.cache_key,
         ),
         get_categories_keyboard(
             current_category_index=0,
-            categories_count=len(categories_with_books),
+            categories_count=page.categories_count,
             callback_prefix=config.ALL_BOOKS_CALLBACK_PATTERN,
+            page=page,
         ),
     )
 
@@ -34,25 +39,25 @@ async def all_books_button(update: Update, _: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     if not query.data or not query.data.strip():
         return
-    categories_with_books = list(await get_all_books())
-    current_category_index = _get_current_category_index(query.data)
+    category_index, after_book_id, before_book_id = parse_category_page_callback_data(
+        query.data, config.ALL_BOOKS_CALLBACK_PATTERN
+    )
+    page = await get_category_page(
+        category_index, after_book_id=after_book_id, before_book_id=before_book_id
+    )
+    if page is None:
+        return
     await query.edit_message_text(
         text=render_template(
             "category_with_books.j2",
-            {
-                "category": categories_with_books[current_category_index],
-                "start_index": None,
-            },
+            {"category": page.category, "numbered": False},
+            cache_key=page.cache_key,
         ),
         reply_markup=get_categories_keyboard(
-            current_category_index=current_category_index,
-            categories_count=len(categories_with_books),
+            current_category_index=page.category_index,
+            categories_count=page.categories_count,
             callback_prefix=config.ALL_BOOKS_CALLBACK_PATTERN,
+            page=page,
         ),
         parse_mode=telegram.constants.ParseMode.HTML,
     )
-
-
-def _get_current_category_index(query_data) -> int:
-    pattern_prefix_length = len(config.ALL_BOOKS_CALLBACK_PATTERN)
-    return int(query_data[pattern_prefix_length:])
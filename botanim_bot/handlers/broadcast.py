@@ -0,0 +1,67 @@
+from typing import cast
+
+from telegram import Message, Update, User
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from botanim_bot import config
+from botanim_bot.handlers.response import send_response
+from botanim_bot.services.broadcast import (
+    get_broadcast_stats,
+    get_last_broadcast_stats,
+    start_broadcast,
+)
+from botanim_bot.templates import render_template
+
+
+async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast <text> sends the text to all users of the bot,
+    /broadcast without text shows progress of the last broadcast"""
+    user_id = cast(User, update.effective_user).id
+    if user_id not in config.ADMIN_IDS:
+        return
+
+    text = _get_broadcast_text(cast(Message, update.message))
+    if not text:
+        await _send_last_broadcast_stats(update, context)
+        return
+
+    try:  # the admin gets the message first, it validates its HTML markup
+        await send_response(update, context, response=text)
+    except BadRequest as e:
+        await send_response(
+            update,
+            context,
+            response=render_template("broadcast_incorrect_text.j2", {"error": str(e)}),
+        )
+        return
+
+    broadcast_id = await start_broadcast(context.bot, user_id, text)
+    await send_response(
+        update,
+        context,
+        response=render_template(
+            "broadcast_started.j2",
+            {
+                "broadcast_id": broadcast_id,
+                "stats": await get_broadcast_stats(broadcast_id),
+            },
+        ),
+    )
+
+
+async def _send_last_broadcast_stats(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    stats = await get_last_broadcast_stats()
+    if stats is None:
+        response = render_template("broadcast_no_data.j2")
+    else:
+        response = render_template("broadcast_status.j2", {"stats": stats})
+    await send_response(update, context, response=response)
+
+
+def _get_broadcast_text(message: Message) -> str:
+    """Returns message text without the command, keeping its formatting"""
+    parts = (message.text or "").split(maxsplit=1)
+    return parts[1].strip() if len(parts) > 1 else ""
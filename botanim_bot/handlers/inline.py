@@ -0,0 +1,39 @@
+import telegram
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+from botanim_bot import config, tenants
+from botanim_bot.services.book_index import get_plain_book_name, search_book_index
+from botanim_bot.templates import render_template
+
+
+async def inline_search(update: Update, _: ContextTypes.DEFAULT_TYPE):
+    """@bot <words> in any chat shows books whose names have words starting
+    with the typed ones, the chosen book is sent with its number for voting"""
+    query = update.inline_query
+    if query is None:
+        return
+    found_books = await search_book_index(query.query, config.INLINE_RESULTS_LIMIT)
+    results = [
+        InlineQueryResultArticle(
+            id=str(book.id),
+            title=(
+                f"{book.positional_number}. {get_plain_book_name(book)}"
+                if book.positional_number is not None
+                else get_plain_book_name(book)
+            ),
+            description=book.category_name,
+            input_message_content=InputTextMessageContent(
+                render_template("inline_book.j2", {"book": book}),
+                parse_mode=telegram.constants.ParseMode.HTML,
+                disable_web_page_preview=True,
+            ),
+        )
+        for book in found_books
+    ]
+    await query.answer(
+        results,
+        cache_time=config.INLINE_QUERY_CACHE_TIME,
+        # clubs have different catalogs, the club is chosen by the user
+        is_personal=tenants.is_multi_tenant(),
+    )
@@ -1,8 +1,22 @@
+import re
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from botanim_bot.services.books import CategoryPage
+
+# <callback prefix><category index>[_a<book id> | _b<book id>], the page of the
+# category after or before the book, the first page without the suffix
+CATEGORY_PAGE_CALLBACK_SUFFIX = r"(?:_[ab]\d+)?"
+_PAGE_AFTER = "a"
+_PAGE_BEFORE = "b"
+_CATEGORY_PAGE_RE = re.compile(r"(\d+)(?:_([ab])(\d+))?$")
+
 
 def get_categories_keyboard(
-    current_category_index: int, categories_count: int, callback_prefix: str
+    current_category_index: int,
+    categories_count: int,
+    callback_prefix: str,
+    page: CategoryPage | None = None,
 ) -> InlineKeyboardMarkup:
     prev_index = current_category_index - 1
     if prev_index < 0:
@@ -22,4 +36,43 @@ def get_categories_keyboard(
             ),
         ]
     ]
+    if page is not None and (page.has_previous or page.has_next):
+        keyboard.append(_get_pages_buttons(page, callback_prefix))
     return InlineKeyboardMarkup(keyboard)
+
+
+def parse_category_page_callback_data(
+    query_data: str, callback_prefix: str
+) -> tuple[int, int | None, int | None]:
+    """Returns category index, after book id and before book id
+    from callback data of get_categories_keyboard()"""
+    match = _CATEGORY_PAGE_RE.match(query_data, len(callback_prefix))
+    if match is None:
+        raise ValueError(f"Invalid category page callback data {query_data!r}")
+    category_index, direction, book_id = match.groups()
+    if book_id is None:
+        return int(category_index), None, None
+    if direction == _PAGE_AFTER:
+        return int(category_index), int(book_id), None
+    return int(category_index), None, int(book_id)
+
+
+def _get_pages_buttons(
+    page: CategoryPage, callback_prefix: str
+) -> list[InlineKeyboardButton]:
+    books = page.category.books
+    page_prefix = f"{callback_prefix}{page.category_index}_"
+    buttons = []
+    if page.has_previous:
+        buttons.append(
+            InlineKeyboardButton(
+                "« назад", callback_data=f"{page_prefix}{_PAGE_BEFORE}{books[0].id}"
+            )
+        )
+    if page.has_next:
+        buttons.append(
+            InlineKeyboardButton(
+                "дальше »", callback_data=f"{page_prefix}{_PAGE_AFTER}{books[-1].id}"
+            )
+        )
+    return buttons
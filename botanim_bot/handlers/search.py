@@ -0,0 +1,30 @@
+from typing import cast
+
+from telegram import Message, Update
+from telegram.ext import ContextTypes
+
+from botanim_bot.handlers.response import send_response
+from botanim_bot.services.books import search_books
+from botanim_bot.templates import render_template
+
+
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <words> finds books by words of their titles and authors"""
+    text = _get_search_text(cast(Message, update.message))
+    if not text:
+        await send_response(
+            update, context, response=render_template("search_no_query.j2")
+        )
+        return
+
+    found_books = await search_books(text)
+    if not found_books:
+        response = render_template("search_no_results.j2", {"query": text})
+    else:
+        response = render_template("search_results.j2", {"books": found_books})
+    await send_response(update, context, response=response)
+
+
+def _get_search_text(message: Message) -> str:
+    parts = (message.text or "").split(maxsplit=1)
+    return parts[1].strip() if len(parts) > 1 else ""
@@ -0,0 +1,29 @@
+from typing import cast
+
+from telegram import Message, Update, User
+from telegram.ext import ContextTypes
+
+from botanim_bot import config
+from botanim_bot.db import get_statement_stats
+from botanim_bot.handlers.response import send_response
+from botanim_bot.templates import render_template
+
+
+async def sql_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/sqlstats [N] shows N statements with the largest total time"""
+    if cast(User, update.effective_user).id not in config.ADMIN_IDS:
+        return
+
+    statements = get_statement_stats(_get_top(cast(Message, update.message)))
+    if not statements:
+        response = render_template("sql_stats_no_data.j2")
+    else:
+        response = render_template("sql_stats.j2", {"statements": statements})
+    await send_response(update, context, response=response)
+
+
+def _get_top(message: Message) -> int:
+    parts = (message.text or "").split()
+    if len(parts) > 1 and parts[1].isdigit() and int(parts[1]) > 0:
+        return int(parts[1])
+    return config.SQL_STATS_TOP
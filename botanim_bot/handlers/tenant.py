@@ -0,0 +1,62 @@
+import functools
+from collections.abc import Awaitable, Callable
+
+from telegram import Chat, Update
+from telegram.ext import ContextTypes
+
+from botanim_bot import metrics
+from botanim_bot.handlers.response import send_response
+from botanim_bot.templates import render_template
+from botanim_bot.tenants import (
+    Tenant,
+    choose_tenant,
+    find_tenant,
+    find_user_tenant,
+    get_tenants,
+    tenant_scope,
+)
+
+
+def in_tenant_scope(
+    handler: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+) -> Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]:
+    """Returns handler running in the scope of the book club of the update,
+    users who haven't chosen a club get the explanation how to do it"""
+
+    @functools.wraps(handler)
+    async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        tenant = await _get_update_tenant(update)
+        if tenant is None:
+            if update.effective_chat is not None:
+                await send_response(
+                    update, context, response=render_template("tenant_unknown.j2")
+                )
+            return
+        metrics.TENANT_UPDATES.inc(tenant.id)
+        async with tenant_scope(tenant):
+            await handler(update, context)
+
+    return wrapped
+
+
+async def _get_update_tenant(update: Update) -> Tenant | None:
+    chat, user = update.effective_chat, update.effective_user
+    if chat is None:  # inline queries, the club chosen by the user
+        return await find_user_tenant(user.id) if user is not None else None
+    if chat.type != Chat.PRIVATE or user is None:
+        return await find_tenant(chat.id, user_id=None)
+
+    tenant = get_tenants().get(_get_start_parameter(update))
+    if tenant is not None:  # the user came by the link of the club
+        await choose_tenant(user.id, tenant)
+        return tenant
+    return await find_tenant(chat.id, user.id)
+
+
+def _get_start_parameter(update: Update) -> str:
+    """Returns parameter of /start from the link https://t.me/<bot>?start=<...>"""
+    text = update.message.text if update.message else None
+    parts = (text or "").split()
+    if len(parts) == 2 and parts[0] == "/start":
+        return parts[1]
+    return ""
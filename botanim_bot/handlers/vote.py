@@ -5,22 +5,23 @@ from telegram import Update, User
 from telegram.ext import ContextTypes
 
 from botanim_bot import config
-from botanim_bot.handlers.keyboards import get_categories_keyboard
-from botanim_bot.handlers.response import send_response
-from botanim_bot.services.books import (
-    calculate_category_books_start_index,
-    get_not_started_books,
+from botanim_bot.handlers.keyboards import (
+    get_categories_keyboard,
+    parse_category_page_callback_data,
 )
+from botanim_bot.handlers.response import send_response
+from botanim_bot.services.books import get_category_page
 from botanim_bot.services.validation import is_user_in_channel
 from botanim_bot.services.vote_mode import set_user_in_vote_mode
 from botanim_bot.services.votings import get_actual_voting
 from botanim_bot.templates import render_template
+from botanim_bot.tenants import get_current_tenant
 
 
 def validate_user(handler):
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = cast(User, update.effective_user).id
-        if not await is_user_in_channel(user_id, config.TELEGRAM_BOTANIM_CHANNEL_ID):
+        if not await is_user_in_channel(user_id, get_current_tenant().channel_id):
             await send_response(
                 update, context, response=render_template("vote_cant_vote.j2")
             )
@@ -41,21 +42,19 @@ async def vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
 
-    categories_with_books = tuple(await get_not_started_books())
-    current_category = categories_with_books[0]
-
-    category_books_start_index = calculate_category_books_start_index(
-        categories_with_books, current_category
-    )
+    page = await get_category_page(0, not_started_only=True)
+    if page is None:
+        return
 
     await set_user_in_vote_mode(cast(User, update.effective_user).id)
     await update.message.reply_text(
         render_template(
             "category_with_books.j2",
-            {"category": current_category, "start_index": category_books_start_index},
+            {"category": page.category, "numbered": True},
+            cache_key=page.cache_key,
         ),
         reply_markup=get_categories_keyboard(
-            0, len(categories_with_books), config.VOTE_BOOKS_CALLBACK_PATTERN
+            0, page.categories_count, config.VOTE_BOOKS_CALLBACK_PATTERN, page
         ),
         parse_mode=telegram.constants.ParseMode.HTML,
     )
@@ -70,28 +69,28 @@ async def vote_button(update: Update, _: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     if not query.data or not query.data.strip():
         return
-    categories_with_books = list(await get_not_started_books())
-
-    current_category_index = _get_current_category_index(query.data)
-    current_category = categories_with_books[current_category_index]
-
-    category_books_start_index = calculate_category_books_start_index(
-        categories_with_books, current_category
+    category_index, after_book_id, before_book_id = parse_category_page_callback_data(
+        query.data, config.VOTE_BOOKS_CALLBACK_PATTERN
+    )
+    page = await get_category_page(
+        category_index,
+        not_started_only=True,
+        after_book_id=after_book_id,
+        before_book_id=before_book_id,
     )
+    if page is None:
+        return
     await query.edit_message_text(
         render_template(
             "category_with_books.j2",
-            {"category": current_category, "start_index": category_books_start_index},
+            {"category": page.category, "numbered": True},
+            cache_key=page.cache_key,
         ),
         reply_markup=get_categories_keyboard(
-            current_category_index,
-            len(categories_with_books),
+            page.category_index,
+            page.categories_count,
             config.VOTE_BOOKS_CALLBACK_PATTERN,
+            page,
         ),
         parse_mode=telegram.constants.ParseMode.HTML,
     )
-
-
-def _get_current_category_index(query_data) -> int:
-    pattern_prefix_length = len(config.VOTE_BOOKS_CALLBACK_PATTERN)
-    return int(query_data[pattern_prefix_length:])
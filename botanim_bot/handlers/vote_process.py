@@ -11,6 +11,7 @@ from botanim_bot.services.books import Book, get_books_by_positional_numbers
 from botanim_bot.services.exceptions import NoActualVotingError, UserInNotVoteModeError
 from botanim_bot.services.num_to_words import num_to_words
 from botanim_bot.services.vote_mode import is_user_in_vote_mode
+from botanim_bot.services.vote_results import refresh_leaders_later
 from botanim_bot.services.votings import save_vote
 from botanim_bot.templates import render_template
 
@@ -38,7 +39,9 @@ async def vote_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        await save_vote(cast(User, update.effective_user).id, selected_books)
+        voting_id = await save_vote(
+            cast(User, update.effective_user).id, selected_books
+        )
     except NoActualVotingError:
         await send_response(
             update, context, response=render_template("vote_no_actual_voting.j2")
@@ -49,6 +52,7 @@ async def vote_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
             update, context, response=render_template("vote_user_not_in_right_mode.j2")
         )
         return
+    refresh_leaders_later(voting_id)
 
     books_count = len(selected_books)
     word_in_correct_form = num_to_words(books_count, ("книга", "книги", "книг"))
@@ -0,0 +1,282 @@
+"""Latency histograms and counters of the bot in Prometheus text format.
+
+Metrics are collected only when METRICS_PORT is set, then they are served
+on http://METRICS_LISTEN:METRICS_PORT/metrics. When metrics are disabled,
+instrumented code pays for one flag check, handlers and Bot API requests
+are not wrapped at all.
+"""
+import asyncio
+import functools
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from typing import TypeVar
+
+from telegram.request import HTTPXRequest
+
+from botanim_bot import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_enabled = False
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        label_names: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self._help = help_
+        self._label_names = label_names
+        self._buckets = buckets
+        # label values -> counts by bucket, the last one is +Inf
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, seconds: float, *label_values: str) -> None:
+        if not _enabled:
+            return
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self._buckets) + 1)
+            self._sums[label_values] = 0.0
+        for i, bucket in enumerate(self._buckets):
+            if seconds <= bucket:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self._sums[label_values] += seconds
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self._help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, counts in self._counts.items():
+            labels = _format_labels(self._label_names, label_values)
+            cumulative = 0
+            for bucket, count in zip(
+                (*map(str, self._buckets), "+Inf"), counts, strict=True
+            ):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    (*self._label_names, "le"), (*label_values, bucket)
+                )
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{labels} {self._sums[label_values]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self._help = help_
+        self._label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, value: float = 1) -> None:
+        if not _enabled:
+            return
+        self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self._help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self._values.items():
+            labels = _format_labels(self._label_names, label_values)
+            yield f"{self.name}{labels} {value}"
+
+
+class Gauge:
+    """Value read from `get_value` when metrics are scraped"""
+
+    def __init__(self, name: str, help_: str, get_value: Callable[[], float]):
+        self.name = name
+        self._help = help_
+        self._get_value = get_value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self._help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self._get_value()}"
+
+
+HANDLER_DURATION = Histogram(
+    "botanim_handler_duration_seconds",
+    "Time of update handling",
+    ("tenant", "handler"),
+)
+HANDLER_ERRORS = Counter(
+    "botanim_handler_errors_total",
+    "Handlers failed with exception",
+    ("tenant", "handler"),
+)
+SQL_DURATION = Histogram(
+    "botanim_sql_duration_seconds", "Time of SQL statements", ("tenant", "statement")
+)
+TELEGRAM_DURATION = Histogram(
+    "botanim_telegram_request_duration_seconds",
+    "Time of Bot API requests, getUpdates includes long polling",
+    ("tenant", "method"),
+)
+TELEGRAM_ERRORS = Counter(
+    "botanim_telegram_errors_total",
+    "Bot API requests failed with HTTP error status",
+    ("method", "status"),
+)
+CACHE_REQUESTS = Counter(
+    "botanim_cache_requests_total", "Cache lookups", ("tenant", "cache", "result")
+)
+VOTES_SAVED = Counter("botanim_votes_saved_total", "Saved ballots", ("tenant",))
+TENANT_UPDATES = Counter(
+    "botanim_tenant_updates_total", "Updates handled by book club", ("tenant",)
+)
+
+_metrics: list[Histogram | Counter | Gauge] = [
+    HANDLER_DURATION,
+    HANDLER_ERRORS,
+    SQL_DURATION,
+    TELEGRAM_DURATION,
+    TELEGRAM_ERRORS,
+    CACHE_REQUESTS,
+    VOTES_SAVED,
+    TENANT_UPDATES,
+]
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API requests measured by the tenant they are sent for and API method"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        # tenants imports db which imports metrics
+        from botanim_bot.tenants import get_current_tenant_id
+
+        api_method = url.rsplit("/", 1)[-1]
+        started_at = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        finally:
+            TELEGRAM_DURATION.observe(
+                time.perf_counter() - started_at, get_current_tenant_id(), api_method
+            )
+        if code >= 400:
+            TELEGRAM_ERRORS.inc(api_method, str(code))
+        return code, payload
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def add_gauge(name: str, help_: str, get_value: Callable[[], float]) -> None:
+    _metrics.append(Gauge(name, help_, get_value))
+
+
+def instrument_handler(
+    name: str, handler: Callable[..., Awaitable[T]]
+) -> Callable[..., Awaitable[T]]:
+    """Returns handler measuring its time and errors by the tenant it runs for,
+    the handler itself if metrics are disabled"""
+    if not _enabled:
+        return handler
+
+    # tenants imports db which imports metrics
+    from botanim_bot.tenants import get_current_tenant_id
+
+    @functools.wraps(handler)
+    async def instrumented(*args, **kwargs) -> T:
+        started_at = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(get_current_tenant_id(), name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(
+                time.perf_counter() - started_at, get_current_tenant_id(), name
+            )
+
+    return instrumented
+
+
+def render_metrics() -> str:
+    lines = [line for metric in _metrics for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server() -> None:
+    start_metrics_server.server = await asyncio.start_server(
+        _handle_connection, config.METRICS_LISTEN, config.METRICS_PORT
+    )
+    logger.info("Serving metrics on %s:%s", config.METRICS_LISTEN, config.METRICS_PORT)
+
+
+async def stop_metrics_server() -> None:
+    server = getattr(start_metrics_server, "server", None)
+    if server is None:
+        return
+    start_metrics_server.server = None
+    server.close()
+    await server.wait_closed()
+
+
+async def _handle_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Answers one request and closes the connection,
+    any GET request gets the metrics"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request_line.startswith(b"GET "):
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "405 Method Not Allowed", b""
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        logger.debug("Metrics client disconnected in the middle of request")
+    finally:
+        writer.close()
+
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+@functools.lru_cache(maxsize=1024)
+def get_sql_fingerprint(sql: str) -> str:
+    """Returns SQL with literals replaced by ? and collapsed whitespace,
+    so statements differing only in inlined values share the fingerprint"""
+    fingerprint = _LITERAL_RE.sub("?", " ".join(sql.split()))
+    return _IN_LIST_RE.sub("(...)", fingerprint)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{labels}}}" if labels else ""
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,36 @@
+create table catalog_version (
+  id integer primary key check (id = 1),
+  version integer not null
+);
+
+insert into catalog_version (id, version) values (1, 1);
+
+create trigger book_insert_catalog_version after insert on book
+begin
+  update catalog_version set version = version + 1;
+end;
+
+create trigger book_update_catalog_version after update on book
+begin
+  update catalog_version set version = version + 1;
+end;
+
+create trigger book_delete_catalog_version after delete on book
+begin
+  update catalog_version set version = version + 1;
+end;
+
+create trigger book_category_insert_catalog_version after insert on book_category
+begin
+  update catalog_version set version = version + 1;
+end;
+
+create trigger book_category_update_catalog_version after update on book_category
+begin
+  update catalog_version set version = version + 1;
+end;
+
+create trigger book_category_delete_catalog_version after delete on book_category
+begin
+  update catalog_version set version = version + 1;
+end;
@@ -0,0 +1,55 @@
+alter table voting add column ballots_count integer not null default 0;
+
+create table vote_candidate_tally (
+  vote_id integer,
+  book_id integer,
+  ballots integer not null,
+  foreign key(vote_id) references voting(id),
+  foreign key(book_id) references book(id),
+  primary key(vote_id, book_id)
+);
+
+create table vote_preference_tally (
+  vote_id integer,
+  preferred_book_id integer,
+  other_book_id integer,
+  ballots integer not null,
+  foreign key(vote_id) references voting(id),
+  foreign key(preferred_book_id) references book(id),
+  foreign key(other_book_id) references book(id),
+  primary key(vote_id, preferred_book_id, other_book_id)
+);
+
+update voting set ballots_count = (
+  select count(*) from vote where vote.vote_id = voting.id
+);
+
+insert into vote_candidate_tally (vote_id, book_id, ballots)
+  select vote_id, book_id, count(*)
+  from (
+    select vote_id, user_id, first_book_id as book_id from vote
+    union
+    select vote_id, user_id, second_book_id from vote
+    union
+    select vote_id, user_id, third_book_id from vote
+  )
+  group by vote_id, book_id;
+
+insert into vote_preference_tally (vote_id, preferred_book_id, other_book_id, ballots)
+  select vote_id, preferred_book_id, other_book_id, count(*)
+  from (
+    select vote_id, user_id, first_book_id as preferred_book_id,
+      second_book_id as other_book_id
+    from vote
+    where first_book_id is not second_book_id
+    union
+    select vote_id, user_id, first_book_id, third_book_id
+    from vote
+    where first_book_id is not third_book_id
+    union
+    select vote_id, user_id, second_book_id, third_book_id
+    from vote
+    where second_book_id is not third_book_id
+      and first_book_id is not third_book_id
+  )
+  group by vote_id, preferred_book_id, other_book_id;
@@ -0,0 +1,133 @@
+alter table book add column positional_number integer;
+
+create index book_positional_number_idx on book(positional_number);
+
+update book set positional_number = numbers.positional_number
+from (
+  select
+    b.id,
+    case when b.read_start is null then
+      row_number() over (
+        partition by b.read_start is null order by c.ordering, b.ordering
+      )
+    end as positional_number
+  from book b left join book_category c on c.id=b.category_id
+) numbers
+where numbers.id = book.id
+  and book.positional_number is not numbers.positional_number;
+
+-- books are numbered through the whole catalog, so a book appearing in or
+-- leaving the list of not started books renumbers the books after it
+create trigger book_insert_positional_number after insert on book
+when new.read_start is null
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      b.id,
+      case when b.read_start is null then
+        row_number() over (
+          partition by b.read_start is null order by c.ordering, b.ordering
+        )
+      end as positional_number
+    from book b left join book_category c on c.id=b.category_id
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
+
+create trigger book_update_positional_number
+after update of read_start, category_id on book
+when (old.read_start is null) != (new.read_start is null)
+  or (new.read_start is null and old.category_id is not new.category_id)
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      b.id,
+      case when b.read_start is null then
+        row_number() over (
+          partition by b.read_start is null order by c.ordering, b.ordering
+        )
+      end as positional_number
+    from book b left join book_category c on c.id=b.category_id
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
+
+create trigger book_delete_positional_number after delete on book
+when old.read_start is null
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      b.id,
+      case when b.read_start is null then
+        row_number() over (
+          partition by b.read_start is null order by c.ordering, b.ordering
+        )
+      end as positional_number
+    from book b left join book_category c on c.id=b.category_id
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
+
+-- reordering inside a category keeps the numbers of other categories,
+-- only the books of the category are renumbered from its first number
+create trigger book_reorder_positional_number after update of ordering on book
+when old.read_start is null and new.read_start is null
+  and old.category_id is new.category_id
+  and old.ordering != new.ordering
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      id,
+      (
+        select min(positional_number) - 1 from book
+        where category_id is new.category_id and read_start is null
+      ) + row_number() over (order by ordering) as positional_number
+    from book
+    where category_id is new.category_id and read_start is null
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
+
+create trigger book_category_update_positional_number
+after update of ordering on book_category
+when old.ordering != new.ordering
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      b.id,
+      case when b.read_start is null then
+        row_number() over (
+          partition by b.read_start is null order by c.ordering, b.ordering
+        )
+      end as positional_number
+    from book b left join book_category c on c.id=b.category_id
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
+
+create trigger book_category_delete_positional_number after delete on book_category
+begin
+  update book set positional_number = numbers.positional_number
+  from (
+    select
+      b.id,
+      case when b.read_start is null then
+        row_number() over (
+          partition by b.read_start is null order by c.ordering, b.ordering
+        )
+      end as positional_number
+    from book b left join book_category c on c.id=b.category_id
+  ) numbers
+  where numbers.id = book.id
+    and book.positional_number is not numbers.positional_number;
+end;
@@ -0,0 +1,18 @@
+create index book_read_start_idx on book(read_start);
+
+create index book_read_finish_idx on book(read_finish);
+
+create index vote_ballot_idx on vote(
+  vote_id, first_book_id, second_book_id, third_book_id
+);
+
+create table bot_user_in_vote_mode_new (
+  user_id bigint primary key
+);
+
+insert or ignore into bot_user_in_vote_mode_new (user_id)
+  select user_id from bot_user_in_vote_mode where user_id is not null;
+
+drop table bot_user_in_vote_mode;
+
+alter table bot_user_in_vote_mode_new rename to bot_user_in_vote_mode;
@@ -0,0 +1,4 @@
+alter table bot_user_in_vote_mode add column expires_at integer;
+
+create index bot_user_in_vote_mode_expires_at_idx
+  on bot_user_in_vote_mode (expires_at);
@@ -0,0 +1,16 @@
+create table broadcast (
+  id integer primary key,
+  created_at timestamp default current_timestamp not null,
+  created_by bigint not null,
+  text text not null,
+  status varchar(16) not null default 'running',
+  recipients_count integer not null,
+  last_user_id bigint not null default 0,
+  sent_count integer not null default 0,
+  failed_count integer not null default 0,
+  retried_count integer not null default 0,
+  finished_at timestamp,
+  check (status in ('running', 'finished'))
+);
+
+create index broadcast_status_idx on broadcast (status);
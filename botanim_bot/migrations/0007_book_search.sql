@@ -0,0 +1,40 @@
+create view book_search_source as
+  select
+    id,
+    case when instr(name, '::') > 0
+      then trim(substr(name, 1, instr(name, '::') - 1))
+      else name
+    end as title,
+    case when instr(name, '::') > 0
+      then trim(substr(name, instr(name, '::') + 2))
+      else ''
+    end as author
+  from book;
+
+create virtual table book_search using fts5(
+  title,
+  author,
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+
+insert into book_search (rowid, title, author)
+  select id, title, author from book_search_source;
+
+create trigger book_insert_search after insert on book
+begin
+  insert into book_search (rowid, title, author)
+    select id, title, author from book_search_source where id = new.id;
+end;
+
+create trigger book_update_search after update of id, name on book
+begin
+  delete from book_search where rowid = old.id;
+  insert into book_search (rowid, title, author)
+    select id, title, author from book_search_source where id = new.id;
+end;
+
+create trigger book_delete_search after delete on book
+begin
+  delete from book_search where rowid = old.id;
+end;
@@ -0,0 +1,189 @@
+"""In-memory prefix index of book names for inline queries.
+
+Inline queries come on every keypress, so they are answered from memory:
+the catalog snapshot of services.books, which asks SQLite only for the catalog
+version from time to time, and this index built from the snapshot. When the
+catalog version changes, only books whose names or statuses changed are
+reindexed.
+
+Every word of a book name is indexed by its prefixes up to INDEX_PREFIX_LENGTH
+characters, a posting list keeps sorted keys of books: books open for voting
+first, then others, by id. Books of the shortest posting list of the query
+words are checked against all query words. A longer query word which no
+indexed word starts with is found in the sorted vocabulary, it ends
+the lookup without checking books.
+"""
+import asyncio
+import bisect
+import re
+from array import array
+from dataclasses import dataclass, field
+
+from botanim_bot.services.books import Book, get_catalog
+from botanim_bot.tenants import get_tenant_state
+
+INDEX_PREFIX_LENGTH = 3
+
+_WORD_RE = re.compile(r"\w+")
+_TAG_RE = re.compile(r"<[^>]+>")
+_NOT_VOTABLE_FLAG = 1 << 40  # books which can't be voted for go after others
+_ID_MASK = _NOT_VOTABLE_FLAG - 1
+
+
+@dataclass
+class _BookIndex:
+    version: int | None = None
+    books: dict[int, Book] = field(default_factory=dict)
+    # " word1 word2 ...", " " + query word in it means a word with the prefix
+    texts: dict[int, str] = field(default_factory=dict)
+    postings: dict[str, array] = field(default_factory=dict)
+    vocabulary: list[str] = field(default_factory=list)  # sorted
+    word_counts: dict[str, int] = field(default_factory=dict)  # books by word
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+async def search_book_index(text: str, limit: int) -> list[Book]:
+    """Returns up to `limit` books whose names have words starting with all
+    words of `text`, books open for voting first"""
+    query_words = _get_words(text)
+    if not query_words:
+        return []
+    index = await _get_book_index()
+
+    postings = []
+    for word in query_words:
+        posting = index.postings.get(word[:INDEX_PREFIX_LENGTH])
+        if not posting or (
+            len(word) > INDEX_PREFIX_LENGTH and not _has_word_prefix(index, word)
+        ):
+            return []
+        postings.append(posting)
+
+    patterns = [f" {word}" for word in query_words]
+    found = []
+    for key in min(postings, key=len):
+        book_id = key & _ID_MASK
+        book_text = index.texts[book_id]
+        if all(pattern in book_text for pattern in patterns):
+            found.append(index.books[book_id])
+            if len(found) == limit:
+                break
+    return found
+
+
+def get_plain_book_name(book: Book) -> str:
+    """Returns book name without HTML markup of format_book_name()"""
+    return _TAG_RE.sub("", book.name)
+
+
+async def _get_book_index() -> _BookIndex:
+    index = get_tenant_state("book_index", _BookIndex)
+    version, categories = await get_catalog()
+    if index.version == version:
+        return index
+    async with index.lock:
+        version, categories = await get_catalog()
+        if index.version != version:
+            books = [book for category in categories for book in category.books]
+            if index.version is None:
+                _build_book_index(index, books)
+            else:
+                _update_book_index(index, books)
+            index.version = version
+    return index
+
+
+def _build_book_index(index: _BookIndex, books: list[Book]) -> None:
+    postings: dict[str, list[int]] = {}
+    for book in sorted(books, key=_get_key):  # postings are filled sorted
+        key = _get_key(book)
+        for word in _index_book_text(index, book):
+            for length in range(1, min(len(word), INDEX_PREFIX_LENGTH) + 1):
+                posting = postings.get(word[:length])
+                if posting is None:
+                    postings[word[:length]] = [key]
+                elif posting[-1] != key:  # words of the book share prefixes
+                    posting.append(key)
+    index.postings = {prefix: array("q", keys) for prefix, keys in postings.items()}
+    index.vocabulary = sorted(index.word_counts)
+
+
+def _update_book_index(index: _BookIndex, books: list[Book]) -> None:
+    """Reindexes books added, removed or changed since the last update"""
+    new_books = {book.id: book for book in books}
+    for book_id in index.books.keys() - new_books.keys():
+        _remove_book(index, index.books[book_id])
+    for book_id, book in new_books.items():
+        old_book = index.books.get(book_id)
+        if old_book is None:
+            _add_book(index, book)
+        elif old_book.name != book.name or _get_key(old_book) != _get_key(book):
+            _remove_book(index, old_book)
+            _add_book(index, book)
+        else:  # the same words, positional number or dates could change
+            index.books[book_id] = book
+
+
+def _add_book(index: _BookIndex, book: Book) -> None:
+    key = _get_key(book)
+    words = _index_book_text(index, book)
+    for prefix in _get_prefixes(words):
+        posting = index.postings.get(prefix)
+        if posting is None:
+            posting = index.postings[prefix] = array("q")
+        posting.insert(bisect.bisect_left(posting, key), key)
+    for word in words:
+        if index.word_counts[word] == 1:
+            bisect.insort(index.vocabulary, word)
+
+
+def _remove_book(index: _BookIndex, book: Book) -> None:
+    key = _get_key(book)
+    words = set(index.texts.pop(book.id).split())
+    for prefix in _get_prefixes(words):
+        posting = index.postings[prefix]
+        del posting[bisect.bisect_left(posting, key)]
+        if not posting:
+            del index.postings[prefix]
+    for word in words:
+        index.word_counts[word] -= 1
+        if not index.word_counts[word]:
+            del index.word_counts[word]
+            del index.vocabulary[bisect.bisect_left(index.vocabulary, word)]
+    del index.books[book.id]
+
+
+def _index_book_text(index: _BookIndex, book: Book) -> set[str]:
+    """Adds the book and its words to the index, returns its words"""
+    words = _get_words(get_plain_book_name(book))
+    index.books[book.id] = book
+    index.texts[book.id] = " " + " ".join(words)
+    unique_words = set(words)
+    for word in unique_words:
+        index.word_counts[word] = index.word_counts.get(word, 0) + 1
+    return unique_words
+
+
+def _has_word_prefix(index: _BookIndex, prefix: str) -> bool:
+    position = bisect.bisect_left(index.vocabulary, prefix)
+    return position < len(index.vocabulary) and index.vocabulary[position].startswith(
+        prefix
+    )
+
+
+def _get_key(book: Book) -> int:
+    if book.positional_number is None:
+        return book.id | _NOT_VOTABLE_FLAG
+    return book.id
+
+
+def _get_prefixes(words: set[str]) -> set[str]:
+    return {
+        word[:length]
+        for word in words
+        for length in range(1, min(len(word), INDEX_PREFIX_LENGTH) + 1)
+    }
+
+
+def _get_words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.casefold().replace("ё", "е"))
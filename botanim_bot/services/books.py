@@ -1,89 +1,127 @@
+import asyncio
+import functools
+import re
+import sys
+import time
 from collections.abc import Iterable
-from dataclasses import dataclass
-from datetime import datetime
-from typing import LiteralString, cast
+from dataclasses import dataclass, field
+from datetime import date
+from enum import StrEnum
+from typing import Any, LiteralString, cast
 
 from botanim_bot import config
-from botanim_bot.db import fetch_all
+from botanim_bot.db import fetch_chunks, fetch_one, fetch_records
+from botanim_bot.tenants import get_tenant_state
 
+_SEARCH_WORD_RE = re.compile(r"\w+")
 
-@dataclass
+
+class BookStatus(StrEnum):
+    PLANNED = "planned"
+    READING = "reading"
+    FINISHED = "finished"
+
+
+@dataclass(slots=True)
 class Book:
     id: int
     name: str
     category_id: int
     category_name: str
-    read_start: str | None
-    read_finish: str | None
+    read_start_date: date | None
+    read_finish_date: date | None
     read_comments: str | None
-    positional_number: int
+    positional_number: int | None  # only books not started yet can be voted for
     group_post_link: str | None
 
-    def is_started(self) -> bool:
-        if self.read_start is not None:
-            now_date = datetime.now().date()
-            start_read_date = datetime.strptime(
-                self.read_start, config.DATE_FORMAT
-            ).date()
+    @property
+    def read_start(self) -> str | None:
+        return _format_date(self.read_start_date)
 
-            return start_read_date >= now_date
+    @property
+    def read_finish(self) -> str | None:
+        return _format_date(self.read_finish_date)
 
-        return False
+    def get_status(self, today: date | None = None) -> BookStatus | None:
+        """Returns reading status of the book on `today`, None if the book
+        wasn't scheduled for reading"""
+        if self.read_start_date is None:
+            return None
+        if today is None:
+            today = date.today()
+        if self.read_start_date > today:
+            return BookStatus.PLANNED
+        if self.read_finish_date is not None and self.read_finish_date <= today:
+            return BookStatus.FINISHED
+        return BookStatus.READING
 
-    def is_finished(self) -> bool:
-        if self.read_finish is not None:
-            now_date = datetime.now().date()
-            finish_read_date = datetime.strptime(
-                self.read_finish, config.DATE_FORMAT
-            ).date()
+    def is_started(self, today: date | None = None) -> bool:
+        return self.get_status(today) in (BookStatus.READING, BookStatus.FINISHED)
 
-            return finish_read_date <= now_date
+    def is_finished(self, today: date | None = None) -> bool:
+        return self.get_status(today) == BookStatus.FINISHED
 
-        return False
+    def is_planned(self, today: date | None = None) -> bool:
+        return self.get_status(today) == BookStatus.PLANNED
 
-    def is_planned(self) -> bool:
-        if self.read_start is not None:
-            now_date = datetime.now().date()
-            start_read_date = datetime.strptime(
-                self.read_start, config.DATE_FORMAT
-            ).date()
 
-            return start_read_date >= now_date
+@dataclass
+class Category:
+    id: int
+    name: str
+    books: list[Book]
 
-        return False
 
-    def __post_init__(self):
-        """Set up read_start and read_finish to needed string format"""
-        for field in ("read_start", "read_finish"):
-            value = getattr(self, field)
-            if value is None:
-                continue
-            value = datetime.strptime(value, "%Y-%m-%d").strftime(config.DATE_FORMAT)
-            setattr(self, field, value)
+@dataclass
+class CategoryPage:
+    """Page of a category, `category.books` are only the books of the page"""
+
+    category: Category
+    category_index: int
+    categories_count: int
+    has_previous: bool
+    has_next: bool
+    not_started_only: bool
+    catalog_version: int
+
+    @property
+    def cache_key(self) -> tuple:
+        """Key of the rendered page, the books of the page are the same
+        in one catalog version"""
+        return (
+            self.catalog_version,
+            self.not_started_only,
+            self.category.id,
+            tuple(book.id for book in self.category.books),
+        )
 
-        self.name = format_book_name(self.name)
+
+@dataclass
+class _CatalogSnapshot:
+    version: int
+    checked_at: float
+    all_books: list[Category]
 
 
 @dataclass
-class Category:
-    id: int
-    name: str
-    books: list[Book]
+class _CatalogCache:
+    """Catalog snapshot of the tenant"""
 
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    snapshot: _CatalogSnapshot | None = None
 
-async def get_all_books() -> Iterable[Category]:
-    sql = f"""{_get_books_base_sql()}
-              ORDER BY c."ordering", b."ordering" """
-    books = await _get_books_from_db(sql)
-    return _group_books_by_categories(books)
 
+async def get_catalog_version() -> int:
+    """Returns the catalog version, it's changed by every change of books
+    and categories. Read it before the books it should describe"""
+    row = await fetch_one("SELECT version FROM catalog_version")
+    return row["version"] if row else 0
 
-async def get_not_started_books() -> Iterable[Category]:
-    sql = f"""{_get_books_base_sql()}
-              WHERE b.read_start IS NULL
-              ORDER BY c."ordering", b."ordering" """
-    books = await _get_books_from_db(sql)
-    return _group_books_by_categories(books)
+
+async def get_catalog() -> tuple[int, Iterable[Category]]:
+    """Returns catalog version with all books of this version"""
+    snapshot = await _get_catalog_snapshot()
+    return snapshot.version, snapshot.all_books
 
 
 async def get_already_read_books() -> Iterable[Book]:
@@ -113,47 +151,66 @@ async def get_next_book() -> Book | None:
     return books[0]
 
 
-def calculate_category_books_start_index(
-    categories: Iterable[Category], current_category: Category
-) -> int | None:
-    start_index = 0
-    for category in categories:
-        if category.id != current_category.id:
-            start_index += len(tuple(category.books))
-        else:
-            break
+async def get_category_page(
+    category_index: int,
+    not_started_only: bool = False,
+    after_book_id: int | None = None,
+    before_book_id: int | None = None,
+) -> CategoryPage | None:
+    """Returns the first page of the category with `category_index` among
+    categories with books, or its page after / before the given book.
+    Only the categories and the books of the page are read from the database,
+    None is returned if there are no books"""
+    catalog_version = await get_catalog_version()
+    categories = await _get_categories(not_started_only)
+    if not categories:
+        return None
+    category_index = min(category_index, len(categories) - 1)
+    category = categories[category_index]
 
-    return start_index
+    limit = config.CATEGORY_PAGE_SIZE + 1  # the extra book tells of one more page
+    if before_book_id is not None:
+        books = await _get_category_books(
+            category.id, not_started_only, limit, before_book_id=before_book_id
+        )
+        has_previous, has_next = len(books) == limit, True
+        books = books[: config.CATEGORY_PAGE_SIZE][::-1]
+    else:
+        books = await _get_category_books(
+            category.id, not_started_only, limit, after_book_id=after_book_id
+        )
+        has_previous, has_next = after_book_id is not None, len(books) == limit
+        books = books[: config.CATEGORY_PAGE_SIZE]
+
+    if not books and (after_book_id, before_book_id) != (None, None):
+        # the book of the page key was removed or moved, start over
+        return await get_category_page(category_index, not_started_only)
+    category.books = books
+    return CategoryPage(
+        category=category,
+        category_index=category_index,
+        categories_count=len(categories),
+        has_previous=has_previous,
+        has_next=has_next,
+        not_started_only=not_started_only,
+        catalog_version=catalog_version,
+    )
 
 
 async def get_books_by_positional_numbers(numbers: Iterable[int]) -> tuple[Book]:
-    numbers_joined = ", ".join(map(str, map(int, numbers)))
-
-    hardcoded_sql_values = []
-    for index, number in enumerate(numbers, 1):
-        hardcoded_sql_values.append(f"({number}, {index})")
-
-    output_hardcoded_sql_values = ", ".join(hardcoded_sql_values)
-
-    base_sql = _get_books_base_sql(
-        'ROW_NUMBER() over (order by c."ordering", b."ordering") as idx'
-    )
+    numbers = tuple(map(int, numbers))
+    placeholders = ", ".join("?" for _ in numbers)
     sql = f"""
-        SELECT t2.* FROM (
-          VALUES {output_hardcoded_sql_values}
-        ) t0
-        INNER JOIN
-        (
-        SELECT t.* FROM (
-            {base_sql}
-            WHERE read_start IS NULL
-        ) t
-        WHERE t.idx IN ({numbers_joined})
-        ) t2
-        ON t0.column1 = t2.idx
-        ORDER BY t0.column2
+        {_get_books_base_sql()}
+        WHERE b.positional_number IN ({placeholders})
     """
-    return tuple(await _get_books_from_db(cast(LiteralString, sql)))
+    books = await _get_books_from_db(cast(LiteralString, sql), numbers)
+    number_to_book = {
+        book.positional_number: book
+        for book in books
+        if book.positional_number is not None
+    }
+    return tuple(number_to_book[n] for n in numbers if n in number_to_book)
 
 
 async def get_books_info_by_ids(ids: Iterable[int]) -> dict[int, Book]:
@@ -167,6 +224,22 @@ async def get_books_info_by_ids(ids: Iterable[int]) -> dict[int, Book]:
     return {b.id: b for b in books}
 
 
+async def search_books(text: str) -> list[Book]:
+    """Returns books whose title or author has words starting with all words
+    of `text`, best matches first, up to SEARCH_RESULTS_LIMIT books"""
+    query = _get_search_query(text)
+    if query is None:
+        return []
+    sql = f"""{_get_books_base_sql()}
+              JOIN book_search ON book_search.rowid=b.id
+              WHERE book_search MATCH :query
+              ORDER BY bm25(book_search, 2.0, 1.0)
+              LIMIT :limit"""
+    return await _get_books_from_db(
+        sql, {"query": query, "limit": config.SEARCH_RESULTS_LIMIT}
+    )
+
+
 def format_book_name(book_name: str) -> str:
     try:
         book_name, author = tuple(map(str.strip, book_name.split("::")))
@@ -175,6 +248,71 @@ def format_book_name(book_name: str) -> str:
     return f"{book_name}. <i>{author}</i>"
 
 
+async def _get_categories(not_started_only: bool) -> list[Category]:
+    sql = """
+        SELECT c.id AS category_id, c.name AS category_name
+        FROM book_category c
+        WHERE EXISTS (
+            SELECT 1 FROM book b
+            WHERE b.category_id=c.id"""
+    if not_started_only:
+        # + keeps the planner on the (category_id, ordering) index, read_start
+        # index would read all not started books of the catalog
+        sql += " AND +b.read_start IS NULL"
+    sql += """
+        )
+        ORDER BY c."ordering"
+    """
+    return await fetch_records(sql, _build_category)
+
+
+async def _get_category_books(
+    category_id: int,
+    not_started_only: bool,
+    limit: int,
+    after_book_id: int | None = None,
+    before_book_id: int | None = None,
+) -> list[Book]:
+    """Returns up to `limit` books of the category following the book with
+    `after_book_id` in the category order, or preceding the book with
+    `before_book_id` in the reversed order"""
+    sql = f"""{_get_books_base_sql()}
+              WHERE b.category_id=:category_id"""
+    if not_started_only:
+        sql += " AND +b.read_start IS NULL"  # see _get_categories()
+    if before_book_id is not None:
+        sql += """
+            AND b."ordering" < (SELECT "ordering" FROM book WHERE id=:book_id)
+            ORDER BY b."ordering" DESC
+        """
+    elif after_book_id is not None:
+        sql += """
+            AND b."ordering" > (SELECT "ordering" FROM book WHERE id=:book_id)
+            ORDER BY b."ordering"
+        """
+    else:
+        sql += ' ORDER BY b."ordering"'
+    sql += " LIMIT :limit"
+    return await _get_books_from_db(
+        sql,
+        {
+            "category_id": category_id,
+            "book_id": before_book_id if before_book_id is not None else after_book_id,
+            "limit": limit,
+        },
+    )
+
+
+def _get_search_query(text: str) -> str | None:
+    """Returns FTS5 query of prefixes of the words of `text`, None if there
+    are no words. Words are quoted, so the text can't break FTS5 syntax.
+    One-letter words are matched whole, their prefixes aren't indexed"""
+    words = _SEARCH_WORD_RE.findall(text)[: config.SEARCH_MAX_WORDS]
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in words)
+
+
 def _group_books_by_categories(books: Iterable[Book]) -> Iterable[Category]:
     categories = []
     category_id = None
@@ -189,44 +327,104 @@ def _group_books_by_categories(books: Iterable[Book]) -> Iterable[Category]:
     return categories
 
 
-def _get_books_base_sql(select_param: LiteralString | None = None) -> LiteralString:
-    return f"""
-        WITH pos_numbers AS (
-            SELECT
-                ROW_NUMBER() OVER (ORDER BY c.ordering, b.ordering) AS rn,
-                b.id AS book_id
-            FROM book b LEFT JOIN book_category c ON c.id=b.category_id
-            WHERE b.read_start IS NULL
-        )
+async def _get_catalog_snapshot() -> _CatalogSnapshot:
+    """Returns in-memory catalog, SQLite is asked only for the catalog version
+    and not more often than once in CATALOG_VERSION_CHECK_INTERVAL seconds"""
+    cache = get_tenant_state("catalog", _CatalogCache)
+    snapshot = cache.snapshot
+    if snapshot is not None and _is_catalog_snapshot_checked_recently(snapshot):
+        return snapshot
+
+    async with cache.lock:
+        snapshot = cache.snapshot
+        if snapshot is not None and _is_catalog_snapshot_checked_recently(snapshot):
+            return snapshot
+
+        version = await get_catalog_version()
+        if snapshot is not None and snapshot.version == version:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+
+        snapshot = await _build_catalog_snapshot(version)
+        cache.snapshot = snapshot
+        return snapshot
+
+
+def _is_catalog_snapshot_checked_recently(snapshot: _CatalogSnapshot) -> bool:
+    return (
+        time.monotonic() - snapshot.checked_at < config.CATALOG_VERSION_CHECK_INTERVAL
+    )
+
+
+async def _build_catalog_snapshot(version: int) -> _CatalogSnapshot:
+    sql = f"""{_get_books_base_sql()}
+              ORDER BY c."ordering", b."ordering" """
+    books = []
+    async for chunk in fetch_chunks(sql, _build_book):
+        books.extend(chunk)
+    return _CatalogSnapshot(
+        version=version,
+        checked_at=time.monotonic(),
+        all_books=list(_group_books_by_categories(books)),
+    )
+
+
+def _get_books_base_sql() -> LiteralString:
+    return """
         SELECT
             b.id as book_id,
             b.name as book_name,
             b.group_post_link,
             c.id as category_id,
             c.name as category_name,
-            pos_number.rn as positional_number,
-            {select_param + "," if select_param else ""}
+            b.positional_number,
             b.read_start, b.read_finish,
             read_comments
         FROM book b
         LEFT JOIN book_category c ON c.id=b.category_id
-        LEFT JOIN pos_numbers AS pos_number ON pos_number.book_id=b.id
     """
 
 
-async def _get_books_from_db(sql: LiteralString) -> list[Book]:
-    books_raw = await fetch_all(sql)
-    return [
-        Book(
-            id=book["book_id"],
-            name=book["book_name"],
-            category_id=book["category_id"],
-            category_name=book["category_name"],
-            read_start=book["read_start"],
-            read_finish=book["read_finish"],
-            read_comments=book["read_comments"],
-            positional_number=book["positional_number"],
-            group_post_link=book["group_post_link"],
-        )
-        for book in books_raw
-    ]
+async def _get_books_from_db(
+    sql: LiteralString, params: Iterable[Any] | None = None
+) -> list[Book]:
+    return await fetch_records(sql, _build_book, params)
+
+
+def _build_book(
+    book_id: int,
+    book_name: str,
+    group_post_link: str | None,
+    category_id: int,
+    category_name: str,
+    positional_number: int | None,
+    read_start: str | None,
+    read_finish: str | None,
+    read_comments: str | None,
+) -> Book:
+    """Builds book from the row of _get_books_base_sql()"""
+    return Book(
+        id=book_id,
+        name=format_book_name(book_name),
+        category_id=category_id,
+        category_name=sys.intern(category_name) if category_name else category_name,
+        read_start_date=_parse_date(read_start),
+        read_finish_date=_parse_date(read_finish),
+        read_comments=read_comments,
+        positional_number=positional_number,
+        group_post_link=group_post_link,
+    )
+
+
+def _build_category(category_id: int, category_name: str) -> Category:
+    return Category(id=category_id, name=category_name, books=[])
+
+
+def _parse_date(value: str | None) -> date | None:
+    """Parses date stored in SQLite as YYYY-MM-DD"""
+    return date.fromisoformat(value) if value is not None else None
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_date(value: date | None) -> str | None:
+    return value.strftime(config.DATE_FORMAT) if value is not None else None
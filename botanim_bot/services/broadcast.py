@@ -0,0 +1,375 @@
+"""Broadcast of a message to all users of the bot.
+
+Recipients are read from bot_user page by page with keyset pagination, every
+page is sent by a pool of workers through a rate limiter which keeps the global
+rate under BROADCAST_RATE and the per-chat one under one message per
+BROADCAST_PER_CHAT_INTERVAL. On RetryAfter all workers pause for the requested
+time and the message is sent again before the next recipients of the page.
+Recipients done from the start of the page are saved as progress after every
+BROADCAST_PROGRESS_BATCH of them, unfinished broadcasts are resumed on start,
+so after a stop only the few recipients sent after the saved ones may get
+the message twice.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import LiteralString
+
+import telegram
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from botanim_bot import config
+from botanim_bot.db import execute, fetch_all, fetch_one, transaction
+from botanim_bot.tenants import create_tenant_task, get_tenant_state, keep_open
+
+logger = logging.getLogger(__name__)
+
+CHATS_TO_KEEP_IN_RATE_LIMITER = 10_000
+
+
+@dataclass
+class BroadcastStats:
+    id: int
+    status: str
+    created_at: str
+    finished_at: str | None
+    recipients_count: int
+    sent_count: int
+    failed_count: int
+    retried_count: int
+
+
+@dataclass
+class _PageResult:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+
+
+class _PageProgress:
+    """Outcomes of sends to the recipients of a page, saves the recipients
+    done from the start of the page"""
+
+    def __init__(self, broadcast_id: int, user_ids: list[int]):
+        self.broadcast_id = broadcast_id
+        self.user_ids = user_ids
+        self._is_sent: list[bool | None] = [None] * len(user_ids)  # None until done
+        self._retries = [0] * len(user_ids)
+        self._done_count = 0  # recipients done from the start of the page
+        self._saved_count = 0
+        self._save_lock = asyncio.Lock()
+
+    def retry(self, position: int) -> None:
+        self._retries[position] += 1
+
+    def finish(self, position: int, is_sent: bool) -> None:
+        self._is_sent[position] = is_sent
+        while (
+            self._done_count < len(self.user_ids)
+            and self._is_sent[self._done_count] is not None
+        ):
+            self._done_count += 1
+
+    async def save(self, min_batch: int = 1) -> None:
+        """Saves recipients done since the last save if there are at least
+        `min_batch` of them"""
+        if self._done_count - self._saved_count < min_batch:
+            return
+        async with self._save_lock:
+            start, end = self._saved_count, self._done_count
+            if end - start < min_batch:
+                return
+            outcomes = self._is_sent[start:end]
+            result = _PageResult(
+                sent=outcomes.count(True),
+                failed=outcomes.count(False),
+                retried=sum(self._retries[start:end]),
+            )
+            await _save_progress(self.broadcast_id, self.user_ids[end - 1], result)
+            self._saved_count = end
+
+
+class RateLimiter:
+    """Spaces out sends globally by 1 / `rate` seconds and to one chat
+    by `per_chat_interval` seconds, can be paused for all chats"""
+
+    def __init__(self, rate: float, per_chat_interval: float):
+        self._interval = 1 / rate
+        self._per_chat_interval = per_chat_interval
+        self._next_send_at = 0.0
+        self._paused_until = 0.0
+        self._chat_next_send_at: dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        while True:
+            now = time.monotonic()
+            send_at = max(
+                now,
+                self._next_send_at,
+                self._paused_until,
+                self._chat_next_send_at.get(chat_id, 0),
+            )
+            self._next_send_at = send_at + self._interval
+            self._chat_next_send_at[chat_id] = send_at + self._per_chat_interval
+            await asyncio.sleep(send_at - now)
+            if self._paused_until <= time.monotonic():
+                break
+        self._remove_expired_chats()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _remove_expired_chats(self) -> None:
+        if len(self._chat_next_send_at) < CHATS_TO_KEEP_IN_RATE_LIMITER:
+            return
+        now = time.monotonic()
+        self._chat_next_send_at = {
+            chat_id: send_at
+            for chat_id, send_at in self._chat_next_send_at.items()
+            if send_at > now
+        }
+
+
+async def start_broadcast(bot: Bot, created_by: int, text: str) -> int:
+    """Saves the broadcast and starts sending it in background, returns its id"""
+    recipients = await fetch_one("SELECT count(*) AS recipients FROM bot_user")
+    async with transaction() as connection:
+        await execute(
+            """
+            INSERT INTO broadcast (created_by, text, recipients_count)
+            VALUES (:created_by, :text, :recipients_count)
+            """,
+            {
+                "created_by": created_by,
+                "text": text,
+                "recipients_count": recipients["recipients"] if recipients else 0,
+            },
+        )
+        async with connection.execute("SELECT last_insert_rowid()") as cursor:
+            (broadcast_id,) = await cursor.fetchone()
+    _start_broadcast_task(bot, broadcast_id)
+    return broadcast_id
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Continues broadcasts interrupted by the bot stop"""
+    for row in await fetch_all("SELECT id FROM broadcast WHERE status='running'"):
+        if row["id"] not in _get_broadcast_tasks():
+            logger.info("Resuming broadcast %s", row["id"])
+            _start_broadcast_task(bot, row["id"])
+
+
+async def stop_broadcasts() -> None:
+    """Stops sending, broadcasts are resumed after the last saved recipient"""
+    tasks = tuple(_get_broadcast_tasks().values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def get_broadcast_stats(broadcast_id: int) -> BroadcastStats | None:
+    row = await fetch_one(
+        f"{_get_stats_base_sql()} WHERE id=:broadcast_id",
+        {"broadcast_id": broadcast_id},
+    )
+    return BroadcastStats(**row) if row else None
+
+
+async def get_last_broadcast_stats() -> BroadcastStats | None:
+    row = await fetch_one(f"{_get_stats_base_sql()} ORDER BY id DESC LIMIT 1")
+    return BroadcastStats(**row) if row else None
+
+
+async def wait_broadcast(broadcast_id: int) -> None:
+    task = _get_broadcast_tasks().get(broadcast_id)
+    if task is not None:
+        await asyncio.shield(task)
+
+
+def _get_rate_limiter() -> RateLimiter:
+    """Returns process-wide limiter, Telegram limits are per bot,
+    so simultaneous broadcasts share them"""
+    if not getattr(_get_rate_limiter, "limiter", None):
+        _get_rate_limiter.limiter = RateLimiter(
+            config.BROADCAST_RATE, config.BROADCAST_PER_CHAT_INTERVAL
+        )
+
+    return _get_rate_limiter.limiter
+
+
+def _get_broadcast_tasks() -> dict[int, asyncio.Task]:
+    """Returns running broadcasts of the tenant by id"""
+    return get_tenant_state("broadcast_tasks", dict, close=stop_broadcasts)
+
+
+def _start_broadcast_task(bot: Bot, broadcast_id: int) -> None:
+    tasks = _get_broadcast_tasks()
+    task = create_tenant_task(_send_broadcast(bot, broadcast_id))
+    tasks[broadcast_id] = task
+    task.add_done_callback(lambda _: tasks.pop(broadcast_id, None))
+
+
+async def _send_broadcast(bot: Bot, broadcast_id: int) -> None:
+    async with keep_open():  # the tenant of a broadcast is never idle
+        await _send_broadcast_pages(bot, broadcast_id)
+
+
+async def _send_broadcast_pages(bot: Bot, broadcast_id: int) -> None:
+    broadcast = await fetch_one(
+        "SELECT text, last_user_id FROM broadcast WHERE id=:broadcast_id",
+        {"broadcast_id": broadcast_id},
+    )
+    if broadcast is None:
+        return
+
+    limiter = _get_rate_limiter()
+    last_user_id = broadcast["last_user_id"]
+    try:
+        while True:
+            user_ids = await _get_recipients_page(last_user_id)
+            if not user_ids:
+                break
+            progress = _PageProgress(broadcast_id, user_ids)
+            await _send_page(bot, limiter, broadcast["text"], progress)
+            await progress.save()
+            last_user_id = user_ids[-1]
+        await execute(
+            """
+            UPDATE broadcast SET status='finished', finished_at=current_timestamp
+            WHERE id=:broadcast_id
+            """,
+            {"broadcast_id": broadcast_id},
+        )
+    except Exception:
+        logger.exception("Broadcast %s failed, it will be resumed", broadcast_id)
+        raise
+
+
+async def _get_recipients_page(last_user_id: int) -> list[int]:
+    rows = await fetch_all(
+        """
+        SELECT telegram_id FROM bot_user
+        WHERE telegram_id > :last_user_id
+        ORDER BY telegram_id
+        LIMIT :limit
+        """,
+        {"last_user_id": last_user_id, "limit": config.BROADCAST_PAGE_SIZE},
+    )
+    return [row["telegram_id"] for row in rows]
+
+
+async def _send_page(
+    bot: Bot, limiter: RateLimiter, text: str, progress: _PageProgress
+) -> None:
+    # (position in the page, attempt), recipients are sent in the page order
+    # and retries go first, so few of them are done ahead of the saved ones
+    queue: asyncio.PriorityQueue[tuple[int, int]] = asyncio.PriorityQueue()
+    for position in range(len(progress.user_ids)):
+        queue.put_nowait((position, 1))
+
+    async def work() -> None:
+        while True:
+            position, attempt = await queue.get()
+            try:
+                await _send_message(
+                    bot, limiter, text, position, attempt, queue, progress
+                )
+            except Exception:
+                logger.exception("Broadcast to %s failed", progress.user_ids[position])
+                progress.finish(position, is_sent=False)
+            try:
+                await progress.save(min_batch=config.BROADCAST_PROGRESS_BATCH)
+            except Exception:
+                # the recipients are saved with the next batch or the page
+                logger.exception(
+                    "Progress of broadcast %s is not saved", progress.broadcast_id
+                )
+            finally:
+                # workers are cancelled when the page is done, not while saving
+                queue.task_done()
+
+    workers = [asyncio.create_task(work()) for _ in range(config.BROADCAST_WORKERS)]
+    try:
+        await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _send_message(
+    bot: Bot,
+    limiter: RateLimiter,
+    text: str,
+    position: int,
+    attempt: int,
+    queue: asyncio.PriorityQueue[tuple[int, int]],
+    progress: _PageProgress,
+) -> None:
+    user_id = progress.user_ids[position]
+    await limiter.wait(user_id)
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=text,
+            parse_mode=telegram.constants.ParseMode.HTML,
+            disable_web_page_preview=True,
+        )
+    except RetryAfter as e:
+        limiter.pause(e.retry_after)
+        _retry(position, attempt, queue, progress)
+    except (Forbidden, BadRequest) as e:
+        logger.info("Broadcast to %s failed: %s", user_id, e)
+        progress.finish(position, is_sent=False)
+    except NetworkError as e:
+        logger.warning("Broadcast to %s failed, retrying: %s", user_id, e)
+        limiter.pause(attempt)
+        _retry(position, attempt, queue, progress)
+    else:
+        progress.finish(position, is_sent=True)
+
+
+def _retry(
+    position: int,
+    attempt: int,
+    queue: asyncio.PriorityQueue[tuple[int, int]],
+    progress: _PageProgress,
+) -> None:
+    if attempt >= config.BROADCAST_MAX_ATTEMPTS:
+        progress.finish(position, is_sent=False)
+        return
+    progress.retry(position)
+    queue.put_nowait((position, attempt + 1))
+
+
+async def _save_progress(
+    broadcast_id: int, last_user_id: int, result: _PageResult
+) -> None:
+    await execute(
+        """
+        UPDATE broadcast SET
+            last_user_id=:last_user_id,
+            sent_count=sent_count + :sent,
+            failed_count=failed_count + :failed,
+            retried_count=retried_count + :retried
+        WHERE id=:broadcast_id
+        """,
+        {
+            "broadcast_id": broadcast_id,
+            "last_user_id": last_user_id,
+            "sent": result.sent,
+            "failed": result.failed,
+            "retried": result.retried,
+        },
+    )
+
+
+def _get_stats_base_sql() -> LiteralString:
+    return """
+        SELECT
+            id, status, created_at, finished_at,
+            recipients_count, sent_count, failed_count, retried_count
+        FROM broadcast
+    """
@@ -0,0 +1,94 @@
+"""Request-scoped loading of data for one update.
+
+Within `request_scope()` identical lookups made through `load` run once and
+share the result, books requested by id by all coroutines of the update in the
+same event loop iteration are fetched with one query. Outside of a scope every
+call goes to the database, so results are never shared between updates.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+from botanim_bot.services.books import Book, get_books_info_by_ids
+
+T = TypeVar("T")
+
+
+@dataclass
+class _RequestScope:
+    results: dict[tuple[Callable, tuple], asyncio.Future] = field(default_factory=dict)
+    books: dict[int, asyncio.Future[Book | None]] = field(default_factory=dict)
+    pending_book_ids: list[int] = field(default_factory=list)
+
+
+_request_scope: ContextVar[_RequestScope | None] = ContextVar(
+    "request_scope", default=None
+)
+
+
+@contextmanager
+def request_scope() -> Iterator[None]:
+    token = _request_scope.set(_RequestScope())
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+
+async def load(func: Callable[..., Awaitable[T]], *args: Hashable) -> T:
+    """Returns `func(*args)`, concurrent and repeated calls with the same
+    arguments within the request scope share one call"""
+    scope = _request_scope.get()
+    if scope is None:
+        return await func(*args)
+
+    key = (func, args)
+    result = scope.results.get(key)
+    if result is None:
+        result = asyncio.ensure_future(func(*args))
+        scope.results[key] = result
+    return await asyncio.shield(result)
+
+
+async def load_books(ids: Iterable[int]) -> dict[int, Book]:
+    ids = tuple(dict.fromkeys(ids))
+    if _request_scope.get() is None:
+        return await get_books_info_by_ids(ids)
+
+    books = await asyncio.gather(*(load_book(book_id) for book_id in ids))
+    return {book.id: book for book in books if book is not None}
+
+
+async def load_book(book_id: int) -> Book | None:
+    scope = _request_scope.get()
+    if scope is None:
+        return (await get_books_info_by_ids((book_id,))).get(book_id)
+
+    book = scope.books.get(book_id)
+    if book is None:
+        book = asyncio.get_running_loop().create_future()
+        scope.books[book_id] = book
+        scope.pending_book_ids.append(book_id)
+        if len(scope.pending_book_ids) == 1:
+            # let other coroutines of the update add their ids to the batch
+            asyncio.get_running_loop().call_soon(_schedule_books_fetch, scope)
+    return await asyncio.shield(book)
+
+
+def _schedule_books_fetch(scope: _RequestScope) -> None:
+    asyncio.ensure_future(_fetch_books(scope))
+
+
+async def _fetch_books(scope: _RequestScope) -> None:
+    book_ids, scope.pending_book_ids = scope.pending_book_ids, []
+    try:
+        books = await get_books_info_by_ids(book_ids)
+    except Exception as e:
+        for book_id in book_ids:
+            scope.books[book_id].set_exception(e)
+        return
+    for book_id in book_ids:
+        scope.books[book_id].set_result(books.get(book_id))
@@ -115,5 +115,12 @@ def compute_ranks(candidates, weighted_ranks):
     this ranking.
     """
     d = _compute_d(weighted_ranks, candidates)
+    return compute_ranks_from_d(candidates, d)
+
+
+def compute_ranks_from_d(candidates, d):
+    """Returns the candidates ranked by the Schulze method for already
+    computed d array, where d[V,W] is the number of voters who prefer V over W.
+    """
     p = _compute_p(d, candidates)
     return _rank_p(candidates, p)
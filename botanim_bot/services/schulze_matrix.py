@@ -0,0 +1,118 @@
+"""Ranks candidates by the Schulze method using dense candidates matrices.
+
+Candidates are mapped to dense indices. Links between candidates are added
+level by level from the strongest ones, the candidates reachable from every
+candidate are kept in a 0/1 matrix, and the paths through the links of one
+level are found by matrix products. V beats W if W became reachable from V
+at a stronger level than V from W. Ranks and ties are exactly the same as in
+`schulze.compute_ranks`.
+"""
+from collections import defaultdict
+from collections.abc import Hashable, Sequence
+
+import numpy as np
+
+from botanim_bot.services import schulze
+
+
+def compute_ranks(candidates, weighted_ranks):
+    """Returns the candidates ranked by the Schulze method,
+    arguments are the same as in `schulze.compute_ranks`"""
+    candidates = list(candidates)
+    d = schulze._compute_d(weighted_ranks, candidates)
+    d_matrix = [[d.get((c1, c2), 0) for c2 in candidates] for c1 in candidates]
+    return compute_ranks_from_matrix(candidates, d_matrix)
+
+
+def compute_ranks_from_matrix(
+    candidates: Sequence[Hashable], d_matrix: Sequence[Sequence[int]] | np.ndarray
+) -> list[list[Hashable]]:
+    """Returns the candidates ranked by the Schulze method.
+
+    d_matrix[i][j] is the number of voters who prefer candidates[i]
+    over candidates[j]"""
+    wins = _compute_wins(np.asarray(d_matrix, dtype=np.int64))
+    return _rank_wins(candidates, wins)
+
+
+def _compute_wins(d_matrix: np.ndarray) -> list[int]:
+    size = len(d_matrix)
+    if size == 0:
+        return []
+    # about half of the pairs are links, 32-bit indices halve their memory
+    tails, heads = (
+        indices.astype(np.int32) for indices in np.nonzero(d_matrix > d_matrix.T)
+    )
+    strengths = d_matrix[tails, heads]
+    order = np.argsort(strengths)[::-1]
+    tails, heads, strengths = tails[order], heads[order], strengths[order]
+    del order
+    level_starts = np.flatnonzero(np.diff(strengths)) + 1
+    del strengths
+
+    reachable = np.zeros((size, size), dtype=np.float32)
+    wins = np.zeros(size, dtype=np.int64)
+    for level_tails, level_heads in zip(
+        np.split(tails, level_starts), np.split(heads, level_starts), strict=True
+    ):
+        is_new = reachable[level_tails, level_heads] == 0
+        if is_new.any():
+            _add_level(reachable, wins, level_tails[is_new], level_heads[is_new])
+    return wins.tolist()
+
+
+def _add_level(
+    reachable: np.ndarray, wins: np.ndarray, tails: np.ndarray, heads: np.ndarray
+) -> None:
+    """Adds links of one strength, counts wins of candidates over the ones
+    which became reachable from them but don't reach them back"""
+    size = len(reachable)
+    level_tails, tail_rows = np.unique(tails, return_inverse=True)
+    level_heads, head_columns = np.unique(heads, return_inverse=True)
+    if len(level_heads) * 2 < size:
+        links = np.zeros((len(level_tails), len(level_heads)), dtype=np.float32)
+        links[tail_rows, head_columns] = 1
+        targets = links @ reachable[level_heads] > 0
+        targets[:, level_heads] |= links > 0
+    else:  # multiplying by the whole matrix is cheaper than taking its rows
+        links = np.zeros((len(level_tails), size), dtype=np.float32)
+        links[tail_rows, heads] = 1
+        targets = (links @ reachable > 0) | (links > 0)
+
+    # paths through several links of the level, every round doubles their length
+    through_tails = targets[:, level_tails]
+    while through_tails.any():
+        targets |= _multiply(through_tails, targets)
+        more_through_tails = targets[:, level_tails]
+        if np.array_equal(more_through_tails, through_tails):
+            break
+        through_tails = more_through_tails
+
+    # candidates reaching a tail already reach what the tail reached before
+    targets &= reachable[level_tails] == 0
+    is_gaining = targets.any(axis=1)
+    level_tails, targets = level_tails[is_gaining], targets[is_gaining]
+    sources = reachable[:, level_tails] > 0
+    sources[level_tails, np.arange(len(level_tails))] = True
+    rows = np.flatnonzero(sources.any(axis=1))
+    old_rows = reachable[rows]
+    added = _multiply(sources[rows], targets) & (old_rows == 0)
+    old_rows[added] = 1
+    reachable[rows] = old_rows
+    wins[rows] += (added & (reachable.T[rows] == 0)).sum(axis=1)
+
+
+def _multiply(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Returns the product of boolean matrices"""
+    return left.astype(np.float32) @ right.astype(np.float32) > 0
+
+
+def _rank_wins(
+    candidates: Sequence[Hashable], wins: Sequence[int]
+) -> list[list[Hashable]]:
+    candidate_wins = defaultdict(list)
+    for candidate, num_wins in zip(candidates, wins, strict=True):
+        candidate_wins[num_wins].append(candidate)
+
+    sorted_wins = sorted(candidate_wins.keys(), reverse=True)
+    return [candidate_wins[num_wins] for num_wins in sorted_wins]
@@ -1,23 +1,103 @@
+import asyncio
+import time
 import urllib.parse
 
 import httpx
 
-from botanim_bot import config
+from botanim_bot import config, metrics
+from botanim_bot.tenants import get_current_tenant_id
+
+_membership_cache: dict[tuple[int, int], tuple[bool, float]] = {}
+_membership_requests: dict[tuple[int, int], asyncio.Future[bool]] = {}
 
 
 async def is_user_in_channel(user_id: int, channel_id: int) -> bool:
-    """Returns True if user `user_id` in `channel_id` now"""
+    """Returns True if user `user_id` in `channel_id` now.
+
+    Result is cached for MEMBERSHIP_CACHE_TTL seconds (MEMBERSHIP_NEGATIVE_CACHE_TTL
+    for non-members), concurrent checks of the same user share one request"""
+    key = (user_id, channel_id)
+    cached = _membership_cache.get(key)
+    if cached is not None and cached[1] > time.monotonic():
+        metrics.CACHE_REQUESTS.inc(get_current_tenant_id(), "membership", "hit")
+        return cached[0]
+    metrics.CACHE_REQUESTS.inc(get_current_tenant_id(), "membership", "miss")
+
+    request = _membership_requests.get(key)
+    if request is None:
+        request = asyncio.ensure_future(_request_membership(user_id, channel_id))
+        _membership_requests[key] = request
+        request.add_done_callback(lambda _: _membership_requests.pop(key, None))
+    return await asyncio.shield(request)
+
+
+async def close_http_client() -> None:
+    client = getattr(_get_http_client, "client", None)
+    if client is None:
+        return
+    _get_http_client.client = None
+    await client.aclose()
+
+
+async def _request_membership(user_id: int, channel_id: int) -> bool:
     url = _get_tg_url(method="getChatMember", chat_id=channel_id, user_id=user_id)
-    async with httpx.AsyncClient() as client:
-        json_response = (await client.get(url)).json()
+    started_at = time.perf_counter()
     try:
-        return json_response["result"]["status"] in (
-            "member",
-            "creator",
-            "administrator",
+        response = await _get_http_client().get(url)
+    finally:
+        metrics.TELEGRAM_DURATION.observe(
+            time.perf_counter() - started_at, get_current_tenant_id(), "getChatMember"
         )
-    except KeyError:
+    if response.is_error:
+        # flood control or Telegram failure says nothing about the membership,
+        # the user is not let in now and is checked again on the next update
+        metrics.TELEGRAM_ERRORS.inc("getChatMember", str(response.status_code))
         return False
+    try:
+        status = response.json()["result"]["status"]
+    except (ValueError, KeyError, TypeError):
+        return False
+
+    is_member = status in ("member", "creator", "administrator")
+    _cache_membership(user_id, channel_id, is_member)
+    return is_member
+
+
+def _cache_membership(user_id: int, channel_id: int, is_member: bool) -> None:
+    now = time.monotonic()
+    if len(_membership_cache) >= config.MEMBERSHIP_CACHE_MAX_SIZE:
+        _remove_expired_memberships(now)
+    if len(_membership_cache) >= config.MEMBERSHIP_CACHE_MAX_SIZE:
+        _membership_cache.pop(next(iter(_membership_cache)))
+
+    ttl = (
+        config.MEMBERSHIP_CACHE_TTL
+        if is_member
+        else config.MEMBERSHIP_NEGATIVE_CACHE_TTL
+    )
+    _membership_cache[(user_id, channel_id)] = (is_member, now + ttl)
+
+
+def _remove_expired_memberships(now: float) -> None:
+    expired = [
+        key for key, (_, expires_at) in _membership_cache.items() if expires_at <= now
+    ]
+    for key in expired:
+        del _membership_cache[key]
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Returns process-wide HTTP client with keep-alive connections pool"""
+    if not getattr(_get_http_client, "client", None):
+        _get_http_client.client = httpx.AsyncClient(
+            timeout=config.TELEGRAM_API_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=config.TELEGRAM_API_MAX_CONNECTIONS,
+                max_keepalive_connections=config.TELEGRAM_API_MAX_CONNECTIONS,
+            ),
+        )
+
+    return _get_http_client.client
 
 
 def _get_tg_url(method: str, **params) -> str:
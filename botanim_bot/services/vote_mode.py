@@ -1,24 +1,161 @@
-from botanim_bot.db import execute, fetch_one
+"""Users who called /vote and whose next text message is their ballot.
+
+The set of every tenant is held in memory, table bot_user_in_vote_mode is its
+write-behind copy for restarts: changes are written at most every
+VOTE_MODE_FLUSH_INTERVAL seconds and on shutdown, the table is read once
+on the first use. Users who didn't send
+a ballot leave vote mode in VOTE_MODE_TTL seconds.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass, field
+
+from botanim_bot import config
+from botanim_bot.db import execute, fetch_all, transaction
+from botanim_bot.tenants import create_tenant_task, get_tenant_state
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _VoteMode:
+    """Vote mode of the tenant"""
+
+    # user_id -> expires_at, unix time
+    users: dict[int, int] = field(default_factory=dict)
+    # None means removal
+    pending_writes: dict[int, int | None] = field(default_factory=dict)
+    load_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    loaded: bool = False
+    write_task: asyncio.Task | None = None
 
 
 async def is_user_in_vote_mode(user_id: int) -> bool:
-    user_exists = await fetch_one(
-        "select user_id from bot_user_in_vote_mode where user_id=:user_id",
-        {"user_id": user_id},
-    )
-    return user_exists is not None
+    vote_mode = await _get_loaded_vote_mode()
+    expires_at = vote_mode.users.get(user_id)
+    if expires_at is None:
+        return False
+    if expires_at <= time.time():
+        del vote_mode.users[user_id]  # expired rows are deleted on the next flush
+        return False
+    return True
 
 
 async def set_user_in_vote_mode(user_id: int) -> None:
-    await execute(
-        "insert or ignore into bot_user_in_vote_mode (user_id) values (:user_id)",
-        {"user_id": user_id},
-    )
+    vote_mode = await _get_loaded_vote_mode()
+    expires_at = int(time.time()) + config.VOTE_MODE_TTL
+    vote_mode.users[user_id] = expires_at
+    _schedule_write(vote_mode, user_id, expires_at)
 
 
 async def remove_user_from_vote_mode(user_id: int) -> None:
+    vote_mode = await _get_loaded_vote_mode()
+    if vote_mode.users.pop(user_id, None) is not None:
+        _schedule_write(vote_mode, user_id, None)
+
+
+async def load_vote_mode() -> None:
+    """Reads users in vote mode from the database, only the first call does it"""
+    vote_mode = _get_vote_mode()
+    if vote_mode.loaded:
+        return
+    async with vote_mode.load_lock:
+        if vote_mode.loaded:
+            return
+        rows = await fetch_all("select user_id, expires_at from bot_user_in_vote_mode")
+        now = int(time.time())
+        for row in rows:
+            if row["expires_at"] is None:  # saved before vote mode expiry
+                vote_mode.users[row["user_id"]] = now + config.VOTE_MODE_TTL
+                _schedule_write(
+                    vote_mode, row["user_id"], vote_mode.users[row["user_id"]]
+                )
+            elif row["expires_at"] > now:
+                vote_mode.users[row["user_id"]] = row["expires_at"]
+        vote_mode.loaded = True
+
+
+async def flush_vote_mode() -> None:
+    """Writes pending changes right now, must be called before closing database"""
+    vote_mode = _get_vote_mode()
+    task = vote_mode.write_task
+    vote_mode.write_task = None
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    if vote_mode.pending_writes:
+        await _write_pending(vote_mode)
+
+
+def _get_vote_mode() -> _VoteMode:
+    return get_tenant_state("vote_mode", _VoteMode, close=flush_vote_mode)
+
+
+async def _get_loaded_vote_mode() -> _VoteMode:
+    await load_vote_mode()
+    return _get_vote_mode()
+
+
+def _schedule_write(vote_mode: _VoteMode, user_id: int, expires_at: int | None) -> None:
+    vote_mode.pending_writes[user_id] = expires_at
+    task = vote_mode.write_task
+    if task is None or task.done():
+        vote_mode.write_task = create_tenant_task(_flush_later(vote_mode))
+
+
+async def _flush_later(vote_mode: _VoteMode) -> None:
+    """Writes pending changes every VOTE_MODE_FLUSH_INTERVAL seconds until
+    there are no more changes, failed writes are retried"""
+    while vote_mode.pending_writes:
+        await asyncio.sleep(config.VOTE_MODE_FLUSH_INTERVAL)
+        try:
+            await _write_pending(vote_mode)
+        except Exception:
+            logger.exception("Failed to save vote mode, will retry")
+
+
+async def _write_pending(vote_mode: _VoteMode) -> None:
+    pending = dict(vote_mode.pending_writes)
+    vote_mode.pending_writes.clear()
+    now = int(time.time())
+    try:
+        async with transaction():
+            for user_id, expires_at in pending.items():
+                await _write_user_vote_mode(user_id, expires_at)
+            await execute(
+                "delete from bot_user_in_vote_mode where expires_at <= :now",
+                {"now": now},
+            )
+    except BaseException:
+        for user_id, expires_at in pending.items():
+            vote_mode.pending_writes.setdefault(user_id, expires_at)
+        raise
+    _remove_expired(vote_mode, now)
+
+
+async def _write_user_vote_mode(user_id: int, expires_at: int | None) -> None:
+    if expires_at is None:
+        await execute(
+            "delete from bot_user_in_vote_mode where user_id=:user_id",
+            {"user_id": user_id},
+        )
+        return
     await execute(
-        "delete from bot_user_in_vote_mode where user_id=:user_id",
-        {"user_id": user_id},
-        autocommit=False,
+        """
+        insert into bot_user_in_vote_mode (user_id, expires_at)
+        values (:user_id, :expires_at)
+        on conflict (user_id) do update set expires_at=excluded.expires_at
+        """,
+        {"user_id": user_id, "expires_at": expires_at},
     )
+
+
+def _remove_expired(vote_mode: _VoteMode, now: int) -> None:
+    expired = [
+        user_id for user_id, expires_at in vote_mode.users.items() if expires_at <= now
+    ]
+    for user_id in expired:
+        del vote_mode.users[user_id]
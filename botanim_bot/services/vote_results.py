@@ -1,19 +1,29 @@
-from dataclasses import dataclass
-from typing import Iterable, TypedDict, TypeVar, cast
+"""Leaders of the actual or the last voting.
+
+Leaders are computed once and kept in memory of the tenant, a saved ballot
+schedules their recompute in VOTE_LEADERS_REFRESH_DELAY seconds, so a burst
+of ballots causes one recompute. Leaders of the passed voting aren't changed
+anymore and are kept until the next voting starts.
+"""
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass, field
 
 from botanim_bot import config
-from botanim_bot.db import fetch_all
-from botanim_bot.services import schulze
-from botanim_bot.services.books import (
-    get_books_info_by_ids,
-)
+from botanim_bot.services import schulze_matrix
+from botanim_bot.services.loader import load, load_books
+from botanim_bot.services.vote_tally import VoteTally, get_vote_tally
 from botanim_bot.services.votings import Voting, get_actual_or_last_voting
+from botanim_bot.tenants import create_tenant_task, get_tenant_state
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class BookVoteResult:
     book_name: str
-    positional_number: int
+    positional_number: int | None  # None once the book started
 
 
 @dataclass
@@ -28,46 +38,109 @@ class VoteLeaders:
     votes_count: int
 
 
+@dataclass
+class _LeadersCache:
+    """Leaders of the tenant"""
+
+    leaders: dict[int, VoteLeaders] = field(default_factory=dict)  # by voting id
+    votings_to_refresh: set[int] = field(default_factory=set)
+    compute_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    refresh_task: asyncio.Task | None = None
+
+
 async def get_leaders() -> VoteLeaders | None:
-    actual_voting = await get_actual_or_last_voting()
+    """Returns precomputed leaders, they are computed here only on the first
+    call for the voting. The result is shared, it must not be changed"""
+    actual_voting = await load(get_actual_or_last_voting)
     if actual_voting is None:
         return None
 
-    vote_results_raw = await _get_vote_results(actual_voting.id)
+    cache = _get_leaders_cache()
+    vote_leaders = cache.leaders.get(actual_voting.id)
+    if vote_leaders is not None:
+        return vote_leaders
 
-    leaders_ids, candidates_ids = _get_top_leaders_with_schulze(vote_results_raw)
+    async with cache.compute_lock:
+        if actual_voting.id not in cache.leaders:
+            cache.leaders.clear()  # leaders of previous votings aren't needed anymore
+            cache.leaders[actual_voting.id] = await _compute_leaders(actual_voting)
+        return cache.leaders[actual_voting.id]
 
-    vote_leaders = await _build_vote_leaders(actual_voting, candidates_ids, leaders_ids)
-    vote_leaders.votes_count = _calculate_overall_votes(vote_results_raw)
-    return vote_leaders
 
+def refresh_leaders_later(voting_id: int) -> None:
+    """Schedules recompute of the leaders after a ballot of the voting was saved"""
+    cache = _get_leaders_cache()
+    cache.votings_to_refresh.add(voting_id)
+    if cache.refresh_task is None or cache.refresh_task.done():
+        # the task must not inherit request scope of the update
+        cache.refresh_task = create_tenant_task(_refresh_later(cache))
 
-class VoteRow(TypedDict):
-    first_book_id: int
-    second_book_id: int
-    third_book_id: int
-    votes_count: int
+
+async def stop_leaders_refresh() -> None:
+    """Cancels scheduled recompute, must be called before closing database"""
+    cache = _get_leaders_cache()
+    task = cache.refresh_task
+    cache.refresh_task = None
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+def _get_leaders_cache() -> _LeadersCache:
+    return get_tenant_state("leaders", _LeadersCache, close=stop_leaders_refresh)
+
+
+async def _refresh_later(cache: _LeadersCache) -> None:
+    while cache.votings_to_refresh:
+        await asyncio.sleep(config.VOTE_LEADERS_REFRESH_DELAY)
+        voting_ids = tuple(cache.votings_to_refresh)
+        cache.votings_to_refresh.clear()
+        for voting_id in voting_ids:
+            await _refresh(cache, voting_id)
+
+
+async def _refresh(cache: _LeadersCache, voting_id: int) -> None:
+    async with cache.compute_lock:
+        vote_leaders = cache.leaders.get(voting_id)
+        if vote_leaders is None:
+            return  # will be computed on the first request
+        try:
+            cache.leaders[voting_id] = await _compute_leaders(vote_leaders.voting)
+        except Exception:
+            logger.exception("Failed to refresh leaders of voting %s", voting_id)
+            del cache.leaders[voting_id]  # will be computed on the next request
+
+
+async def _compute_leaders(voting: Voting) -> VoteLeaders:
+    vote_tally = await get_vote_tally(voting.id)
+
+    # thousands of candidates take seconds, the loop keeps serving updates
+    leaders_ids = await asyncio.to_thread(_get_top_leaders_with_schulze, vote_tally)
+
+    vote_leaders = await _build_vote_leaders(voting, leaders_ids)
+    vote_leaders.votes_count = vote_tally.ballots_count
+    return vote_leaders
 
 
-def _get_top_leaders_with_schulze(
-    vote_results_raw: list[VoteRow],
-) -> tuple[list[list[int]], set[int]]:
-    candidates, weighted_ranks = _build_data_for_schulze(vote_results_raw)
-    leaders = schulze.compute_ranks(candidates, weighted_ranks)
-    return leaders[: config.VOTE_RESULTS_TOP], candidates
+def _get_top_leaders_with_schulze(vote_tally: VoteTally) -> list[list[int]]:
+    leaders = schulze_matrix.compute_ranks_from_matrix(
+        vote_tally.candidates, vote_tally.get_d_matrix()
+    )
+    return leaders[: config.VOTE_RESULTS_TOP]
 
 
-async def _build_vote_leaders(
-    voting: Voting, books_candidates: Iterable[int], leaders: list[list[int]]
-) -> VoteLeaders:
-    book_id_to_book = await get_books_info_by_ids(books_candidates)
+async def _build_vote_leaders(voting: Voting, leaders: list[list[int]]) -> VoteLeaders:
+    book_id_to_book = await load_books(
+        book for books_set in leaders for book in books_set
+    )
     vote_leaders = _init_vote_results(voting)
 
     for books_set in leaders:
         book_names = [
             BookVoteResult(
                 book_name=book_id_to_book[book].name,
-                positional_number=cast(int, book_id_to_book[book].positional_number),
+                positional_number=book_id_to_book[book].positional_number,
             )
             for book in books_set
         ]
@@ -85,50 +158,3 @@ def _init_vote_results(voting: Voting) -> VoteLeaders:
         leaders=[],
         votes_count=0,
     )
-
-
-def _calculate_overall_votes(vote_results_rows: list[VoteRow]) -> int:
-    return sum((vote["votes_count"] for vote in vote_results_rows))
-
-
-async def _get_vote_results(vote_id: int) -> list[VoteRow]:
-    sql = """
-        select
-            first_book_id,
-            second_book_id,
-            third_book_id,
-            count(*) as votes_count
-        from vote
-        where vote_id=:vote_id
-        group by 1, 2, 3
-    """
-    return cast(list[VoteRow], await fetch_all(sql, {"vote_id": vote_id}))
-
-
-def _build_data_for_schulze(
-    rows,
-) -> tuple[set[int], list[tuple[list[list[int]], int]]]:
-    candidate_books = set()
-    weighted_ranks = []
-
-    for row in rows:
-        candidate_books.update(
-            [row["first_book_id"], row["second_book_id"], row["third_book_id"]]
-        )
-
-        weighted_ranks.append((_prepare_weighted_ranks(row), row["votes_count"]))
-
-    return candidate_books, weighted_ranks
-
-
-def _prepare_weighted_ranks(row: VoteRow) -> list[list[int]]:
-    book_ids = [row["first_book_id"], row["second_book_id"], row["third_book_id"]]
-    book_ids_withot_duplicates = _remove_duplicates_with_save_order(book_ids)
-    return [[book_id] for book_id in book_ids_withot_duplicates]
-
-
-T = TypeVar("T")
-
-
-def _remove_duplicates_with_save_order(elements: Iterable[T]) -> Iterable[T]:
-    return list(dict.fromkeys(elements))
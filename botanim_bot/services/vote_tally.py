@@ -0,0 +1,277 @@
+"""Pairwise preferences of the voting, maintained incrementally on every ballot.
+
+For the Schulze method d[V,W] is the number of voters who prefer V over W.
+Every candidate ranked in a ballot beats the candidates ranked below it and all
+candidates missed in the ballot, so d[V,W] = ballots[V] - preferences[W,V], where
+ballots[V] is the number of ballots with V and preferences[W,V] is the number
+of ballots where W is ranked above V.
+"""
+import logging
+from collections import Counter
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from typing import LiteralString, NamedTuple, TypeVar
+
+import numpy as np
+
+from botanim_bot.db import (
+    execute,
+    fetch_chunks,
+    fetch_one,
+    read_snapshot,
+    transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class VoteTally:
+    ballots_count: int
+    candidate_ballots: dict[int, int]
+    preferences: dict[tuple[int, int], int]
+
+    @property
+    def candidates(self) -> list[int]:
+        return sorted(self.candidate_ballots)
+
+    def get_d_matrix(self) -> np.ndarray:
+        """Returns the d array of the Schulze method as a dense matrix
+        indexed in the order of `candidates`"""
+        candidates = self.candidates
+        index = {candidate: i for i, candidate in enumerate(candidates)}
+        ballots = np.array(
+            [self.candidate_ballots[candidate] for candidate in candidates],
+            dtype=np.int64,
+        )
+        d_matrix = np.repeat(ballots[:, np.newaxis], len(candidates), axis=1)
+        pairs = np.array(
+            [(index[other], index[preferred]) for preferred, other in self.preferences],
+            dtype=np.intp,
+        ).reshape(-1, 2)
+        d_matrix[pairs[:, 0], pairs[:, 1]] -= np.fromiter(
+            self.preferences.values(), dtype=np.int64, count=len(self.preferences)
+        )
+        np.fill_diagonal(d_matrix, 0)
+        return d_matrix
+
+
+class _BallotGroup(NamedTuple):
+    """Identical ballots of the voting"""
+
+    first_book_id: int
+    second_book_id: int
+    third_book_id: int
+    votes_count: int
+
+
+async def apply_ballot(voting_id: int, user_id: int, book_ids: Sequence[int]) -> None:
+    """Updates tally with the new ballot of the user, replacing his previous ballot.
+
+    Must be called in the transaction of the ballot saving, before it"""
+    old_ballot = await fetch_one(
+        """
+        SELECT first_book_id, second_book_id, third_book_id
+        FROM vote
+        WHERE vote_id=:voting_id AND user_id=:user_id
+        """,
+        {"voting_id": voting_id, "user_id": user_id},
+    )
+    if old_ballot is not None:
+        await _add_ballot(voting_id, _get_ballot_book_ids(old_ballot), weight=-1)
+    await _add_ballot(voting_id, book_ids, weight=1)
+
+
+async def get_vote_tally(voting_id: int) -> VoteTally:
+    """Returns stored tally, its parts are read in one snapshot,
+    so a ballot saved meanwhile is either in all of them or in none"""
+    params = {"voting_id": voting_id}
+    async with read_snapshot():
+        voting = await fetch_one(
+            "SELECT ballots_count FROM voting WHERE id=:voting_id", params
+        )
+        candidate_ballots = await _read_ballots_dict(
+            """
+            SELECT book_id, ballots
+            FROM vote_candidate_tally
+            WHERE vote_id=:voting_id
+            """,
+            _get_candidate_ballots,
+            params,
+        )
+        preferences = await _read_ballots_dict(
+            """
+            SELECT preferred_book_id, other_book_id, ballots
+            FROM vote_preference_tally
+            WHERE vote_id=:voting_id
+            """,
+            _get_preference_ballots,
+            params,
+        )
+    return VoteTally(
+        ballots_count=voting["ballots_count"] if voting else 0,
+        candidate_ballots=candidate_ballots,
+        preferences=preferences,
+    )
+
+
+async def check_vote_tally(voting_id: int) -> bool:
+    """Returns True if stored tally matches raw ballots of the voting"""
+    async with read_snapshot():
+        tally = await get_vote_tally(voting_id)
+        return tally == await _build_tally_from_ballots(voting_id)
+
+
+async def rebuild_vote_tally(voting_id: int) -> None:
+    params = {"voting_id": voting_id}
+    async with transaction():
+        tally = await _build_tally_from_ballots(voting_id)
+        await execute(
+            "DELETE FROM vote_candidate_tally WHERE vote_id=:voting_id", params
+        )
+        await execute(
+            "DELETE FROM vote_preference_tally WHERE vote_id=:voting_id", params
+        )
+        for book_id, ballots in tally.candidate_ballots.items():
+            await _add_candidate_ballots(voting_id, book_id, ballots)
+        for (preferred_book_id, other_book_id), ballots in tally.preferences.items():
+            await _add_preference_ballots(
+                voting_id, preferred_book_id, other_book_id, ballots
+            )
+        await execute(
+            "UPDATE voting SET ballots_count=:ballots_count WHERE id=:voting_id",
+            {"voting_id": voting_id, "ballots_count": tally.ballots_count},
+        )
+
+
+async def rebuild_vote_tally_if_inconsistent(voting_id: int) -> None:
+    if await check_vote_tally(voting_id):
+        return
+    logger.warning("Vote tally of voting %s is inconsistent, rebuilding", voting_id)
+    await rebuild_vote_tally(voting_id)
+
+
+async def _add_ballot(voting_id: int, book_ids: Iterable[int], weight: int) -> None:
+    book_ids = _remove_duplicates_with_save_order(book_ids)
+    for book_id in book_ids:
+        await _add_candidate_ballots(voting_id, book_id, weight)
+    for index, preferred_book_id in enumerate(book_ids):
+        for other_book_id in book_ids[index + 1 :]:
+            await _add_preference_ballots(
+                voting_id, preferred_book_id, other_book_id, weight
+            )
+    await execute(
+        "UPDATE voting SET ballots_count=ballots_count + :weight WHERE id=:voting_id",
+        {"voting_id": voting_id, "weight": weight},
+    )
+
+    if weight < 0:
+        await _delete_empty_tally_rows(voting_id)
+
+
+async def _add_candidate_ballots(voting_id: int, book_id: int, ballots: int) -> None:
+    await execute(
+        """
+        INSERT INTO vote_candidate_tally (vote_id, book_id, ballots)
+        VALUES (:voting_id, :book_id, :ballots)
+        ON CONFLICT (vote_id, book_id)
+            DO UPDATE SET ballots=ballots + excluded.ballots
+        """,
+        {"voting_id": voting_id, "book_id": book_id, "ballots": ballots},
+    )
+
+
+async def _add_preference_ballots(
+    voting_id: int, preferred_book_id: int, other_book_id: int, ballots: int
+) -> None:
+    await execute(
+        """
+        INSERT INTO vote_preference_tally
+            (vote_id, preferred_book_id, other_book_id, ballots)
+        VALUES (:voting_id, :preferred_book_id, :other_book_id, :ballots)
+        ON CONFLICT (vote_id, preferred_book_id, other_book_id)
+            DO UPDATE SET ballots=ballots + excluded.ballots
+        """,
+        {
+            "voting_id": voting_id,
+            "preferred_book_id": preferred_book_id,
+            "other_book_id": other_book_id,
+            "ballots": ballots,
+        },
+    )
+
+
+async def _delete_empty_tally_rows(voting_id: int) -> None:
+    params = {"voting_id": voting_id}
+    await execute(
+        "DELETE FROM vote_candidate_tally WHERE vote_id=:voting_id AND ballots=0",
+        params,
+    )
+    await execute(
+        "DELETE FROM vote_preference_tally WHERE vote_id=:voting_id AND ballots=0",
+        params,
+    )
+
+
+async def _read_ballots_dict(
+    sql: LiteralString,
+    record_factory: Callable[..., tuple[T, int]],
+    params: dict,
+) -> dict[T, int]:
+    ballots = {}
+    async for chunk in fetch_chunks(sql, record_factory, params):
+        ballots.update(chunk)
+    return ballots
+
+
+def _get_candidate_ballots(book_id: int, ballots: int) -> tuple[int, int]:
+    return book_id, ballots
+
+
+def _get_preference_ballots(
+    preferred_book_id: int, other_book_id: int, ballots: int
+) -> tuple[tuple[int, int], int]:
+    return (preferred_book_id, other_book_id), ballots
+
+
+async def _build_tally_from_ballots(voting_id: int) -> VoteTally:
+    ballots_count = 0
+    candidate_ballots = Counter()
+    preferences = Counter()
+    async for chunk in fetch_chunks(
+        """
+        SELECT
+            first_book_id,
+            second_book_id,
+            third_book_id,
+            count(*) AS votes_count
+        FROM vote
+        WHERE vote_id=:voting_id
+        GROUP BY 1, 2, 3
+        """,
+        _BallotGroup,
+        {"voting_id": voting_id},
+    ):
+        for *ballot, votes_count in chunk:
+            ballots_count += votes_count
+            book_ids = _remove_duplicates_with_save_order(ballot)
+            for index, preferred_book_id in enumerate(book_ids):
+                candidate_ballots[preferred_book_id] += votes_count
+                for other_book_id in book_ids[index + 1 :]:
+                    preferences[preferred_book_id, other_book_id] += votes_count
+
+    return VoteTally(
+        ballots_count=ballots_count,
+        candidate_ballots=dict(candidate_ballots),
+        preferences=dict(preferences),
+    )
+
+
+def _get_ballot_book_ids(row: dict) -> list[int]:
+    return [row["first_book_id"], row["second_book_id"], row["third_book_id"]]
+
+
+def _remove_duplicates_with_save_order(book_ids: Iterable[int]) -> list[int]:
+    return list(dict.fromkeys(book_ids))
@@ -1,10 +1,11 @@
+import functools
 import logging
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Iterable
 
-from botanim_bot import config
-from botanim_bot.db import execute, fetch_one
+from botanim_bot import config, metrics
+from botanim_bot.db import execute, fetch_one, group_commit
 from botanim_bot.services.books import (
     Book,
     format_book_name,
@@ -15,6 +16,8 @@ from botanim_bot.services.vote_mode import (
     is_user_in_vote_mode,
     remove_user_from_vote_mode,
 )
+from botanim_bot.services.vote_tally import apply_ballot
+from botanim_bot.tenants import get_current_tenant_id
 
 logger = logging.getLogger(__name__)
 
@@ -51,13 +54,13 @@ class Voting:
 @dataclass
 class Vote:
     first_book_name: str
-    first_book_positional_number: str
+    first_book_positional_number: int | None
 
     second_book_name: str
-    second_book_positional_number: str
+    second_book_positional_number: int | None
 
     third_book_name: str
-    third_book_positional_number: str
+    third_book_positional_number: int | None
 
 
 async def get_actual_voting() -> Voting | None:
@@ -80,59 +83,38 @@ async def get_actual_or_last_voting() -> Voting | None:
     return await get_actual_voting() or await _get_last_voting()
 
 
-async def save_vote(telegram_user_id: int, books: Iterable[Book]) -> None:
-    await insert_user(telegram_user_id)
+async def save_vote(telegram_user_id: int, books: Iterable[Book]) -> int:
+    """Saves the vote and returns id of the voting, votes of different users
+    arriving at the same time are committed in one transaction,
+    user leaves vote mode after the commit"""
     if not await is_user_in_vote_mode(telegram_user_id):
         raise UserInNotVoteModeError
 
     actual_voting = await get_actual_voting()
     if actual_voting is None:
         raise NoActualVotingError
-    sql = """
-        INSERT OR REPLACE INTO vote
-            (vote_id, user_id, first_book_id, second_book_id, third_book_id)
-        VALUES (:vote_id, :user_id, :first_book, :second_book, :third_book)
-        """
-    books = tuple(books)
-    await execute("begin")
-    await execute(
-        sql,
-        {
-            "vote_id": actual_voting.id,
-            "user_id": telegram_user_id,
-            "first_book": books[0].id,
-            "second_book": books[1].id,
-            "third_book": books[2].id,
-        },
-        autocommit=False,
+
+    await group_commit(
+        functools.partial(_write_vote, actual_voting.id, telegram_user_id, tuple(books))
     )
     await remove_user_from_vote_mode(telegram_user_id)
-    await execute("commit")
+    metrics.VOTES_SAVED.inc(get_current_tenant_id())
+    return actual_voting.id
 
 
 async def get_user_vote(user_id: int, voting_id: int) -> Vote | None:
     sql = """
-        WITH pos_numbers AS (
-            SELECT
-                ROW_NUMBER() OVER (ORDER BY c.ordering, b.ordering) AS rn,
-                b.id AS book_id
-            FROM book b LEFT JOIN book_category c ON c.id=b.category_id
-            WHERE b.read_start IS NULL
-        )
         SELECT
             b1.name AS first_book_name,
-            b1_pos_number.rn AS first_book_positional_number,
+            b1.positional_number AS first_book_positional_number,
             b2.name AS second_book_name,
-            b2_pos_number.rn AS second_book_positional_number,
+            b2.positional_number AS second_book_positional_number,
             b3.name AS third_book_name,
-            b3_pos_number.rn AS third_book_positional_number
+            b3.positional_number AS third_book_positional_number
         FROM vote v
         LEFT JOIN book b1 ON v.first_book_id = b1.id
         LEFT JOIN book b2 ON v.second_book_id = b2.id
         LEFT JOIN book b3 ON v.third_book_id = b3.id
-        LEFT JOIN pos_numbers AS b1_pos_number ON b1_pos_number.book_id=b1.id
-        LEFT JOIN pos_numbers AS b2_pos_number ON b2_pos_number.book_id=b2.id
-        LEFT JOIN pos_numbers AS b3_pos_number ON b3_pos_number.book_id=b3.id
         WHERE v.user_id=:user_id
             AND v.vote_id=:voting_id
     """
@@ -181,3 +163,24 @@ async def _get_last_voting() -> Voting | None:
         return None
 
     return _build_voting(last_voting)
+
+
+async def _write_vote(
+    voting_id: int, telegram_user_id: int, books: tuple[Book, ...]
+) -> None:
+    await insert_user(telegram_user_id)
+    await apply_ballot(voting_id, telegram_user_id, [b.id for b in books])
+    await execute(
+        """
+        INSERT OR REPLACE INTO vote
+            (vote_id, user_id, first_book_id, second_book_id, third_book_id)
+        VALUES (:vote_id, :user_id, :first_book, :second_book, :third_book)
+        """,
+        {
+            "vote_id": voting_id,
+            "user_id": telegram_user_id,
+            "first_book": books[0].id,
+            "second_book": books[1].id,
+            "third_book": books[2].id,
+        },
+    )
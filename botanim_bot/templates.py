@@ -1,13 +1,110 @@
+import hashlib
 import re
+import shutil
+import sys
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from datetime import date
 
 import jinja2
 
-from botanim_bot import config
+from botanim_bot import config, metrics
+from botanim_bot.tenants import (
+    get_current_tenant_id,
+    get_open_tenant_states,
+    get_tenant_state,
+    is_multi_tenant,
+)
 
+TEMPLATES_HASH_FILE = "templates.hash"
 
-def render_template(template_name: str, data: dict | None = None) -> str:
+
+@dataclass
+class RenderCacheStats:
+    hits: int
+    misses: int
+    entries: int
+    size: int
+
+
+class RenderCache:
+    """LRU cache of rendered templates bounded by the size of stored strings"""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._items: OrderedDict[Hashable, str] = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> str | None:
+        rendered = self._items.get(key)
+        if rendered is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._items.move_to_end(key)
+        return rendered
+
+    def put(self, key: Hashable, rendered: str) -> None:
+        size = sys.getsizeof(rendered)
+        if size > self._max_size:
+            return
+        if key in self._items:
+            self._size -= sys.getsizeof(self._items.pop(key))
+        while self._items and self._size + size > self._max_size:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= sys.getsizeof(evicted)
+        self._items[key] = rendered
+        self._size += size
+
+    def get_stats(self) -> RenderCacheStats:
+        return RenderCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            entries=len(self._items),
+            size=self._size,
+        )
+
+
+def render_template(
+    template_name: str, data: dict | None = None, *, cache_key: Hashable | None = None
+) -> str:
+    """Renders template, rendered messages are cached in the cache of the tenant
+    by template name and `cache_key`, or by hash of `data` if `cache_key`
+    is not passed.
+
+    Today date is always a part of the key, because templates show
+    the statuses of books and votings which depend on it, templates get
+    the same date as `today` variable"""
     if data is None:
         data = {}
+    if cache_key is None:
+        cache_key = _get_data_hash(data)
+    today = date.today()
+    key = (template_name, today, cache_key)
+
+    render_cache = _get_render_cache()
+    rendered = render_cache.get(key)
+    metrics.CACHE_REQUESTS.inc(
+        get_current_tenant_id(), "render", "miss" if rendered is None else "hit"
+    )
+    if rendered is None:
+        rendered = _render_template(template_name, {"today": today, **data})
+        render_cache.put(key, rendered)
+    return rendered
+
+
+def get_render_cache_entries() -> int:
+    """Returns rendered messages in the caches of all open tenants"""
+    return sum(
+        render_cache.get_stats().entries
+        for render_cache in get_open_tenant_states("render_cache")
+    )
+
+
+def _render_template(template_name: str, data: dict) -> str:
     template = _get_template_env().get_template(template_name)
     rendered = template.render(**data).replace("\n", " ")
     rendered = rendered.replace("<br>", "\n")
@@ -17,16 +114,86 @@ def render_template(template_name: str, data: dict | None = None) -> str:
     return rendered
 
 
+def _get_data_hash(data: dict) -> str:
+    """Returns stable hash of template data. Data consists of dataclasses,
+    collections and scalars, so its repr reflects its content"""
+    if not data:
+        return ""
+    data_repr = repr(sorted(data.items()))
+    return hashlib.blake2b(data_repr.encode(), digest_size=16).hexdigest()
+
+
+def _get_render_cache() -> RenderCache:
+    """Returns cache of the current tenant, every open club of many gets
+    a smaller one, so all of them together stay bounded"""
+    return get_tenant_state("render_cache", _create_render_cache)
+
+
+def _create_render_cache() -> RenderCache:
+    if is_multi_tenant():
+        return RenderCache(config.TENANT_RENDER_CACHE_MAX_SIZE)
+    return RenderCache(config.RENDER_CACHE_MAX_SIZE)
+
+
+def compile_templates() -> None:
+    """Compiles all templates to Python modules in TEMPLATES_CACHE_DIR,
+    they are loaded instead of parsing templates while the sources match"""
+    cache_dir = config.TEMPLATES_CACHE_DIR
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    env = _create_template_env(jinja2.FileSystemLoader(searchpath=config.TEMPLATES_DIR))
+    env.compile_templates(cache_dir, zip=None, ignore_errors=False)
+    (cache_dir / TEMPLATES_HASH_FILE).write_text(_get_templates_hash())
+
+
+def preload_templates() -> None:
+    """Loads all templates, so the first render of each one doesn't pay for it.
+    Templates are compiled first if the compiled ones are missing or outdated"""
+    if not _is_compiled_templates_actual():
+        compile_templates()
+        _get_template_env.template_env = None
+    env = _get_template_env()
+    for template_name in _get_template_names():
+        env.get_template(template_name)
+
+
 def _get_template_env():
     if not getattr(_get_template_env, "template_env", None):
-        template_loader = jinja2.FileSystemLoader(searchpath=config.TEMPLATES_DIR)
-        env = jinja2.Environment(
-            loader=template_loader,
-            trim_blocks=True,
-            lstrip_blocks=True,
-            autoescape=True,
-        )
-
-        _get_template_env.template_env = env
+        if _is_compiled_templates_actual():
+            template_loader = jinja2.ModuleLoader(config.TEMPLATES_CACHE_DIR)
+        else:
+            template_loader = jinja2.FileSystemLoader(searchpath=config.TEMPLATES_DIR)
+        _get_template_env.template_env = _create_template_env(template_loader)
 
     return _get_template_env.template_env
+
+
+def _create_template_env(template_loader: jinja2.BaseLoader) -> jinja2.Environment:
+    return jinja2.Environment(
+        loader=template_loader,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        autoescape=True,
+    )
+
+
+def _is_compiled_templates_actual() -> bool:
+    hash_file = config.TEMPLATES_CACHE_DIR / TEMPLATES_HASH_FILE
+    return hash_file.exists() and hash_file.read_text() == _get_templates_hash()
+
+
+def _get_templates_hash() -> str:
+    """Returns hash of templates sources and Jinja version,
+    compiled templates are valid only for them"""
+    templates_hash = hashlib.blake2b(jinja2.__version__.encode(), digest_size=16)
+    for template_name in _get_template_names():
+        templates_hash.update(template_name.encode())
+        templates_hash.update((config.TEMPLATES_DIR / template_name).read_bytes())
+    return templates_hash.hexdigest()
+
+
+def _get_template_names() -> list[str]:
+    return sorted(path.name for path in config.TEMPLATES_DIR.glob("*.j2"))
+
+
+if __name__ == "__main__":
+    compile_templates()
@@ -0,0 +1,382 @@
+"""Book clubs (tenants) served by one bot process.
+
+Without TENANTS_FILE the bot serves one club, TELEGRAM_BOTANIM_CHANNEL_ID with
+the database SQLITE_DB_FILE, and updates are handled without tenant scopes.
+
+TENANTS_FILE is a JSON list of clubs {"id": "...", "channel_id": -100...}.
+Every club has its own database TENANTS_DB_DIR/<id>.sqlite3, created from
+the db.sql schema on the first use, without books of the original club.
+An update is handled in the scope of the club whose channel it came from,
+in private chats in the scope of the club the user came from by the link
+https://t.me/<bot>?start=<club id>, the choice of users is kept
+in TENANTS_REGISTRY_DB_FILE.
+
+Database and in-memory state of a club are opened on its first update. When more
+than TENANTS_MAX_OPEN clubs are open, the least recently used club which has no
+updates and background work in progress is closed.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import re
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TypeVar
+
+import aiosqlite
+
+from botanim_bot import config, db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_TENANT_ID = db.DEFAULT_TENANT_ID
+# statements of the registry are profiled under the id no club can have
+_REGISTRY_STATS_ID = ".registry"
+
+# Telegram allows only these characters in the deep link parameter
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_REGISTRY_MIGRATIONS = [
+    (
+        1,
+        """
+        create table user_tenant (
+          user_id bigint primary key,
+          tenant_id text not null
+        );
+        """,
+    ),
+]
+
+
+@dataclass(frozen=True)
+class Tenant:
+    id: str
+    channel_id: int
+    db_file: Path
+
+
+@dataclass
+class _OpenTenant:
+    tenant: Tenant
+    database: db.Database
+    state: dict[str, Any] = field(default_factory=dict)
+    close_hooks: list[Callable[[], Awaitable[None]]] = field(default_factory=list)
+    users: int = 0  # updates and background tasks in the scope of the tenant
+
+
+_current_tenant: ContextVar[_OpenTenant | None] = ContextVar(
+    "current_tenant", default=None
+)
+_open_tenants: OrderedDict[str, _OpenTenant] = OrderedDict()
+_opening: dict[str, asyncio.Future[None]] = {}
+_open_hooks: list[Callable[[], Awaitable[None]]] = []
+_default_state: dict[str, Any] = {}  # state used out of tenant scopes
+_registry_lock = asyncio.Lock()
+_user_tenant_ids: dict[int, str | None] = {}  # cache of the registry
+
+
+def is_multi_tenant() -> bool:
+    return config.TENANTS_FILE is not None
+
+
+def get_tenants() -> dict[str, Tenant]:
+    """Returns clubs by id, the only default club without TENANTS_FILE"""
+    if getattr(get_tenants, "tenants", None) is None:
+        if config.TENANTS_FILE is None:
+            tenants = [_get_default_tenant()]
+        else:
+            tenants = _read_tenants_file(config.TENANTS_FILE)
+        get_tenants.tenants = {tenant.id: tenant for tenant in tenants}
+        get_tenants.by_channel_id = {tenant.channel_id: tenant for tenant in tenants}
+
+    return get_tenants.tenants
+
+
+def get_current_tenant_id() -> str:
+    open_tenant = _current_tenant.get()
+    return DEFAULT_TENANT_ID if open_tenant is None else open_tenant.tenant.id
+
+
+def get_current_tenant() -> Tenant:
+    open_tenant = _current_tenant.get()
+    if open_tenant is None:
+        return _get_default_tenant()
+    return open_tenant.tenant
+
+
+def get_tenant_state(
+    name: str,
+    factory: Callable[[], T],
+    close: Callable[[], Awaitable[None]] | None = None,
+) -> T:
+    """Returns state `name` of the current tenant, created by `factory` on the
+    first call. `close` is awaited in the tenant scope before its database is
+    closed, it must save what the state hasn't saved yet"""
+    open_tenant = _current_tenant.get()
+    state = _default_state if open_tenant is None else open_tenant.state
+    value = state.get(name)
+    if value is None:
+        value = state[name] = factory()
+        if open_tenant is not None and close is not None:
+            open_tenant.close_hooks.append(close)
+    return value
+
+
+def add_open_hook(hook: Callable[[], Awaitable[None]]) -> None:
+    """Adds coroutine function awaited in the scope of every opened tenant"""
+    _open_hooks.append(hook)
+
+
+async def find_tenant(chat_id: int, user_id: int | None) -> Tenant | None:
+    """Returns club of the chat, in private chats the club chosen by the user"""
+    get_tenants()
+    tenant = get_tenants.by_channel_id.get(chat_id)
+    if tenant is not None or user_id is None:
+        return tenant
+    return await find_user_tenant(user_id)
+
+
+async def find_user_tenant(user_id: int) -> Tenant | None:
+    """Returns club chosen by the user. Choices are cached in memory, the bot
+    is the only writer of the registry, so inline queries sent on every
+    keypress don't read it"""
+    if user_id not in _user_tenant_ids:
+        async with _registry_scope():
+            row = await db.fetch_one(
+                "SELECT tenant_id FROM user_tenant WHERE user_id=:user_id",
+                {"user_id": user_id},
+            )
+        _cache_user_tenant_id(user_id, row["tenant_id"] if row else None)
+    tenant_id = _user_tenant_ids[user_id]
+    return get_tenants().get(tenant_id) if tenant_id is not None else None
+
+
+async def choose_tenant(user_id: int, tenant: Tenant) -> None:
+    """Saves the club chosen by the user for his private chat with the bot"""
+    async with _registry_scope():
+        await db.execute(
+            """
+            INSERT INTO user_tenant (user_id, tenant_id) VALUES (:user_id, :tenant_id)
+            ON CONFLICT (user_id) DO UPDATE SET tenant_id=excluded.tenant_id
+            """,
+            {"user_id": user_id, "tenant_id": tenant.id},
+        )
+    _cache_user_tenant_id(user_id, tenant.id)
+
+
+@asynccontextmanager
+async def tenant_scope(tenant: Tenant) -> AsyncIterator[None]:
+    """Runs the block with the database and state of the tenant,
+    the tenant is not closed until the block exits"""
+    open_tenant = await _open_tenant(tenant)
+    open_tenant.users += 1
+    try:
+        async with _enter_tenant(open_tenant):
+            yield
+    finally:
+        open_tenant.users -= 1
+
+
+def create_tenant_task(coroutine: Coroutine[Any, Any, T]) -> asyncio.Task[T]:
+    """Starts task in the current tenant scope, but out of other context of the
+    caller, e.g. out of the request scope and the transaction of the update"""
+    open_tenant = _current_tenant.get()
+    if open_tenant is None:
+        return asyncio.create_task(coroutine, context=contextvars.Context())
+
+    async def run_in_tenant_scope() -> T:
+        async with _enter_tenant(open_tenant):
+            return await coroutine
+
+    return asyncio.create_task(run_in_tenant_scope(), context=contextvars.Context())
+
+
+@asynccontextmanager
+async def keep_open() -> AsyncIterator[None]:
+    """Doesn't let the current tenant be closed until the block exits,
+    for background work of the tenant"""
+    open_tenant = _current_tenant.get()
+    if open_tenant is None:
+        yield
+        return
+    open_tenant.users += 1
+    try:
+        yield
+    finally:
+        open_tenant.users -= 1
+
+
+def get_open_tenants_count() -> int:
+    return len(_open_tenants)
+
+
+def get_open_tenant_states(name: str) -> list[Any]:
+    """Returns state `name` of the open tenants and of the scope out of tenants,
+    where it is created"""
+    states = [open_tenant.state for open_tenant in _open_tenants.values()]
+    states.append(_default_state)
+    return [state[name] for state in states if name in state]
+
+
+async def close_tenants() -> None:
+    """Closes all open tenants and the registry, must be called on shutdown"""
+    for tenant_id in tuple(_open_tenants):
+        await _close_tenant(_open_tenants.pop(tenant_id))
+    registry = getattr(_get_registry, "registry", None)
+    _get_registry.registry = None
+    _user_tenant_ids.clear()
+    if registry is not None:
+        await registry.close()
+
+
+async def _open_tenant(tenant: Tenant) -> _OpenTenant:
+    """Returns open tenant, the caller must take it in use before any await"""
+    while True:
+        open_tenant = _open_tenants.get(tenant.id)
+        if open_tenant is not None:
+            _open_tenants.move_to_end(tenant.id)
+            return open_tenant
+
+        opening = _opening.get(tenant.id)
+        if opening is None:
+            opening = asyncio.ensure_future(_open_new_tenant(tenant))
+            _opening[tenant.id] = opening
+            opening.add_done_callback(lambda _: _opening.pop(tenant.id, None))
+        await asyncio.shield(opening)
+
+
+async def _open_new_tenant(tenant: Tenant) -> None:
+    if not tenant.db_file.exists():
+        logger.info("Creating database of tenant %s", tenant.id)
+        await _create_database(tenant.db_file)
+    database = db.Database(
+        tenant.db_file, config.TENANT_READ_POOL_SIZE, tenant_id=tenant.id
+    )
+    open_tenant = _OpenTenant(tenant=tenant, database=database)
+    try:
+        await database.apply_migrations(db.get_migrations())
+        async with _enter_tenant(open_tenant):
+            for hook in _open_hooks:
+                await hook()
+    except BaseException:
+        await _close_tenant(open_tenant)
+        raise
+
+    await _close_idle_tenants(config.TENANTS_MAX_OPEN - 1)
+    _open_tenants[tenant.id] = open_tenant
+
+
+async def _close_idle_tenants(max_open: int) -> None:
+    """Closes least recently used tenants over `max_open`,
+    busy ones stay open over the limit"""
+    excess = len(_open_tenants) - max_open
+    if excess <= 0:
+        return
+    idle = [t for t in _open_tenants.values() if t.users == 0][:excess]
+    for open_tenant in idle:
+        del _open_tenants[open_tenant.tenant.id]
+        logger.info("Closing idle tenant %s", open_tenant.tenant.id)
+        await _close_tenant(open_tenant)
+
+
+async def _close_tenant(open_tenant: _OpenTenant) -> None:
+    try:
+        async with _enter_tenant(open_tenant):
+            for close in open_tenant.close_hooks:
+                try:
+                    await close()
+                except Exception:
+                    logger.exception(
+                        "Failed to close state of tenant %s", open_tenant.tenant.id
+                    )
+    finally:
+        await open_tenant.database.close()
+
+
+async def _create_database(db_file: Path) -> None:
+    """Creates empty database with db.sql schema, migrations are applied
+    on opening, the file appears only complete"""
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    new_file = db_file.with_name(f"{db_file.name}.new")
+    new_file.unlink(missing_ok=True)
+    async with aiosqlite.connect(new_file) as connection:
+        await connection.executescript(config.DB_SCHEMA_FILE.read_text())
+    new_file.replace(db_file)
+
+
+@asynccontextmanager
+async def _enter_tenant(open_tenant: _OpenTenant) -> AsyncIterator[None]:
+    token = _current_tenant.set(open_tenant)
+    try:
+        with db.use_database(open_tenant.database):
+            yield
+    finally:
+        _current_tenant.reset(token)
+
+
+@asynccontextmanager
+async def _registry_scope() -> AsyncIterator[None]:
+    registry = await _get_registry()
+    with db.use_database(registry):
+        yield
+
+
+async def _get_registry() -> db.Database:
+    if getattr(_get_registry, "registry", None) is not None:
+        return _get_registry.registry
+    async with _registry_lock:
+        if getattr(_get_registry, "registry", None) is None:
+            config.TENANTS_REGISTRY_DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+            registry = db.Database(
+                config.TENANTS_REGISTRY_DB_FILE,
+                read_pool_size=1,
+                tenant_id=_REGISTRY_STATS_ID,
+            )
+            await registry.apply_migrations(_REGISTRY_MIGRATIONS)
+            _get_registry.registry = registry
+
+    return _get_registry.registry
+
+
+def _cache_user_tenant_id(user_id: int, tenant_id: str | None) -> None:
+    _user_tenant_ids.pop(user_id, None)
+    if len(_user_tenant_ids) >= config.TENANTS_USER_CACHE_MAX_SIZE:
+        _user_tenant_ids.pop(next(iter(_user_tenant_ids)))
+    _user_tenant_ids[user_id] = tenant_id
+
+
+def _get_default_tenant() -> Tenant:
+    return Tenant(
+        id=DEFAULT_TENANT_ID,
+        channel_id=config.TELEGRAM_BOTANIM_CHANNEL_ID,
+        db_file=config.SQLITE_DB_FILE,
+    )
+
+
+def _read_tenants_file(path: Path) -> list[Tenant]:
+    tenants = []
+    for item in json.loads(path.read_text()):
+        tenant_id = str(item["id"])
+        if not _TENANT_ID_RE.match(tenant_id):
+            raise ValueError(
+                f"Tenant id {tenant_id!r} must consist of 1-64 latin letters, "
+                "digits, _ and -"
+            )
+        tenants.append(
+            Tenant(
+                id=tenant_id,
+                channel_id=int(item["channel_id"]),
+                db_file=config.TENANTS_DB_DIR / f"{tenant_id}.sqlite3",
+            )
+        )
+    if len({tenant.id for tenant in tenants}) != len(tenants):
+        raise ValueError(f"Tenant ids in {path} must be unique")
+    return tenants
@@ -0,0 +1,227 @@
+"""Webhook mode: Telegram POSTs updates to the embedded HTTP server,
+they are put straight into the update queue of the Application."""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from dataclasses import dataclass
+from typing import cast
+
+from telegram import Update
+from telegram.ext import Application
+
+from botanim_bot import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "x-telegram-bot-api-secret-token"  # noqa: S105
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+
+class WebhookServer:
+    """HTTP/1.1 server with keep-alive accepting updates by POST on `path`,
+    requests without the right secret token header are rejected"""
+
+    def __init__(
+        self,
+        application: Application,
+        listen: str,
+        port: int,
+        path: str,
+        secret_token: str,
+    ):
+        self._application = application
+        self._listen = listen
+        self._port = port
+        self._path = path
+        self._secret_token = secret_token.encode()
+        self._server: asyncio.Server | None = None
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    @property
+    def port(self) -> int:
+        """Bound port, differs from the configured one if it was 0"""
+        if self._server is None:
+            return self._port
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._listen, self._port
+        )
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in self._connections:
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._connections[writer] = cast(asyncio.Task, asyncio.current_task())
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HttpError as e:
+                    writer.write(_make_response(e.status, keep_alive=False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                status = await self._handle_request(request)
+                writer.write(_make_response(status, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.debug("Webhook client disconnected in the middle of request")
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _handle_request(self, request: HttpRequest) -> int:
+        if request.path.split("?", 1)[0] != self._path:
+            return 404
+        if request.method != "POST":
+            return 405
+        secret_token = request.headers.get(SECRET_TOKEN_HEADER, "").encode()
+        if not hmac.compare_digest(secret_token, self._secret_token):
+            logger.warning("Webhook request with wrong secret token rejected")
+            return 403
+        try:
+            data = json.loads(request.body)
+            update = Update.de_json(data, self._application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            logger.warning("Webhook request with malformed update rejected")
+            return 400
+        if update is None:
+            return 400
+
+        await self._application.update_queue.put(update)
+        return 200
+
+
+def run_webhook(application: Application) -> None:
+    """Runs the bot in webhook mode until SIGINT or SIGTERM,
+    the webhook mode counterpart of `Application.run_polling`"""
+    asyncio.run(_serve(application))
+
+
+async def _serve(application: Application) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop_event.set)
+
+    server = WebhookServer(
+        application,
+        listen=config.WEBHOOK_LISTEN,
+        port=config.WEBHOOK_PORT,
+        path=config.WEBHOOK_PATH,
+        secret_token=config.WEBHOOK_SECRET_TOKEN,
+    )
+    await application.initialize()
+    try:
+        if application.post_init is not None:
+            await application.post_init(application)
+        await server.start()
+        await application.start()
+        if config.WEBHOOK_URL:
+            await application.bot.set_webhook(
+                config.WEBHOOK_URL,
+                secret_token=config.WEBHOOK_SECRET_TOKEN,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            )
+        logger.info(
+            "Waiting for updates on %s:%s%s",
+            config.WEBHOOK_LISTEN,
+            server.port,
+            config.WEBHOOK_PATH,
+        )
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> HttpRequest | None:
+    """Returns the next request of the connection, None if it was closed"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise HttpError(400) from e
+        return None
+    except asyncio.LimitOverrunError as e:
+        raise HttpError(400) from e
+
+    method, path, headers = _parse_head(head[:-4].decode("latin-1"))
+    try:
+        content_length = int(headers.get("content-length", "0"))
+    except ValueError as e:
+        raise HttpError(400) from e
+
+    if content_length < 0:
+        raise HttpError(400)
+    if "transfer-encoding" in headers:
+        raise HttpError(411)
+    if content_length > config.WEBHOOK_MAX_BODY_SIZE:
+        raise HttpError(413)
+    body = await reader.readexactly(content_length) if content_length > 0 else b""
+    return HttpRequest(method=method, path=path, headers=headers, body=body)
+
+
+def _parse_head(head: str) -> tuple[str, str, dict[str, str]]:
+    request_line, *header_lines = head.split("\r\n")
+    try:
+        method, path, _ = request_line.split(" ", 2)
+        headers = {}
+        for line in header_lines:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    except ValueError as e:
+        raise HttpError(400) from e
+    return method, path, headers
+
+
+def _make_response(status: int, keep_alive: bool) -> bytes:
+    connection = "keep-alive" if keep_alive else "close"
+    return (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        f"Content-Length: 0\r\nConnection: {connection}\r\n\r\n"
+    ).encode()